@@ -0,0 +1,366 @@
+import asyncio
+import time
+import urllib.parse
+from collections import OrderedDict
+
+import msgpack
+
+from app.core.config import (
+    READ_CACHE_BACKEND,
+    READ_CACHE_MAX_ENTRIES,
+    READ_CACHE_REDIS_POOL_SIZE,
+    READ_CACHE_REDIS_TIMEOUT,
+    READ_CACHE_REDIS_URL,
+    READ_CACHE_TTL,
+)
+
+KEY_PREFIX = "pomopatch:"
+# After a Redis error, reads skip the cache for this long instead of paying
+# the timeout on every request.
+REDIS_RETRY_AFTER = 5.0
+
+
+def user_key(email):
+    return f"user:{email}"
+
+
+def username_key(username):
+    return f"username:{username}"
+
+
+def plants_key(email):
+    return f"plants:{email}"
+
+
+def garden_key(email):
+    return f"garden:{email}"
+
+
+def garden_keys(email):
+    """Every key holding data read from `email`'s user row or plants."""
+    return user_key(email), plants_key(email), garden_key(email)
+
+
+class LocalBackend:
+    """In-process TTL + LRU store.
+
+    Values are kept as the loader returned them, so callers must treat
+    cached values as read-only.
+    """
+
+    name = "local"
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, keys):
+        self.forget(keys)
+
+    def forget(self, keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def purge_expired(self):
+        now = time.monotonic()
+        expired = [key for key, (expires, _) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+        return len(expired)
+
+    async def close(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisError(Exception):
+    pass
+
+
+class _RedisConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def execute(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            elif isinstance(arg, (int, float)):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.writer.write(b"".join(parts))
+        await self.writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis closed the connection")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body
+        if kind == b"-":
+            raise RedisError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            return (await self.reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(body)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    def close(self):
+        self.writer.close()
+
+
+class RedisBackend:
+    """Store on any server speaking the Redis protocol (RESP2).
+
+    Values are msgpack-encoded; timezone-aware datetimes round-trip. Only
+    GET, SET with PX, DEL, AUTH and SELECT are used.
+    """
+
+    name = "redis"
+
+    def __init__(self, url, pool_size, timeout):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = urllib.parse.unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self.pool_size = pool_size
+        self._down_until = 0.0
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        conn = _RedisConnection(reader, writer)
+        if self.password:
+            await conn.execute("AUTH", self.password)
+        if self.db:
+            await conn.execute("SELECT", self.db)
+        return conn
+
+    async def execute(self, *args):
+        if time.monotonic() < self._down_until:
+            raise ConnectionError("Redis marked down")
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else None
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(self._connect(), self.timeout)
+                reply = await asyncio.wait_for(conn.execute(*args), self.timeout)
+            except RedisError:
+                if conn is not None:
+                    self._idle.append(conn)
+                raise
+            except asyncio.CancelledError:
+                if conn is not None:
+                    conn.close()
+                raise
+            except Exception:
+                # A timed-out or broken connection may have a reply in
+                # flight; never reuse it.
+                if conn is not None:
+                    conn.close()
+                self._down_until = time.monotonic() + REDIS_RETRY_AFTER
+                raise
+            self._idle.append(conn)
+            return reply
+
+    async def get(self, key):
+        raw = await self.execute("GET", KEY_PREFIX + key)
+        return None if raw is None else msgpack.unpackb(raw, timestamp=3)
+
+    async def set(self, key, value, ttl):
+        raw = msgpack.packb(value, datetime=True)
+        await self.execute("SET", KEY_PREFIX + key, raw, "PX", int(ttl * 1000))
+
+    async def delete(self, keys):
+        await self.execute("DEL", *(KEY_PREFIX + key for key in keys))
+
+    def forget(self, keys):
+        # Shared store: the writer's DEL already reached every worker.
+        pass
+
+    def purge_expired(self):
+        # Redis expires keys itself.
+        return 0
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    def stats(self):
+        return {
+            "pool_size": self.pool_size,
+            "idle_connections": len(self._idle),
+            "down": time.monotonic() < self._down_until,
+        }
+
+
+class ReadThroughCache:
+    """Read-through cache in front of Postgres for public reads.
+
+    `get_or_load` serves a key from the backend or runs `load()` once for
+    every concurrent miss on that key. Writers call `invalidate` after
+    their statement commits; a load that was running when a key was
+    invalidated still answers the requests already waiting on it but is
+    not stored, and requests arriving later start a fresh load.
+
+    Backend failures never fail a request: the read goes to Postgres and
+    the error is counted. `load()` returning None (not found) is not
+    cached.
+    """
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.collapsed = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    async def get_or_load(self, key, load):
+        if not self.enabled:
+            return await load()
+
+        try:
+            value = await self.backend.get(key)
+        except Exception:
+            self.errors += 1
+            value = None
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, load))
+            self._inflight[key] = task
+        else:
+            self.collapsed += 1
+        # Shielded so one disconnecting client doesn't cancel the load the
+        # others are waiting on.
+        return await asyncio.shield(task)
+
+    async def _load(self, key, load):
+        task = asyncio.current_task()
+        try:
+            self.loads += 1
+            value = await load()
+            if value is not None and self._inflight.get(key) is task:
+                try:
+                    await self.backend.set(key, value, self.ttl)
+                except Exception:
+                    self.errors += 1
+            return value
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def forget(self, keys):
+        """Drop `keys` from this worker without telling the backend."""
+        for key in keys:
+            self._inflight.pop(key, None)
+        self.backend.forget(keys)
+
+    async def invalidate(self, *keys):
+        if not self.enabled:
+            return
+        self.invalidations += 1
+        for key in keys:
+            self._inflight.pop(key, None)
+        try:
+            await self.backend.delete(keys)
+        except Exception as e:
+            # Entries written before the failure expire after `ttl`.
+            self.errors += 1
+            print("Read cache invalidation failed:", e)
+
+    def forget_garden(self, email):
+        self.forget(garden_keys(email))
+
+    async def invalidate_garden(self, email):
+        await self.invalidate(*garden_keys(email))
+
+    def purge_expired(self):
+        return self.backend.purge_expired()
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "collapsed": self.collapsed,
+            "inflight": len(self._inflight),
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            **self.backend.stats(),
+        }
+
+
+def create_backend():
+    if READ_CACHE_BACKEND == "redis":
+        return RedisBackend(READ_CACHE_REDIS_URL, READ_CACHE_REDIS_POOL_SIZE, READ_CACHE_REDIS_TIMEOUT)
+    return LocalBackend(READ_CACHE_MAX_ENTRIES)
+
+
+read_cache = ReadThroughCache(create_backend(), READ_CACHE_TTL)
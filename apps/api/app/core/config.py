@@ -7,6 +7,161 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
 CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL")
 
+# Production server (python -m app.server). Each worker has its own pool,
+# so Postgres sees up to workers x DB_POOL_MAX_SIZE connections.
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Worker processes; 0 means one per CPU the container's cgroup quota
+# allows, or 1 while IDEMPOTENCY_BACKEND is local. Each keeps its own
+# leaderboard, search index, write queues, pool and, with the local
+# backends, idempotency store and read cache (see app.server), so budget
+# workers x (DB_POOL_MAX_SIZE + 2) Postgres connections.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+# Proxies whose X-Forwarded-For/-Proto headers are trusted (comma-separated,
+# "*" for any). Set to the load balancer's address when behind one.
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Idle keep-alive seconds. Longer than the usual 60s load balancer idle
+# timeout, so the proxy closes first and never reuses a dropped connection.
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "75"))
+# Requests after which a worker is replaced by a fresh one; 0 never recycles.
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "0"))
+# Up to this many extra requests per worker, chosen at random, so workers
+# sharing the load don't all restart at the same moment.
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", str(WORKER_MAX_REQUESTS // 4)))
+# Seconds in-flight requests get to finish when a worker stops.
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+
+# Connection pool
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Seconds a request waits for a free connection before failing with 503.
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+DB_MAX_INACTIVE_CONNECTION_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME", "300"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# PgBouncer in transaction/statement pooling mode can't keep named prepared
+# statements on a server connection; this turns them off entirely.
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+
+# Garden event streams. NOTIFY/LISTEN fans deltas out to every API worker;
+# it needs a session-level connection, so it is off behind PgBouncer unless
+# asked for.
+GARDEN_EVENTS_NOTIFY = os.getenv(
+    "GARDEN_EVENTS_NOTIFY", "false" if DB_PGBOUNCER else "true"
+).lower() in ("1", "true", "yes")
+# Deltas buffered per subscriber before it is sent a fresh snapshot instead.
+GARDEN_EVENTS_QUEUE_SIZE = int(os.getenv("GARDEN_EVENTS_QUEUE_SIZE", "256"))
+GARDEN_EVENTS_KEEPALIVE = 15
+
+# Read-through cache for public user, plant and garden reads. "local" keeps
+# a TTL + LRU cache in each worker; "redis" shares one on any server
+# speaking the Redis protocol. READ_CACHE_TTL=0 turns caching off.
+READ_CACHE_BACKEND = os.getenv("READ_CACHE_BACKEND", "local")
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "30"))
+READ_CACHE_MAX_ENTRIES = int(os.getenv("READ_CACHE_MAX_ENTRIES", "10000"))
+READ_CACHE_REDIS_URL = os.getenv("READ_CACHE_REDIS_URL", "redis://localhost:6379/0")
+READ_CACHE_REDIS_POOL_SIZE = int(os.getenv("READ_CACHE_REDIS_POOL_SIZE", "8"))
+# Seconds per Redis call; slower calls count as errors and fall back to Postgres.
+READ_CACHE_REDIS_TIMEOUT = float(os.getenv("READ_CACHE_REDIS_TIMEOUT", "0.5"))
+
+# Responses to mutations sent with an Idempotency-Key, kept for replay.
+# The store follows READ_CACHE_BACKEND (and its Redis settings) unless set;
+# IDEMPOTENCY_TTL=0 ignores the header.
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", READ_CACHE_BACKEND)
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+# Writes for one user run one at a time per worker; once this many for the
+# same user are running or queued, more get 429.
+USER_WRITE_QUEUE_LIMIT = int(os.getenv("USER_WRITE_QUEUE_LIMIT", "32"))
+
+# Background jobs (app/core/scheduler.py). Jobs marked leader-only run on
+# one worker at a time: whichever holds a session-level advisory lock on
+# its own connection. That needs a session-level connection, so behind
+# PgBouncer election is off unless asked for, and every worker runs them.
+SCHEDULER_LEADER_ELECTION = os.getenv(
+    "SCHEDULER_LEADER_ELECTION", "false" if DB_PGBOUNCER else "true"
+).lower() in ("1", "true", "yes")
+SCHEDULER_LOCK_KEY = 0x706F6D6F
+# Seconds between attempts to take the lock, and checks that it is held.
+SCHEDULER_LEADER_CHECK_INTERVAL = float(os.getenv("SCHEDULER_LEADER_CHECK_INTERVAL", "5"))
+# Expired entries in the local read cache and idempotency store are
+# otherwise only dropped when read again or pushed out by newer ones.
+CACHE_SWEEP_INTERVAL = 60
+
+# Per-route request metrics at /metrics (Prometheus text format), timed
+# by phase, with SQL statement counts from asyncpg query hooks.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Statements slower than this (milliseconds) are logged and listed at
+# /health/slow-queries, normalized and grouped.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = 200
+
+# OpenTelemetry spans, sent as OTLP/HTTP JSON to a collector such as
+# http://localhost:4318. Unset turns tracing off. Requests without a sampled
+# traceparent header are traced with probability TRACE_SAMPLE_RATIO.
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "pomopatch-api")
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "0.1"))
+TRACE_EXPORT_INTERVAL = 5.0
+TRACE_EXPORT_BATCH_SIZE = 512
+# Finished spans waiting for export; more are dropped.
+TRACE_QUEUE_SIZE = 4096
+
+# Verified-token cache and JWKS refresh (seconds)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+JWKS_REFRESH_INTERVAL = float(os.getenv("JWKS_REFRESH_INTERVAL", "3600"))
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+
+# Leaderboard
+LEADERBOARD_PAGE_SIZE = 50
+LEADERBOARD_MAX_PAGE_SIZE = 200
+# Each worker keeps its own in-memory ranking; this bounds how long writes
+# handled by other workers take to show up.
+LEADERBOARD_RECONCILE_INTERVAL = float(os.getenv("LEADERBOARD_RECONCILE_INTERVAL", "30"))
+# Reconciling reads only users changed since the last pass; deleted users
+# are dropped by a full read of "user" this often.
+LEADERBOARD_FULL_RELOAD_INTERVAL = float(os.getenv("LEADERBOARD_FULL_RELOAD_INTERVAL", "600"))
+
+# Money ledger (migration 008). Each balance change writes its entry in the
+# same statement. On LEDGER_COMPACT_SCHEDULE (cron, UTC) the scheduler's
+# leader folds the entries of committed transactions into money_balance.
+LEDGER_COMPACT_SCHEDULE = os.getenv("LEDGER_COMPACT_SCHEDULE", "*/5 * * * *")
+LEDGER_PAGE_SIZE = 50
+LEDGER_MAX_PAGE_SIZE = 200
+
+# Bulk export/import (app/db/transfer.py, scripts/garden_data.py). Signed-in
+# users whose email is in ADMIN_EMAILS (comma-separated) may use /admin.
+ADMIN_EMAILS = frozenset(
+    email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()
+)
+# Rows per export chunk: one file from the CLI, one response from
+# GET /admin/export/{table}.
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "100000"))
+EXPORT_MAX_CHUNK_ROWS = 1000000
+# Rows COPY'd into the staging table per import transaction.
+IMPORT_BATCH_ROWS = 10000
+
+# Username search
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MAX_OFFSET = 1000
+# Queries shorter than this only get prefix matches, not one-typo matches.
+SEARCH_FUZZY_MIN_LENGTH = 3
+# Nor do longer ones: a one-typo search looks up about 2 * length *
+# alphabet variants, and /users/search needs no token.
+SEARCH_FUZZY_MAX_LENGTH = 20
+# Typos are tried with this many of the characters most common in
+# usernames, not every character any username contains.
+SEARCH_FUZZY_ALPHABET_SIZE = 40
+
+# "client": growth only advances when the client calls /grow.
+# "server": watering/fertilizing stamps plant.ready_at and growth is evaluated
+# lazily from the wall clock on read.
+GROWTH_MODE = os.getenv("GROWTH_MODE", "client")
+# Growth times below are in minutes of wall-clock time in server mode.
+GROWTH_TIME_UNIT_SECONDS = float(os.getenv("GROWTH_TIME_UNIT_SECONDS", "60"))
+
 # Game constants
 WATER_COST = 25
 FERTILIZER_COST = 25
@@ -14,10 +169,27 @@ PLANT_COST = 100
 INITIAL_USER_MONEY = 250.0
 INITIAL_PLANT_LIMIT = 25
 INITIAL_WEATHER = 0
+# Usernames are "<email local part>#NNNN"; tags per base name
+USERNAME_TAGS = 10000
+# Tags claimed from the counter before falling back to a freed one
+USERNAME_TAG_ATTEMPTS = 3
 PLANT_LIMIT_BASE_COST = 1000
 PLANT_LIMIT_COST_MULTIPLIER = 1.1
 PLANT_LIMIT_INCREASE = 25
 STAGE_0_GROWTH_TIME = 30
+# Most plants one batch buy/sell request may name
+PLANT_BATCH_MAX_SIZE = 100
+# Most moves one PATCH /users/{email}/plants/positions request may carry
+PLANT_MOVE_BATCH_MAX_SIZE = 1000
+
+# Garden positions are pixels from the centre of the screen, y pointing up,
+# within +-GARDEN_EXTENT on both axes. Two plants overlap when they are less
+# than PLANT_SPACING apart on both axes, the same test the web client makes
+# before placing one.
+GARDEN_EXTENT = 5000
+PLANT_SPACING = 30
+# How far GET /users/{email}/plants/free-slot looks around the requested point.
+FREE_SLOT_SEARCH_RADIUS = 600
 
 PLANT_SPECIES = {
     "fungi": {
@@ -43,10 +215,31 @@ RARITY_PROBABILITIES = {
     2: 0.01   # Legendary
 }
 
+# Key for the per-user roll streams (app.core.rolls). Without it a user's
+# seeds follow from their email alone, so anyone could tell their next
+# plant before buying it. Keep it secret, and the same across deploys so
+# the seeds in money_ledger can be checked against their users.
+ROLL_SEED_KEY = os.getenv("ROLL_SEED_KEY", "")
+
 STAGE_1_GROWTH_TIMES = {0: 60, 1: 120, 2: 360}
 
+STAGE_1_FERTILIZER_REQUIRED = {0: 1, 1: 2, 2: 5}
+
 STAGE_1_SELL_VALUES = {0: 50, 1: 100, 2: 250}
 STAGE_2_SELL_VALUES = {0: 100, 1: 200, 2: 500}
 
+# Pomodoro rewards as the client computes them: a base amount (125 coins
+# for a work session, less for breaks), times 1 plus each grown plant's
+# income bonus by stage and rarity, times SUNNY_REWARD_MULTIPLIER in sunny
+# weather, rounded down. PATCH /users/{email}/money accepts no more than a
+# work session would award the caller's garden.
+SESSION_REWARD_BASE = 125
+INCOME_BONUS = {
+    1: {0: 0.005, 1: 0.01, 2: 0.025},
+    2: {0: 0.01, 1: 0.02, 2: 0.05},
+}
+SUNNY_WEATHER = 2
+SUNNY_REWARD_MULTIPLIER = 1.5
+
 # CORS origins - use "*" to allow all origins, or list specific ones
 CORS_ORIGINS = ["*"]
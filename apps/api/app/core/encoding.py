@@ -0,0 +1,56 @@
+import time
+
+import msgpack
+import orjson
+from fastapi import Request, Response
+
+from app.core.metrics import record_phase
+
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+
+
+def dumps(value):
+    """JSON bytes. orjson handles datetimes, so rows need no pre-pass."""
+    started = time.perf_counter()
+    body = orjson.dumps(value)
+    record_phase("serialize", time.perf_counter() - started)
+    return body
+
+
+def json_response(value, status_code=200, headers=None):
+    # Returning a Response skips FastAPI's jsonable_encoder walk over the
+    # whole payload.
+    return Response(dumps(value), status_code, headers, media_type="application/json")
+
+
+def wants_msgpack(request: Request):
+    accept = request.headers.get("accept", "")
+    return any(media_type in accept for media_type in MSGPACK_TYPES)
+
+
+def encode(value, msgpack_body):
+    """`(body, media_type)` for `value` as MessagePack or JSON."""
+    if msgpack_body:
+        # datetime=True packs timezone-aware datetimes as the timestamp ext type.
+        started = time.perf_counter()
+        body = msgpack.packb(value, datetime=True)
+        record_phase("serialize", time.perf_counter() - started)
+        return body, MSGPACK
+    return dumps(value), "application/json"
+
+
+def columns(rows, fields):
+    """Column-major form of a list of dicts: one list per field."""
+    return {field: [row[field] for row in rows] for field in fields}
+
+
+def etag_matches(request: Request, etag):
+    """Weak If-None-Match comparison against `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
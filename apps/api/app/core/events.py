@@ -0,0 +1,162 @@
+import asyncio
+import json
+import uuid
+from collections import defaultdict
+
+import asyncpg
+
+from app.core.config import DATABASE_URL, GARDEN_EVENTS_NOTIFY, GARDEN_EVENTS_QUEUE_SIZE
+from app.core.encoding import dumps
+
+CHANNEL = "garden_events"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more.
+MAX_NOTIFY_PAYLOAD = 7900
+
+# Deltas waiting for NOTIFY while the relay connection is down.
+RELAY_BACKLOG = 10000
+
+# Queued in place of the backlog when a subscriber falls behind; the stream
+# answers it with a fresh snapshot.
+RESYNC = None
+
+
+def encode_json(value):
+    return dumps(value).decode()
+
+
+class GardenEvents:
+    """Fan-out of per-garden deltas to streaming subscribers.
+
+    A delta is a dict with any of `plants` (partial plant rows, keyed by
+    `plant_id`), `removed` (plant ids), `user` (changed user fields) and
+    `deleted`. Every value is absolute, so applying a delta twice is harmless.
+
+    Deltas reach this worker's subscribers directly. With NOTIFY enabled they
+    are also sent on the `garden_events` channel, and deltas published by
+    other workers arrive through LISTEN on the same dedicated connection.
+    """
+
+    def __init__(self, notify, queue_size):
+        self.notify = notify
+        self.queue_size = queue_size
+        self.worker_id = uuid.uuid4().hex
+        self._subscribers = defaultdict(set)
+        self._outbox = None
+        self._task = None
+        self._remote_listeners = []
+        self.published = 0
+        self.relayed = 0
+        self.resyncs = 0
+
+    def subscribe(self, email):
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers[email].add(queue)
+        return queue
+
+    def unsubscribe(self, email, queue):
+        subscribers = self._subscribers.get(email)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[email]
+
+    def _deliver(self, email, delta):
+        for queue in self._subscribers.get(email, ()):
+            try:
+                queue.put_nowait(delta)
+            except asyncio.QueueFull:
+                # Drop the backlog; the stream resends a snapshot instead.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+                self.resyncs += 1
+
+    def publish(self, email, *, plants=None, removed=None, user=None, deleted=False):
+        delta = {}
+        if plants:
+            delta["plants"] = plants
+        if removed:
+            delta["removed"] = removed
+        if user:
+            delta["user"] = user
+        if deleted:
+            delta["deleted"] = True
+        if not delta:
+            return
+
+        self.published += 1
+        self._deliver(email, delta)
+        if self._outbox is not None:
+            try:
+                self._outbox.put_nowait((email, delta))
+            except asyncio.QueueFull:
+                print("Garden event relay backlog full, dropping delta for", email)
+
+    def on_remote(self, callback):
+        """Call `callback(email)` for every delta relayed from another
+        worker, before it reaches this worker's subscribers."""
+        self._remote_listeners.append(callback)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        message = json.loads(payload)
+        if message["o"] == self.worker_id:
+            return
+        self.relayed += 1
+        for callback in self._remote_listeners:
+            callback(message["e"])
+        # A None delta was too large to relay and becomes a RESYNC.
+        self._deliver(message["e"], message["d"])
+
+    async def _relay(self):
+        conn = None
+        while True:
+            try:
+                if conn is None or conn.is_closed():
+                    conn = await asyncpg.connect(DATABASE_URL)
+                    await conn.add_listener(CHANNEL, self._on_notify)
+
+                email, delta = await self._outbox.get()
+                payload = encode_json({"o": self.worker_id, "e": email, "d": delta})
+                if len(payload.encode()) > MAX_NOTIFY_PAYLOAD:
+                    # Too large for NOTIFY; other workers resync instead.
+                    payload = encode_json({"o": self.worker_id, "e": email, "d": None})
+                await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+            except asyncio.CancelledError:
+                if conn is not None:
+                    await conn.close()
+                raise
+            except Exception as e:
+                print("Garden event relay failed:", e)
+                if conn is not None:
+                    conn.terminate()
+                    conn = None
+                await asyncio.sleep(1)
+
+    async def start(self):
+        if not self.notify:
+            return
+        self._outbox = asyncio.Queue(RELAY_BACKLOG)
+        self._task = asyncio.create_task(self._relay())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._outbox = None
+
+    def stats(self):
+        return {
+            "gardens": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "relayed": self.relayed,
+            "resyncs": self.resyncs,
+        }
+
+
+garden_events = GardenEvents(GARDEN_EVENTS_NOTIFY, GARDEN_EVENTS_QUEUE_SIZE)
@@ -0,0 +1,65 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import (
+    GROWTH_MODE,
+    GROWTH_TIME_UNIT_SECONDS,
+    STAGE_1_FERTILIZER_REQUIRED,
+    STAGE_1_GROWTH_TIMES,
+)
+
+SERVER_GROWTH = GROWTH_MODE == "server"
+
+# Indexed by rarity + 1 inside SQL (Postgres arrays are 1-based).
+FERTILIZER_BY_RARITY = [
+    STAGE_1_FERTILIZER_REQUIRED[r] for r in sorted(STAGE_1_FERTILIZER_REQUIRED)
+]
+STAGE_1_GROWTH_BY_RARITY = [STAGE_1_GROWTH_TIMES[r] for r in sorted(STAGE_1_GROWTH_TIMES)]
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def ready_at_after(growth_time, now=None):
+    """Timestamp at which a timer of `growth_time` units started now completes."""
+    now = now or utcnow()
+    return now + timedelta(seconds=growth_time * GROWTH_TIME_UNIT_SECONDS)
+
+
+def stage_1_ready_at_by_rarity(now=None):
+    """`ready_at` for a stage 1 timer started now, per rarity (None in client mode)."""
+    if not SERVER_GROWTH:
+        return None
+    return [ready_at_after(growth_time, now) for growth_time in STAGE_1_GROWTH_BY_RARITY]
+
+
+def effective_plant(plant, now=None):
+    """Return the plant as it is at `now`, evaluating its wall-clock timer.
+
+    Plants without `ready_at` are returned unchanged. Nothing is written; the
+    stored row catches up on the next mutation that touches the plant.
+    """
+    ready_at = plant.get("ready_at")
+    if ready_at is None:
+        return plant
+
+    now = now or utcnow()
+    remaining = (ready_at - now).total_seconds()
+    plant = dict(plant)
+
+    if remaining > 0:
+        plant["growth_time_remaining"] = math.ceil(remaining / GROWTH_TIME_UNIT_SECONDS)
+        return plant
+
+    if plant["stage"] >= 2:
+        return plant
+
+    plant["stage"] += 1
+    plant["growth_time_remaining"] = None
+    plant["ready_at"] = None
+    if plant["stage"] == 1:
+        plant["fertilizer_remaining"] = STAGE_1_FERTILIZER_REQUIRED.get(plant["rarity"], 1)
+    else:
+        plant["fertilizer_remaining"] = None
+    return plant
@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+
+import orjson
+from fastapi import HTTPException, Request, Response
+
+from app.core.cache import LocalBackend, RedisBackend
+from app.core.config import (
+    IDEMPOTENCY_BACKEND,
+    IDEMPOTENCY_MAX_ENTRIES,
+    IDEMPOTENCY_TTL,
+    READ_CACHE_REDIS_POOL_SIZE,
+    READ_CACHE_REDIS_TIMEOUT,
+    READ_CACHE_REDIS_URL,
+)
+from app.core.locks import UserWriteRoute
+from app.core.security import authenticate
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Refusals a retry of the same request would get again. 409 (changed
+# concurrently), 429 (write queue full) and 5xx are not among them: the
+# client is told to try again, so those are never stored.
+FINAL_CLIENT_ERRORS = {400, 402, 403, 404, 422}
+
+
+def is_final(status):
+    return 200 <= status < 300 or status in FINAL_CLIENT_ERRORS
+
+
+def fingerprint(request, body):
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    digest.update(body)
+    return digest.digest()
+
+
+def outcome_response(outcome, replayed):
+    headers = {REPLAYED_HEADER: "true"} if replayed else None
+    return Response(
+        outcome["body"],
+        status_code=outcome["status"],
+        media_type=outcome["media_type"],
+        headers=headers,
+    )
+
+
+class IdempotencyStore:
+    """Outcomes of mutations sent with an `Idempotency-Key`, for `ttl` seconds.
+
+    The first request with a key runs; its response is stored if it is
+    final, a 2xx or a refusal that would not change (`is_final`). Anything
+    else, such as a 409 asking the client to try again, only goes to the
+    requests already waiting on it, so a later retry runs for real. Later
+    requests with the same key and the same method, path and body get the
+    stored response back without touching Postgres, and requests arriving
+    while the first is still running wait for it instead of running again.
+    The same key with a different request is refused with 422.
+
+    Waiting is per worker; with the `redis` backend a retry that lands on
+    another worker after the first finished is still a replay.
+    """
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight = {}
+        self.executions = 0
+        self.replays = 0
+        self.coalesced = 0
+        self.mismatches = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _mismatch(self):
+        self.mismatches += 1
+        return HTTPException(
+            status_code=422,
+            detail=f"{HEADER} was already used for a different request",
+        )
+
+    async def run(self, key, request_fingerprint, execute):
+        """Return `(outcome, replayed)` for `key`, running `execute()` at
+        most once. `execute()` returns a Response or raises HTTPException."""
+        try:
+            stored = await self.backend.get(key)
+        except Exception:
+            self.errors += 1
+            stored = None
+        if stored is not None:
+            if stored["fingerprint"] != request_fingerprint:
+                raise self._mismatch()
+            self.replays += 1
+            return stored, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            task, inflight_fingerprint = inflight
+            if inflight_fingerprint != request_fingerprint:
+                raise self._mismatch()
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(self._execute(key, request_fingerprint, execute))
+        self._inflight[key] = (task, request_fingerprint)
+        # Shielded so a client that disconnects mid-write doesn't cancel the
+        # execution its own retry is about to wait on.
+        return await asyncio.shield(task), False
+
+    async def _execute(self, key, request_fingerprint, execute):
+        try:
+            self.executions += 1
+            try:
+                response = await execute()
+                outcome = {
+                    "status": response.status_code,
+                    "body": bytes(response.body),
+                    "media_type": response.media_type,
+                }
+            except HTTPException as e:
+                if e.status_code >= 500:
+                    raise
+                outcome = {
+                    "status": e.status_code,
+                    "body": orjson.dumps({"detail": e.detail}),
+                    "media_type": "application/json",
+                }
+
+            if is_final(outcome["status"]):
+                outcome["fingerprint"] = request_fingerprint
+                try:
+                    await self.backend.set(key, outcome, self.ttl)
+                except Exception:
+                    # The first response still goes out; a retry runs again.
+                    self.errors += 1
+            return outcome
+        finally:
+            del self._inflight[key]
+
+    def purge_expired(self):
+        return self.backend.purge_expired()
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "executions": self.executions,
+            "replays": self.replays,
+            "coalesced": self.coalesced,
+            "mismatches": self.mismatches,
+            "inflight": len(self._inflight),
+            "errors": self.errors,
+            **self.backend.stats(),
+        }
+
+
+class IdempotentRoute(UserWriteRoute):
+    """Route class that honours `Idempotency-Key` on POST, PUT, PATCH and
+    DELETE, on top of `UserWriteRoute`'s per-user write queue. Requests
+    without the header are handled as before.
+
+    Keys are scoped to the caller's verified email, so a replay needs the
+    same credentials as the original request.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not self.methods & METHODS:
+            return handler
+
+        # Outside the write queue: a retry waits on the original execution
+        # instead of queueing behind it.
+        async def idempotent_handler(request: Request) -> Response:
+            key = request.headers.get(HEADER)
+            if key is None or not idempotency_store.enabled:
+                return await handler(request)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters",
+                )
+
+            # Verified once: the write queue and the route's own dependency
+            # reuse it.
+            email = await authenticate(request)
+            # Request caches the body, so the handler can still read it.
+            body = await request.body()
+            outcome, replayed = await idempotency_store.run(
+                f"idempotency:{email}:{key}",
+                fingerprint(request, body),
+                lambda: handler(request),
+            )
+            return outcome_response(outcome, replayed)
+
+        return idempotent_handler
+
+
+def create_backend():
+    if IDEMPOTENCY_BACKEND == "redis":
+        return RedisBackend(READ_CACHE_REDIS_URL, READ_CACHE_REDIS_POOL_SIZE, READ_CACHE_REDIS_TIMEOUT)
+    return LocalBackend(IDEMPOTENCY_MAX_ENTRIES)
+
+
+idempotency_store = IdempotencyStore(create_backend(), IDEMPOTENCY_TTL)
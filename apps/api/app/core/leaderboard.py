@@ -0,0 +1,310 @@
+import base64
+import json
+import random
+import time
+from collections import deque
+
+from app.core.config import LEADERBOARD_FULL_RELOAD_INTERVAL
+
+# Every statement that writes a "user" row sets its garden_version from this
+# sequence (migration 004); last_value is the latest one handed out.
+CURRENT_VERSION = "SELECT last_value FROM garden_version_seq"
+SNAPSHOT = 'SELECT username, email, money FROM "user"'
+# Index scan on user_garden_version_idx (migration 009).
+CHANGED_SINCE = 'SELECT username, email, money FROM "user" WHERE garden_version > $1'
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["money"], row["email"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Return `(money, email)` from a cursor, or raise ValueError."""
+    try:
+        money, email = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(money), str(email)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        # width[i] = number of positions skipped by following next[i]
+        self.width = [1] * level
+
+
+class RankedSkipList:
+    """Indexable skip list of `(money, email)` keys in descending order.
+
+    Insert, remove, rank and positional lookup are all O(log n).
+    """
+
+    MAX_LEVEL = 32
+
+    def __init__(self):
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._size = 0
+        self._random = random.Random()
+
+    def __len__(self):
+        return self._size
+
+    def _random_level(self):
+        level = 1
+        while level < self.MAX_LEVEL and self._random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key):
+        chain = [None] * self.MAX_LEVEL
+        steps_at_level = [0] * self.MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key >= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new_level = self._random_level()
+        new_node = _Node(key, new_level)
+        steps = 0
+        for level in range(new_level):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(new_level, self.MAX_LEVEL):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain = [None] * self.MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key > key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def count_before(self, key):
+        """Number of keys ordered strictly before `key` (which need not be present)."""
+        node = self._head
+        position = -1
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key > key:
+                position += node.width[level]
+                node = node.next[level]
+        return position + 1
+
+    def slice(self, start, count):
+        """Up to `count` keys starting at 0-based position `start`."""
+        if start >= self._size or count <= 0:
+            return []
+
+        node = self._head
+        remaining = start + 1
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class Leaderboard:
+    """In-process leaderboard built from the `"user"` table.
+
+    Every balance-changing handler reports the new balance, so "top K",
+    keyset pages and "rank of user X" are answered without touching
+    Postgres. A reconciliation pass, scheduled every
+    LEADERBOARD_RECONCILE_INTERVAL, corrects drift, including writes handled
+    by other workers.
+
+    A pass only reads rows whose garden_version moved since the start of the
+    pass before the last one, so a write whose transaction was still open
+    when its version was handed out is read once it commits, as long as that
+    takes less than a reconcile interval. Deleted users leave no row to
+    read; they drop out on the full reload every `full_reload_interval`
+    seconds (and on the first two passes, before there is a version to
+    start from).
+    """
+
+    def __init__(self, full_reload_interval):
+        self.full_reload_interval = full_reload_interval
+        self._ranking = RankedSkipList()
+        self._entries = {}
+        self._touched = {}
+        self._snapshot_listeners = []
+        # garden_version_seq at the start of the last two passes, oldest first.
+        self._versions = deque(maxlen=2)
+        self._next_full_reload = 0.0
+        self.ready = False
+        self.reconciliations = 0
+        self.full_reloads = 0
+        self.drift_corrections = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, rows):
+        ranking = RankedSkipList()
+        entries = {}
+        for row in rows:
+            entries[row["email"]] = (row["money"], row["username"])
+            ranking.insert((row["money"], row["email"]))
+        self._ranking = ranking
+        self._entries = entries
+        self._touched = {}
+        self.ready = True
+
+    def record_balance(self, email, money, username=None):
+        if not self.ready:
+            return
+
+        previous = self._entries.get(email)
+        if previous is not None:
+            self._ranking.remove((previous[0], email))
+            if username is None:
+                username = previous[1]
+        elif username is None:
+            # Unknown user; the next reconciliation will add them.
+            return
+
+        self._ranking.insert((money, email))
+        self._entries[email] = (money, username)
+        self._touched[email] = time.monotonic()
+
+    def rename(self, email, username):
+        previous = self._entries.get(email)
+        if previous is not None:
+            self._entries[email] = (previous[0], username)
+            self._touched[email] = time.monotonic()
+
+    def remove(self, email):
+        previous = self._entries.pop(email, None)
+        if previous is not None:
+            self._ranking.remove((previous[0], email))
+        self._touched[email] = time.monotonic()
+
+    def _row(self, key):
+        money, email = key
+        return {"username": self._entries[email][1], "email": email, "money": money}
+
+    def top(self, limit):
+        return [self._row(key) for key in self._ranking.slice(0, limit)]
+
+    def page_after(self, money, email, limit):
+        """Rows ordered after the `(money, email)` cursor."""
+        start = self._ranking.count_before((money, email))
+        if self._entries.get(email, (None,))[0] == money:
+            start += 1
+        return [self._row(key) for key in self._ranking.slice(start, limit)]
+
+    def rank(self, email):
+        entry = self._entries.get(email)
+        if entry is None:
+            return None
+        row = {"username": entry[1], "email": email, "money": entry[0]}
+        row["rank"] = self._ranking.count_before((entry[0], email)) + 1
+        return row
+
+    def reconcile(self, rows, started_at, complete=True):
+        """Apply database rows read at `started_at`: every user when
+        `complete`, otherwise only those that changed.
+
+        Entries this worker changed after the read began are newer than the
+        rows and are left alone.
+        """
+        seen = set()
+        for row in rows:
+            email = row["email"]
+            seen.add(email)
+            if self._touched.get(email, 0.0) > started_at:
+                continue
+            if self._entries.get(email) != (row["money"], row["username"]):
+                self.drift_corrections += 1
+                self.record_balance(email, row["money"], row["username"])
+
+        if complete:
+            for email in list(self._entries):
+                if email not in seen and self._touched.get(email, 0.0) <= started_at:
+                    self.drift_corrections += 1
+                    self.remove(email)
+
+        self._touched = {
+            email: touched for email, touched in self._touched.items() if touched > started_at
+        }
+        self.reconciliations += 1
+
+    async def refresh(self, conn):
+        started_at = time.monotonic()
+        complete = (
+            not self.ready
+            or len(self._versions) < self._versions.maxlen
+            or started_at >= self._next_full_reload
+        )
+        version = await conn.fetchval(CURRENT_VERSION)
+        if complete:
+            rows = await conn.fetch(SNAPSHOT)
+            self._next_full_reload = started_at + self.full_reload_interval
+            self.full_reloads += 1
+        else:
+            rows = await conn.fetch(CHANGED_SINCE, self._versions[0])
+        self._versions.append(version)
+
+        if self.ready:
+            self.reconcile(rows, started_at, complete)
+        else:
+            self.load(rows)
+        for callback in self._snapshot_listeners:
+            callback(rows, started_at, complete)
+
+    def on_snapshot(self, callback):
+        """Call `callback(rows, started_at, complete)` with the `"user"` rows
+        of every pass, so other per-worker indexes can reconcile without
+        their own read."""
+        self._snapshot_listeners.append(callback)
+
+    async def refresh_from(self, pool):
+        async with pool.acquire() as conn:
+            await self.refresh(conn)
+
+    async def start(self, pool):
+        try:
+            await self.refresh_from(pool)
+        except Exception as e:
+            print("Initial leaderboard load failed:", e)
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "users": len(self._entries),
+            "reconciliations": self.reconciliations,
+            "full_reloads": self.full_reloads,
+            "drift_corrections": self.drift_corrections,
+        }
+
+
+leaderboard = Leaderboard(LEADERBOARD_FULL_RELOAD_INTERVAL)
@@ -0,0 +1,118 @@
+"""Append-only money ledger (migration 008).
+
+An audit log: "user".money is still the balance purchases are checked
+against and debited, and stays the row concurrent writes queue on. Every
+statement in app.db.queries that changes it appends one money_ledger entry
+in the same statement, so an entry commits exactly when its change does.
+
+`compact`, run by the scheduler's leader on LEDGER_COMPACT_SCHEDULE, folds
+new entries into money_balance, a running total per user, and records how
+far it is from the balance the latest entry saw.
+"""
+
+# Reason codes, as written by the statements in app.db.queries.
+SIGNUP = "signup"
+PLANT_PURCHASE = "plant_purchase"
+WATER = "water"
+FERTILIZER = "fertilizer"
+PLANT_SALE = "plant_sale"
+SESSION_REWARD = "session_reward"
+PLANT_LIMIT_UPGRADE = "plant_limit_upgrade"
+# Written by migration 008 for users that existed before the ledger.
+OPENING_BALANCE = "opening_balance"
+
+# Amounts and balances are double precision, like "user".money, so a
+# running total can be a few ULPs off the balance without anything missing.
+# Drift counts once it reaches a hundredth of a coin.
+DRIFT_TOLERANCE = 0.01
+
+# One statement, so the folded totals and the new watermark commit together.
+# SKIP LOCKED keeps two runs from overlapping should two workers both
+# believe they lead.
+#
+# The watermark is a transaction id. Every transaction older than the
+# snapshot's xmin has committed or rolled back, so entries written before
+# it are all visible and no more can appear; a run folds those it hasn't
+# yet. An entry whose transaction began before a run and committed after
+# it is therefore folded by a later run rather than skipped, as it would
+# be by a timestamp (now() is the transaction's start). A long-open
+# transaction only holds compaction back.
+#
+# `latest` is the balance seen by a user's highest-versioned entry so far;
+# an entry that arrives late with a lower version still adds to the total.
+COMPACT = """
+    WITH state AS (
+        SELECT compacted_to, pg_snapshot_xmin(pg_current_snapshot()) AS cutoff
+        FROM money_ledger_compaction
+        FOR UPDATE SKIP LOCKED
+    ),
+    batch AS (
+        SELECT l.email,
+               sum(l.amount) AS amount,
+               count(*) AS entries,
+               max(l.garden_version) AS garden_version,
+               (array_agg(l.balance ORDER BY l.garden_version DESC))[1] AS latest
+        FROM money_ledger l, state
+        WHERE l.written_xid >= state.compacted_to AND l.written_xid < state.cutoff
+        GROUP BY l.email
+    ),
+    totals AS (
+        SELECT batch.email,
+               COALESCE(b.balance, 0) + batch.amount AS balance,
+               GREATEST(b.garden_version, batch.garden_version) AS garden_version,
+               COALESCE(b.entries, 0) + batch.entries AS entries,
+               CASE
+                   WHEN b.garden_version > batch.garden_version THEN b.balance + b.drift
+                   ELSE batch.latest
+               END AS latest
+        FROM batch
+        LEFT JOIN money_balance b ON b.email = batch.email
+    ),
+    folded AS (
+        INSERT INTO money_balance (email, balance, garden_version, entries, drift, compacted_at)
+        SELECT email, balance, garden_version, entries, latest - balance, now()
+        FROM totals
+        ON CONFLICT (email) DO UPDATE
+        SET balance = EXCLUDED.balance,
+            garden_version = EXCLUDED.garden_version,
+            entries = EXCLUDED.entries,
+            drift = EXCLUDED.drift,
+            compacted_at = EXCLUDED.compacted_at
+        RETURNING drift
+    ),
+    advanced AS (
+        UPDATE money_ledger_compaction SET compacted_to = state.cutoff
+        FROM state
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM advanced) AS ran,
+           (SELECT COALESCE(sum(entries), 0)::bigint FROM batch) AS entries,
+           (SELECT count(*) FROM folded) AS users,
+           (SELECT count(*) FROM folded WHERE abs(drift) >= $1) AS drifted
+"""
+
+
+class MoneyLedger:
+    def __init__(self):
+        self.compactions = 0
+        self.compacted_entries = 0
+        self.drifted_users = 0
+
+    async def compact(self, pool):
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(COMPACT, DRIFT_TOLERANCE)
+        if row["ran"]:
+            self.compactions += 1
+            self.compacted_entries += row["entries"]
+            self.drifted_users += row["drifted"]
+        return row
+
+    def stats(self):
+        return {
+            "compactions": self.compactions,
+            "compacted_entries": self.compacted_entries,
+            "drifted_users": self.drifted_users,
+        }
+
+
+money_ledger = MoneyLedger()
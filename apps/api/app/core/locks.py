@@ -0,0 +1,110 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
+from app.core.config import USER_WRITE_QUEUE_LIMIT
+from app.core.security import authenticate
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class UserWriteLocks:
+    """One FIFO lock per user with writes in flight on this worker.
+
+    Same-user writes queue here instead of each holding a pool connection
+    while it waits on the user's row lock in Postgres. Writes for different
+    users never share a lock. A lock exists only while someone holds or
+    waits for it; once `queue_limit` requests hold or wait for one user's
+    lock, further ones are refused with 429.
+    """
+
+    def __init__(self, queue_limit):
+        self.queue_limit = queue_limit
+        # email -> [lock, holders + waiters]
+        self._locks = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self.rejected = 0
+        self.waiting = 0
+        self.max_queue_depth = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def hold(self, email):
+        entry = self._locks.get(email)
+        if entry is None:
+            entry = self._locks[email] = [asyncio.Lock(), 0]
+        lock = entry[0]
+        if entry[1] >= self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429, detail="Too many writes in progress for this user"
+            )
+
+        entry[1] += 1
+        try:
+            if lock.locked():
+                self.contended += 1
+                self.waiting += 1
+                self.max_queue_depth = max(self.max_queue_depth, entry[1] - 1)
+                start = time.perf_counter()
+                try:
+                    await lock.acquire()
+                finally:
+                    self.waiting -= 1
+                    waited = time.perf_counter() - start
+                    self.wait_seconds += waited
+                    self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            else:
+                await lock.acquire()
+            self.acquisitions += 1
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[email]
+
+    def stats(self):
+        return {
+            "users_locked": len(self._locks),
+            "waiting": self.waiting,
+            "queue_limit": self.queue_limit,
+            "max_queue_depth": self.max_queue_depth,
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "rejected": self.rejected,
+            "wait_ms_total": round(self.wait_seconds * 1e3, 3),
+            "wait_ms_mean": round(self.wait_seconds / self.contended * 1e3, 3) if self.contended else 0.0,
+            "wait_ms_max": round(self.max_wait_seconds * 1e3, 3),
+        }
+
+
+class UserWriteRoute(APIRoute):
+    """Route class that runs writes on `/…/{email}/…` paths one at a time
+    per user. The token is verified first and the lock keyed on the
+    verified email, so nobody can queue up another user's writes, and a
+    JWKS refetch never runs while a lock is held. The lock is taken before
+    the other dependencies are resolved, so a queued request holds no pool
+    connection."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not self.methods & WRITE_METHODS or "email" not in self.param_convertors:
+            return handler
+
+        async def serialized_handler(request: Request) -> Response:
+            email = await authenticate(request)
+            async with user_write_locks.hold(email):
+                return await handler(request)
+
+        return serialized_handler
+
+
+user_write_locks = UserWriteLocks(USER_WRITE_QUEUE_LIMIT)
@@ -0,0 +1,362 @@
+import contextvars
+import logging
+import re
+import time
+from bisect import bisect_left
+
+from app.core.config import SLOW_QUERY_LOG_SIZE, SLOW_QUERY_MS
+from app.core.tracing import (
+    SPAN_KIND_CLIENT,
+    SPAN_KIND_INTERNAL,
+    SPAN_KIND_SERVER,
+    Span,
+    new_span_id,
+    new_trace_id,
+    parse_traceparent,
+    span_exporter,
+)
+from app.db.queries import REGISTRY
+
+# Phases a request's time is split into; "other" is whatever is left of
+# the total (validation, handler code, FastAPI's own encoding).
+PHASES = ("auth", "pool_wait", "sql", "serialize", "other")
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+JOB_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+SPAN_NAMES = {"auth": "auth.verify_token", "pool_wait": "db.pool.acquire", "serialize": "serialize"}
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+# Hot queries by their text, so the slow-query log and SQL spans can say
+# which one ran.
+QUERY_NAMES = {query: name for name, query in REGISTRY.items()}
+
+
+class RequestTrace:
+    """Time spent per phase and statements sent by one request, plus its
+    spans when the request is sampled for tracing."""
+
+    __slots__ = ("phases", "statements", "trace_id", "span_id", "parent_id", "spans")
+
+    def __init__(self, trace_id=None, parent_id=None):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.statements = 0
+        self.trace_id = trace_id
+        self.span_id = new_span_id() if trace_id else None
+        self.parent_id = parent_id
+        self.spans = [] if trace_id else None
+
+    def add(self, phase, seconds, name=None, attributes=None, kind=SPAN_KIND_INTERNAL, error=False):
+        self.phases[phase] += seconds
+        if self.spans is not None:
+            end = time.time_ns()
+            self.spans.append(Span(
+                name or SPAN_NAMES[phase],
+                self.trace_id,
+                self.span_id,
+                kind,
+                end - int(seconds * 1e9),
+                end,
+                attributes,
+                error,
+            ))
+
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def record_phase(phase, seconds):
+    """Add `seconds` to `phase` of the request being handled, if any."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(phase, seconds)
+
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_normalized = {}
+
+
+def normalize_sql(query):
+    """`query` on one line with string and number literals replaced by `?`.
+    Parameters (`$1`) are kept, so the app's own queries stay distinct."""
+    normalized = _normalized.get(query)
+    if normalized is None:
+        text = _WHITESPACE.sub(" ", query).strip()
+        normalized = _LITERAL.sub(lambda m: m.group() if text[m.start() - 1:m.start()] == "$" else "?", text)
+        if len(_normalized) >= 1024:
+            _normalized.clear()
+        _normalized[query] = normalized
+    return normalized
+
+
+class SlowQueryLog:
+    """Statements that took at least `threshold` seconds, grouped by
+    normalized SQL. Keeps the `size` most recently seen groups."""
+
+    def __init__(self, threshold, size):
+        self.threshold = threshold
+        self.size = size
+        self._entries = {}
+        self.total = 0
+
+    def record(self, query, seconds, failed):
+        self.total += 1
+        normalized = normalize_sql(query)
+        entry = self._entries.pop(normalized, None)
+        if entry is None:
+            entry = {"name": QUERY_NAMES.get(query), "query": normalized, "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+        entry["count"] += 1
+        entry["errors"] += failed
+        entry["total_ms"] += seconds * 1e3
+        entry["max_ms"] = max(entry["max_ms"], seconds * 1e3)
+        entry["last_seen"] = time.time()
+        self._entries[normalized] = entry
+        if len(self._entries) > self.size:
+            del self._entries[next(iter(self._entries))]
+        slow_query_logger.warning(
+            "slow query %s(%.1f ms): %s",
+            f"{entry['name']} " if entry["name"] else "", seconds * 1e3, normalized,
+        )
+
+    def snapshot(self):
+        entries = sorted(self._entries.values(), key=lambda e: e["total_ms"], reverse=True)
+        return {
+            "threshold_ms": self.threshold * 1e3,
+            "total": self.total,
+            "queries": [
+                {**e, "total_ms": round(e["total_ms"], 3), "max_ms": round(e["max_ms"], 3),
+                 "mean_ms": round(e["total_ms"] / e["count"], 3)}
+                for e in entries
+            ],
+        }
+
+
+slow_queries = SlowQueryLog(SLOW_QUERY_MS / 1e3, SLOW_QUERY_LOG_SIZE)
+
+
+def on_query(record):
+    """asyncpg query logger, added to every pool connection. asyncpg calls
+    it with call_soon, so it runs in the context of the request that sent
+    the statement."""
+    trace = current_trace.get()
+    failed = record.exception is not None
+    if trace is not None:
+        trace.statements += 1
+        if trace.spans is not None:
+            normalized = normalize_sql(record.query)
+            trace.add(
+                "sql",
+                record.elapsed,
+                name=QUERY_NAMES.get(record.query) or normalized.split(" ", 1)[0].upper(),
+                attributes={"db.system.name": "postgresql", "db.query.text": normalized},
+                kind=SPAN_KIND_CLIENT,
+                error=failed,
+            )
+        else:
+            trace.phases["sql"] += record.elapsed
+    if record.elapsed >= slow_queries.threshold:
+        slow_queries.record(record.query, record.elapsed, failed)
+
+
+class Histogram:
+    """Prometheus histogram keyed by label values."""
+
+    def __init__(self, name, help, label_names, buckets):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            label_text = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+
+
+class Counter:
+    def __init__(self, name, help, label_names):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} counter")
+        for labels, value in sorted(self._values.items()):
+            label_text = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, labels))
+            lines.append(f"{self.name}{{{label_text}}} {value}")
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.requests = Counter(
+            "pomopatch_requests_total", "Requests handled.", ("method", "route", "status")
+        )
+        self.duration = Histogram(
+            "pomopatch_request_duration_seconds",
+            "Time from receiving a request to finishing its response.",
+            ("method", "route"),
+            LATENCY_BUCKETS,
+        )
+        self.phases = Histogram(
+            "pomopatch_request_phase_seconds",
+            "Request time by phase: auth, pool_wait, sql, serialize and other.",
+            ("method", "route", "phase"),
+            LATENCY_BUCKETS,
+        )
+        self.statements = Histogram(
+            "pomopatch_request_sql_statements",
+            "SQL statements sent per request.",
+            ("method", "route"),
+            STATEMENT_BUCKETS,
+        )
+
+    def observe(self, method, route, status, seconds, trace):
+        self.requests.inc((method, route, str(status)))
+        self.duration.observe((method, route), seconds)
+        phases = trace.phases
+        phases["other"] = max(0.0, seconds - sum(phases.values()))
+        for phase, spent in phases.items():
+            self.phases.observe((method, route, phase), spent)
+        self.statements.observe((method, route), trace.statements)
+
+    def render(self, lines):
+        for metric in (self.requests, self.duration, self.phases, self.statements):
+            metric.render(lines)
+
+
+request_metrics = RequestMetrics()
+
+
+class JobMetrics:
+    """Runs and durations of the jobs in `app.core.scheduler`."""
+
+    def __init__(self):
+        self.runs = Counter(
+            "pomopatch_job_runs_total", "Scheduled job runs by outcome.", ("job", "outcome")
+        )
+        self.duration = Histogram(
+            "pomopatch_job_duration_seconds", "Time a scheduled job run took.", ("job",), JOB_BUCKETS
+        )
+
+    def observe(self, job, outcome, seconds):
+        self.runs.inc((job, outcome))
+        self.duration.observe((job,), seconds)
+
+    def render(self, lines):
+        self.runs.render(lines)
+        self.duration.render(lines)
+
+
+job_metrics = JobMetrics()
+
+
+def render_stats(lines, prefix, stats):
+    """Numeric values of a `/health/*` stats dict as gauges."""
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"pomopatch_{prefix}_{key}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+
+
+def render_prometheus(stats):
+    """Prometheus text format: request metrics plus `stats`, a mapping of
+    metric prefix to stats dict."""
+    lines = []
+    request_metrics.render(lines)
+    job_metrics.render(lines)
+    lines.append("# HELP pomopatch_slow_queries_total Statements slower than SLOW_QUERY_MS.")
+    lines.append("# TYPE pomopatch_slow_queries_total counter")
+    lines.append(f"pomopatch_slow_queries_total {slow_queries.total}")
+    for prefix, values in stats.items():
+        render_stats(lines, prefix, values)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware that times each HTTP request by phase and records it
+    under its route template, e.g. `/users/{email}/garden`. Sampled requests
+    also become a server span with auth, pool, SQL and serialize children."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trace_id = parent_id = None
+        if span_exporter.enabled:
+            parent = parse_traceparent(_header(scope, b"traceparent"))
+            if span_exporter.should_sample(parent[2] if parent else None):
+                trace_id, parent_id = (parent[0], parent[1]) if parent else (new_trace_id(), None)
+        trace = RequestTrace(trace_id, parent_id)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        reset = current_trace.set(trace)
+        start_ns = time.time_ns()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_trace.reset(reset)
+            route = scope.get("route")
+            template = route.path if route is not None else "unmatched"
+            request_metrics.observe(scope["method"], template, status, elapsed, trace)
+            if trace.spans is not None:
+                root = Span(
+                    f"{scope['method']} {template}",
+                    trace.trace_id,
+                    trace.parent_id,
+                    SPAN_KIND_SERVER,
+                    start_ns,
+                    start_ns + int(elapsed * 1e9),
+                    {
+                        "http.request.method": scope["method"],
+                        "http.route": template,
+                        "http.response.status_code": status,
+                        "db.statements": trace.statements,
+                    },
+                    status >= 500,
+                )
+                root.span_id = trace.span_id
+                span_exporter.export([root, *trace.spans])
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
@@ -0,0 +1,90 @@
+import hashlib
+import struct
+from bisect import bisect_right
+from itertools import accumulate
+from statistics import NormalDist
+
+from app.core.config import PLANT_SPECIES, RARITY_PROBABILITIES, ROLL_SEED_KEY
+
+RARITIES = sorted(RARITY_PROBABILITIES)
+
+SPECIES_TABLE = {
+    plant_type: {rarity: tuple(species) for rarity, species in by_rarity.items()}
+    for plant_type, by_rarity in PLANT_SPECIES.items()
+}
+
+SIZE_MEAN = 0.5
+SIZE_STDDEV = 0.2
+
+# A plant is decoded from one 53-bit seed (53 so it survives a round trip
+# through a JavaScript number):
+#   bits 32-52  rarity, against RARITY_BOUNDS
+#   bits 12-31  species, scaled onto the rarity's species
+#   bits  0-11  size, an index into SIZE_QUANTILES
+SEED_BITS = 53
+RARITY_BITS = 21
+SPECIES_BITS = 20
+SIZE_BITS = 12
+_SEED_SHIFT = 64 - SEED_BITS
+_RARITY_SHIFT = SPECIES_BITS + SIZE_BITS
+_SPECIES_MASK = 2**SPECIES_BITS - 1
+_SIZE_MASK = 2**SIZE_BITS - 1
+
+# Upper bounds in the rarity field of every rarity but the last, which
+# takes everything above them, so float rounding in the probabilities
+# can't leave a gap at the top.
+RARITY_BOUNDS = [
+    round(cumulative * 2**RARITY_BITS)
+    for cumulative in accumulate(RARITY_PROBABILITIES[r] for r in RARITIES[:-1])
+]
+
+# Sizes are normal, clamped to [0, 1], read off the inverse CDF at the
+# midpoint of each of 2**SIZE_BITS equally likely slices.
+SIZE_QUANTILES = tuple(
+    max(0.0, min(1.0, NormalDist(SIZE_MEAN, SIZE_STDDEV).inv_cdf((i + 0.5) / 2**SIZE_BITS)))
+    for i in range(2**SIZE_BITS)
+)
+
+# Each plant is rolled from its own seed in its buyer's roll stream, at the
+# purchase's garden_version and the plant's index in the purchase, so a seed
+# is never handed out twice, even to an email that signs up again. It is the
+# top SEED_BITS bits of SHA-256(key || garden_version || index || email): 8
+# and 4 big-endian bytes, then the email in UTF-8. queries.LOCK_ROLLS
+# computes a purchase's seeds in Postgres as it takes the buyer's row lock,
+# and the purchase records them in its money_ledger entry; `user_seed` is
+# the same function, to check them with. A seed shows 53 of the 256 bits,
+# so the key can't be worked back from the seeds a user has seen.
+ROLL_SEED_HASH_KEY = hashlib.sha256(ROLL_SEED_KEY.encode()).digest()
+_POSITION = struct.Struct(">qi")
+
+
+def user_seed(email, garden_version, index):
+    """The seed of plant `index` of `email`'s purchase at `garden_version`."""
+    digest = hashlib.sha256(ROLL_SEED_HASH_KEY + _POSITION.pack(garden_version, index) + email.encode()).digest()
+    return int.from_bytes(digest[:8], "big") >> _SEED_SHIFT
+
+
+def roll_one(plant_type, seed):
+    """`(rarity, species, size)` of the plant `seed` rolls."""
+    rarity = RARITIES[bisect_right(RARITY_BOUNDS, seed >> _RARITY_SHIFT)]
+    choices = SPECIES_TABLE[plant_type][rarity]
+    species = choices[(seed >> SIZE_BITS & _SPECIES_MASK) * len(choices) >> SPECIES_BITS]
+    return rarity, species, SIZE_QUANTILES[seed & _SIZE_MASK]
+
+
+def roll(plant_types, seeds):
+    """Roll one plant per entry of `plant_types`, each from the seed at the
+    same index of `seeds`; the same plants as `roll_one` would.
+
+    Returns parallel lists `(rarities, species, sizes)`.
+    """
+    # roll_one, inlined: a call per plant costs about as much as the
+    # decoding does.
+    rarities, species, sizes = [], [], []
+    for plant_type, seed in zip(plant_types, seeds, strict=True):
+        rarity = RARITIES[bisect_right(RARITY_BOUNDS, seed >> _RARITY_SHIFT)]
+        choices = SPECIES_TABLE[plant_type][rarity]
+        rarities.append(rarity)
+        species.append(choices[(seed >> SIZE_BITS & _SPECIES_MASK) * len(choices) >> SPECIES_BITS])
+        sizes.append(SIZE_QUANTILES[seed & _SIZE_MASK])
+    return rarities, species, sizes
@@ -0,0 +1,258 @@
+"""Periodic jobs run inside each API worker.
+
+A job is an async callable run either every `interval` seconds or on a
+five-field cron schedule (UTC), each wait stretched by up to `jitter`
+seconds so the workers of a deployment don't all hit Postgres at once. A
+job never overlaps itself within a worker; a slow run delays the next one.
+
+Jobs that work on per-worker state (the leaderboard, signing keys, local
+caches) run on every worker. Jobs marked `leader` run only on the worker
+that holds the SCHEDULER_LOCK_KEY advisory lock on a dedicated connection;
+if that connection drops, the lock is released and another worker takes it
+within SCHEDULER_LEADER_CHECK_INTERVAL. Leadership is only checked that
+often, so two workers can briefly both lead: leader jobs must be safe to
+run twice.
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+
+from app.core.config import (
+    DATABASE_URL,
+    SCHEDULER_LEADER_CHECK_INTERVAL,
+    SCHEDULER_LEADER_ELECTION,
+    SCHEDULER_LOCK_KEY,
+)
+from app.core.metrics import job_metrics
+
+# (low, high) of minute, hour, day of month, month, day of week (0 and 7
+# are both Sunday).
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_cron_field(text, low, high):
+    values = set()
+    for part in text.split(","):
+        spec, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start, end = (int(n) for n in spec.split("-", 1))
+        else:
+            start = int(spec)
+            end = high if step > 1 else start
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f"{part!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """`minute hour day-of-month month day-of-week`, each `*`, `N`, `N-M`,
+    with an optional `/step`, or a comma-separated list of those. As in
+    cron, when both day fields are restricted a day matching either counts."""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected 5 cron fields, got {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_cron_field(text, low, high) for text, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+        # Fails now for a schedule that never fires, such as "0 0 30 2 *".
+        self.next_after(datetime(2000, 1, 1, tzinfo=timezone.utc))
+
+    def _day_matches(self, moment):
+        in_days = moment.day in self.days
+        # isoweekday(): Monday is 1, Sunday 7.
+        in_weekdays = moment.isoweekday() % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment):
+        """The first matching minute strictly after `moment`."""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Each miss skips a whole month, day or hour where it can; eight
+        # years covers every day-of-month and weekday combination.
+        for _ in range(8 * 366 * 24):
+            if moment.month not in self.months:
+                year, month = divmod(moment.month, 12)
+                moment = moment.replace(year=moment.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron schedule {self.expression!r} never fires")
+
+
+class Job:
+    def __init__(self, name, func, interval=None, cron=None, jitter=0.0, leader=False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = cron
+        self.jitter = jitter
+        self.leader = leader
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.running = False
+        self.last_started_at = None
+        self.last_duration = None
+        self.last_error = None
+
+    def next_delay(self):
+        if self.cron is not None:
+            now = datetime.now(timezone.utc)
+            delay = (self.cron.next_after(now) - now).total_seconds()
+        else:
+            delay = self.interval
+        return delay + random.uniform(0, self.jitter)
+
+    def stats(self):
+        return {
+            "schedule": self.cron.expression if self.cron is not None else f"every {self.interval:g}s",
+            "leader_only": self.leader,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "running": self.running,
+            "last_started_at": self.last_started_at,
+            "last_duration_ms": round(self.last_duration * 1e3, 3) if self.last_duration is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    def __init__(self, leader_election, lock_key, leader_check_interval):
+        self.leader_election = leader_election
+        self.lock_key = lock_key
+        self.leader_check_interval = leader_check_interval
+        self._jobs = {}
+        self._tasks = []
+        self._started = False
+        self._leader = False
+        self.leader_changes = 0
+
+    @property
+    def is_leader(self):
+        return self._leader or not self.leader_election
+
+    def _set_leader(self, leader):
+        if leader != self._leader:
+            self._leader = leader
+            self.leader_changes += 1
+
+    def every(self, name, interval, func, jitter=0.0, leader=False):
+        self._add(Job(name, func, interval=interval, jitter=jitter, leader=leader))
+
+    def cron(self, name, expression, func, jitter=0.0, leader=False):
+        self._add(Job(name, func, cron=CronSchedule(expression), jitter=jitter, leader=leader))
+
+    def _add(self, job):
+        if job.name in self._jobs:
+            raise ValueError(f"Job {job.name!r} is already scheduled")
+        self._jobs[job.name] = job
+        if self._started:
+            self._tasks.append(asyncio.create_task(self._job_loop(job)))
+
+    async def run(self, name):
+        """Run a job now, whether or not this worker leads."""
+        job = self._jobs[name]
+        job.running = True
+        job.last_started_at = datetime.now(timezone.utc).isoformat()
+        started = time.perf_counter()
+        try:
+            await job.func()
+        except Exception as e:
+            outcome = "failure"
+            job.failures += 1
+            job.last_error = f"{type(e).__name__}: {e}"
+            print(f"Scheduled job {name} failed:", e)
+        else:
+            outcome = "success"
+            job.last_error = None
+        finally:
+            job.running = False
+        job.runs += 1
+        job.last_duration = time.perf_counter() - started
+        job_metrics.observe(name, outcome, job.last_duration)
+
+    async def _job_loop(self, job):
+        while True:
+            await asyncio.sleep(job.next_delay())
+            if job.leader and not self.is_leader:
+                job.skipped += 1
+                continue
+            await self.run(job.name)
+
+    async def _campaign(self):
+        conn = None
+        try:
+            while True:
+                try:
+                    if conn is None or conn.is_closed():
+                        self._set_leader(False)
+                        conn = await asyncpg.connect(
+                            DATABASE_URL, server_settings={"application_name": "pomopatch-scheduler"}
+                        )
+                    if self._leader:
+                        # The lock lasts as long as the session does.
+                        await conn.fetchval("SELECT 1")
+                    else:
+                        self._set_leader(
+                            await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_key)
+                        )
+                except Exception as e:
+                    print("Scheduler leader election failed:", e)
+                    self._set_leader(False)
+                    if conn is not None:
+                        conn.terminate()
+                        conn = None
+                await asyncio.sleep(self.leader_check_interval)
+        finally:
+            # Closing the session releases the lock for another worker.
+            self._set_leader(False)
+            if conn is not None:
+                await conn.close()
+
+    async def start(self):
+        if self._started:
+            return
+        self._started = True
+        if self.leader_election:
+            self._tasks.append(asyncio.create_task(self._campaign()))
+        self._tasks.extend(asyncio.create_task(self._job_loop(job)) for job in self._jobs.values())
+
+    async def stop(self):
+        """Cancel every job, including runs in progress, and give up the
+        leader lock."""
+        self._started = False
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "leader_election": self.leader_election,
+            "leader": self.is_leader,
+            "leader_changes": self.leader_changes,
+            "jobs": {name: job.stats() for name, job in self._jobs.items()},
+        }
+
+
+scheduler = Scheduler(SCHEDULER_LEADER_ELECTION, SCHEDULER_LOCK_KEY, SCHEDULER_LEADER_CHECK_INTERVAL)
@@ -0,0 +1,207 @@
+import heapq
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from app.core.config import SEARCH_FUZZY_ALPHABET_SIZE
+
+SEPARATOR = "\0"
+# Sorts after any character a username can contain.
+PREFIX_END = "\U0010ffff"
+
+
+def base_username(username):
+    """Lowercased username without its `#tag`."""
+    return username.split("#", 1)[0].lower()
+
+
+def single_edit_variants(query, alphabet):
+    """Strings one edit (Damerau: delete, insert, substitute, swap adjacent)
+    away from `query` that keep its last character, plus the swap of its
+    last two.
+
+    Used as prefixes: dropping or replacing the last character would match
+    everything starting with `query[:-1]`, which is the previous keystroke's
+    search rather than a typo.
+    """
+    variants = set()
+    last = len(query) - 1
+    for i in range(last):
+        head, tail = query[:i], query[i + 1:]
+        variants.add(head + tail)
+        for c in alphabet:
+            variants.add(head + c + tail)
+        if query[i] != query[i + 1]:
+            variants.add(head + query[i + 1] + query[i] + query[i + 2:])
+    for i in range(last + 1):
+        for c in alphabet:
+            variants.add(query[:i] + c + query[i:])
+    variants.discard(query)
+    return variants
+
+
+class UsernameIndex:
+    """In-process search over base usernames (the part before `#`).
+
+    Every user is one `base + "\\0" + email` key in a sorted list, so a
+    prefix is a bisect range and a page of it is a slice. Typo tolerance
+    looks up each single-edit variant of the query as a prefix, which costs
+    one bisect per variant instead of a scan.
+
+    Results are ranked prefix matches first, then one-edit matches, each in
+    key order (so an exact base match comes first and shorter names sort
+    before their extensions). Inserted and substituted characters come from
+    the `alphabet_size` characters most common in base usernames.
+
+    Create, rename and delete handlers update the worker that served them;
+    the leaderboard's reconciliation passes bring in the rest.
+    """
+
+    def __init__(self, alphabet_size):
+        self.alphabet_size = alphabet_size
+        self._keys = []
+        self._users = {}
+        self._characters = Counter()
+        self._alphabet = None
+        self._touched = {}
+        self.ready = False
+
+    def __len__(self):
+        return len(self._users)
+
+    def load(self, rows):
+        users = {}
+        characters = Counter()
+        for row in rows:
+            base = base_username(row["username"])
+            users[row["email"]] = (row["username"], base + SEPARATOR + row["email"])
+            characters.update(base)
+        self._keys = sorted(key for _, key in users.values())
+        self._users = users
+        self._characters = characters
+        self._alphabet = None
+        self._touched = {}
+        self.ready = True
+
+    def _discard(self, email):
+        previous = self._users.pop(email, None)
+        if previous is not None:
+            i = bisect_left(self._keys, previous[1])
+            del self._keys[i]
+            self._characters.subtract(base_username(previous[0]))
+            self._alphabet = None
+
+    def add(self, email, username, touched_at=None):
+        """Insert `email`, or move it to `username` if already present."""
+        if not self.ready:
+            return
+        self._discard(email)
+        base = base_username(username)
+        key = base + SEPARATOR + email
+        insort(self._keys, key)
+        self._users[email] = (username, key)
+        self._characters.update(base)
+        self._alphabet = None
+        self._touched[email] = touched_at if touched_at is not None else time.monotonic()
+
+    def remove(self, email):
+        self._discard(email)
+        self._touched[email] = time.monotonic()
+
+    def reconcile(self, rows, started_at, complete=True):
+        """Apply `SELECT email, username` rows read at `started_at`, every
+        user when `complete` and otherwise only changed ones, leaving
+        entries this worker changed since then alone."""
+        seen = set()
+        for row in rows:
+            email = row["email"]
+            seen.add(email)
+            if self._touched.get(email, 0.0) > started_at:
+                continue
+            current = self._users.get(email)
+            if current is None or current[0] != row["username"]:
+                self.add(email, row["username"], touched_at=started_at)
+
+        if complete:
+            for email in list(self._users):
+                if email not in seen and self._touched.get(email, 0.0) <= started_at:
+                    self._discard(email)
+
+        self._touched = {
+            email: touched for email, touched in self._touched.items() if touched > started_at
+        }
+
+    def sync(self, rows, started_at, complete):
+        if self.ready:
+            self.reconcile(rows, started_at, complete)
+        else:
+            self.load(rows)
+
+    def _range(self, prefix):
+        keys = self._keys
+        start = bisect_left(keys, prefix)
+        if start == len(keys) or not keys[start].startswith(prefix):
+            return start, start
+        return start, bisect_left(keys, prefix + PREFIX_END, start)
+
+    def alphabet(self):
+        if self._alphabet is None:
+            self._alphabet = [
+                c for c, count in self._characters.most_common(self.alphabet_size) if count > 0
+            ]
+        return self._alphabet
+
+    def _result(self, key, match):
+        email = key.split(SEPARATOR, 1)[1]
+        return {"username": self._users[email][0], "email": email, "match": match}
+
+    def search(self, query, limit, offset=0, fuzzy_min_length=3, fuzzy_max_length=20):
+        """Return `(results, total_is_larger)` for one page.
+
+        One-edit matches are only computed when the page reaches past the
+        prefix matches, and only for queries of `fuzzy_min_length` to
+        `fuzzy_max_length` characters.
+        """
+        query = base_username(query)
+        if not query:
+            return [], False
+
+        start, end = self._range(query)
+        prefix_count = end - start
+        results = [self._result(key, "prefix") for key in self._keys[start + offset:min(end, start + offset + limit)]]
+        if offset + limit < prefix_count:
+            return results, True
+        if not fuzzy_min_length <= len(query) <= fuzzy_max_length:
+            return results, False
+
+        # Each variant's range is already sorted, so merge them lazily and
+        # stop once the page is full. Keys starting with `query` were
+        # prefix matches and are cut out of every range.
+        keys = self._keys
+        pieces = []
+        for variant in single_edit_variants(query, self.alphabet()):
+            v_start, v_end = self._range(variant)
+            for piece_start, piece_end in ((v_start, min(v_end, start)), (max(v_start, end), v_end)):
+                if piece_start < piece_end:
+                    pieces.append(range(piece_start, piece_end))
+
+        fuzzy_offset = max(0, offset - prefix_count)
+        wanted = limit - len(results)
+        fuzzy = []
+        previous = None
+        for i in heapq.merge(*pieces, key=keys.__getitem__):
+            if i == previous:
+                continue
+            previous = i
+            fuzzy.append(i)
+            if len(fuzzy) > fuzzy_offset + wanted:
+                break
+
+        results += [self._result(keys[i], "fuzzy") for i in fuzzy[fuzzy_offset:fuzzy_offset + wanted]]
+        return results, len(fuzzy) > fuzzy_offset + wanted
+
+    def stats(self):
+        return {"ready": self.ready, "users": len(self._users)}
+
+
+username_index = UsernameIndex(SEARCH_FUZZY_ALPHABET_SIZE)
@@ -1,12 +1,201 @@
-from fastapi import HTTPException, Header
+import asyncio
+import hashlib
+import json
+import time
+import urllib.request
+from collections import OrderedDict
+
+from fastapi import Depends, HTTPException, Header, Request
 import jwt
-from jwt import PyJWKClient
-from app.core.config import CLERK_JWKS_URL
+from app.core.metrics import record_phase
+from app.core.config import (
+    ADMIN_EMAILS,
+    CLERK_JWKS_URL,
+    AUTH_TOKEN_CACHE_SIZE,
+    JWKS_REFRESH_INTERVAL,
+    JWKS_MIN_REFRESH_INTERVAL,
+)
+
+
+class TokenCache:
+    """LRU cache of verified tokens, keyed by a SHA-256 of the raw token.
+
+    Entries expire at the token's own `exp`, so a cached token is never
+    accepted for longer than `jwt.decode` would have accepted it.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        email, exp = entry
+        if exp <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return email
+
+    def put(self, token, email, exp):
+        if exp is None or self.maxsize <= 0:
+            return
+
+        key = self._key(token)
+        self._entries[key] = (email, exp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self):
+        now = time.time()
+        expired = [key for key, (_, exp) in self._entries.items() if exp <= now]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class JWKSCache:
+    """Signing keys by `kid`, refreshed in the background.
+
+    An unknown `kid` triggers an immediate refresh (at most once every
+    `min_refresh_interval` seconds) so key rotation is picked up without
+    waiting for the next scheduled refresh.
+    """
+
+    def __init__(self, url, refresh_interval, min_refresh_interval):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._last_fetch = None
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.fetches = 0
 
-jwks_client = PyJWKClient(CLERK_JWKS_URL)
+    def _fetch(self):
+        request = urllib.request.Request(self.url, headers={"User-Agent": "pomo-patch-api"})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            jwk_set = jwt.PyJWKSet.from_dict(json.load(response))
+        return {key.key_id: key for key in jwk_set.keys}
 
+    async def refresh(self):
+        async with self._lock:
+            self._keys = await asyncio.to_thread(self._fetch)
+            self._last_fetch = time.monotonic()
+            self.fetches += 1
 
-async def verify_clerk_token(authorization: str = Header(None)):
+    async def _refresh_unknown(self, kid):
+        async with self._lock:
+            # Another request may have refreshed while we waited for the lock.
+            if kid in self._keys:
+                return
+            if (
+                self._last_fetch is not None
+                and time.monotonic() - self._last_fetch < self.min_refresh_interval
+            ):
+                return
+            self._keys = await asyncio.to_thread(self._fetch)
+            self._last_fetch = time.monotonic()
+            self.fetches += 1
+
+    @property
+    def ready(self):
+        return bool(self._keys)
+
+    async def get_signing_key(self, kid):
+        key = self._keys.get(kid)
+        if key is None:
+            await self._refresh_unknown(kid)
+            key = self._keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unable to find a signing key that matches: {kid}")
+        return key
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print("JWKS refresh failed:", e)
+
+    async def start(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print("Initial JWKS fetch failed:", e)
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+jwks_cache = JWKSCache(CLERK_JWKS_URL, JWKS_REFRESH_INTERVAL, JWKS_MIN_REFRESH_INTERVAL)
+token_cache = TokenCache(AUTH_TOKEN_CACHE_SIZE)
+
+
+async def verify_clerk_token(request: Request, authorization: str = Header(None)):
+    # The write queue and idempotency route classes verify before the
+    # handler runs; the route's own dependency then reuses their result.
+    email = getattr(request.state, "auth_email", None)
+    if email is not None:
+        return email
+    started = time.perf_counter()
+    try:
+        email = await _verify_clerk_token(authorization)
+    finally:
+        record_phase("auth", time.perf_counter() - started)
+    request.state.auth_email = email
+    return email
+
+
+async def authenticate(request):
+    """The verified email for `request`, checking its token at most once."""
+    return await verify_clerk_token(request, request.headers.get("authorization"))
+
+
+async def verify_admin(email: str = Depends(verify_clerk_token)):
+    if email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return email
+
+
+async def _verify_clerk_token(authorization):
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing authorization header")
 
@@ -15,7 +204,12 @@ async def verify_clerk_token(authorization: str = Header(None)):
         if scheme.lower() != "bearer":
             raise HTTPException(status_code=401, detail="Invalid authentication scheme")
 
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
+        cached_email = token_cache.get(token)
+        if cached_email:
+            return cached_email
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        signing_key = await jwks_cache.get_signing_key(kid)
 
         payload = jwt.decode(
             token, signing_key.key, algorithms=["RS256"], options={"verify_exp": True}
@@ -38,6 +232,7 @@ async def verify_clerk_token(authorization: str = Header(None)):
                 + ", ".join(payload.keys()),
             )
 
+        token_cache.put(token, email, payload.get("exp"))
         return email
 
     except jwt.ExpiredSignatureError:
@@ -0,0 +1,145 @@
+"""Plant placement: overlap tests, viewport boxes and free-slot search.
+
+A plant's footprint is a PLANT_SPACING square around its position, so two
+plants overlap when they are less than PLANT_SPACING apart on both axes.
+Postgres answers "which plants are in this box" from plant_email_x_y_idx
+(migration 007); the functions here only ever see the few plants such a
+query returns, or the positions of a single request.
+
+`overlaps` is written exactly like the SQL checks in `app.db.queries`, so a
+position this module calls free is never refused by the database over a
+rounding difference.
+"""
+import math
+
+from app.core.config import FREE_SLOT_SEARCH_RADIUS, GARDEN_EXTENT, PLANT_SPACING
+
+
+def overlaps(x, y, other_x, other_y, spacing=PLANT_SPACING):
+    return (
+        x - spacing < other_x < x + spacing
+        and y - spacing < other_y < y + spacing
+    )
+
+
+def parse_bbox(text):
+    """`(min_x, min_y, max_x, max_y)` from "min_x,min_y,max_x,max_y"."""
+    parts = text.split(",")
+    if len(parts) != 4:
+        raise ValueError("expected min_x,min_y,max_x,max_y")
+    min_x, min_y, max_x, max_y = (float(part) for part in parts)
+    if not all(map(math.isfinite, (min_x, min_y, max_x, max_y))):
+        raise ValueError("coordinates must be finite")
+    if min_x > max_x or min_y > max_y:
+        raise ValueError("min_x and min_y must not exceed max_x and max_y")
+    return min_x, min_y, max_x, max_y
+
+
+class PositionGrid:
+    """Positions bucketed into PLANT_SPACING cells. Anything overlapping a
+    point lies in its cell or one of the eight around it."""
+
+    def __init__(self, spacing=PLANT_SPACING):
+        self.spacing = spacing
+        self._cells = {}
+
+    def _cell(self, x, y):
+        return math.floor(x / self.spacing), math.floor(y / self.spacing)
+
+    def add(self, x, y, key):
+        self._cells.setdefault(self._cell(x, y), []).append((x, y, key))
+
+    def overlapping(self, x, y):
+        """Key of a position overlapping (x, y), or None."""
+        cx, cy = self._cell(x, y)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other_x, other_y, key in self._cells.get((cx + dx, cy + dy), ()):
+                    if overlaps(x, y, other_x, other_y, self.spacing):
+                        return key
+        return None
+
+
+def first_overlap(positions, spacing=PLANT_SPACING):
+    """`(i, j)` for the first pair of `positions` (i < j) that overlap each
+    other, or None."""
+    grid = PositionGrid(spacing)
+    for j, (x, y) in enumerate(positions):
+        i = grid.overlapping(x, y)
+        if i is not None:
+            return i, j
+        grid.add(x, y, j)
+    return None
+
+
+def _clear_of(y, others, spacing):
+    """`y` moved away from the blocked side by as many ulps as it takes for
+    `overlaps` to agree it clears every y in `others`."""
+    for _ in range(4):
+        blocking = [other for other in others if y - spacing < other < y + spacing]
+        if not blocking:
+            return y
+        y = math.nextafter(y, math.inf if blocking[0] <= y else -math.inf)
+    return None
+
+
+def _nearest_free_on_line(y, others, spacing, extent):
+    """Closest point to `y` in [-extent, extent] that is at least `spacing`
+    from every y in `others`, or None."""
+    merged = []
+    for other in sorted(others):
+        low, high = other - spacing, other + spacing
+        if merged and low < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    for low, high in merged:
+        if low < y < high:
+            ends = sorted((end for end in (low, high) if -extent <= end <= extent), key=lambda end: abs(end - y))
+            for end in ends:
+                end = _clear_of(end, others, spacing)
+                if end is not None:
+                    return end
+            return None
+    return y
+
+
+def nearest_free(
+    x, y, occupied, spacing=PLANT_SPACING, radius=FREE_SLOT_SEARCH_RADIUS, extent=GARDEN_EXTENT
+):
+    """Closest position to (x, y), at most `radius` away and inside the
+    garden, where a plant overlaps none of the `occupied` positions; None if
+    there is none. `occupied` must include every plant within
+    `radius + spacing` of (x, y).
+
+    Unless (x, y) is free itself, the closest free point lies on the edge of
+    some footprint, so its x is x itself, a footprint's left or right edge,
+    or the garden's border. Those vertical lines are scanned nearest first;
+    on each, the footprints crossing it block merged intervals of y and the
+    nearest free y is read off directly. The scan stops once a line is
+    farther away than the best point found.
+    """
+    columns = {}
+    lines = {x, -extent, extent}
+    for other_x, other_y in occupied:
+        columns.setdefault(math.floor(other_x / spacing), []).append((other_x, other_y))
+        lines.update((other_x - spacing, other_x + spacing))
+
+    best, best_distance = None, radius
+    for line_x in sorted((c for c in lines if -extent <= c <= extent), key=lambda c: abs(c - x)):
+        if abs(line_x - x) > best_distance:
+            break
+        column = math.floor(line_x / spacing)
+        crossing = [
+            other_y
+            for c in (column - 1, column, column + 1)
+            for other_x, other_y in columns.get(c, ())
+            if line_x - spacing < other_x < line_x + spacing
+        ]
+        line_y = _nearest_free_on_line(y, crossing, spacing, extent)
+        if line_y is None:
+            continue
+        distance = math.hypot(line_x - x, line_y - y)
+        if distance < best_distance or (best is None and distance == best_distance):
+            best, best_distance = (line_x, line_y), distance
+    return best
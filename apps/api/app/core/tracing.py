@@ -0,0 +1,203 @@
+import asyncio
+import json
+import os
+import random
+import urllib.request
+from collections import deque
+
+from app.core.config import (
+    OTEL_EXPORTER_OTLP_ENDPOINT,
+    OTEL_SERVICE_NAME,
+    TRACE_EXPORT_BATCH_SIZE,
+    TRACE_EXPORT_INTERVAL,
+    TRACE_QUEUE_SIZE,
+    TRACE_SAMPLE_RATIO,
+)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+
+def new_trace_id():
+    return os.urandom(16).hex()
+
+
+def new_span_id():
+    return os.urandom(8).hex()
+
+
+def parse_traceparent(header):
+    """`(trace_id, parent_span_id, sampled)` from a W3C `traceparent`
+    header, or None if it is missing or malformed."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    _, trace_id, span_id, flags = parts[:4]
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, sampled
+
+
+def attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name, trace_id, parent_id, kind, start_ns, end_ns, attributes=None, error=False):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.attributes = attributes or {}
+        self.error = error
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [attribute(k, v) for k, v in self.attributes.items()],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": STATUS_ERROR}
+        return span
+
+
+class SpanExporter:
+    """Batches finished spans and POSTs them to an OpenTelemetry collector
+    as OTLP/HTTP JSON (`<endpoint>/v1/traces`).
+
+    Requests continue a sampled `traceparent`; others are traced with
+    probability `sample_ratio`. Spans beyond `queue_size` waiting for export
+    are dropped rather than slowing requests down, and a collector that is
+    down only costs a failed POST per `interval`.
+    """
+
+    def __init__(self, endpoint, service_name, sample_ratio, queue_size, batch_size, interval):
+        self.url = endpoint.rstrip("/") + "/v1/traces" if endpoint else None
+        self.service_name = service_name
+        self.sample_ratio = sample_ratio
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = deque()
+        self._queue_size = queue_size
+        self._task = None
+        self.exported = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.url is not None
+
+    def should_sample(self, parent_sampled=None):
+        if not self.enabled:
+            return False
+        if parent_sampled is not None:
+            return parent_sampled
+        return random.random() < self.sample_ratio
+
+    def export(self, spans):
+        room = self._queue_size - len(self._queue)
+        if room < len(spans):
+            self.dropped += len(spans) - max(room, 0)
+            spans = spans[:max(room, 0)]
+        self._queue.extend(spans)
+
+    def _payload(self, spans):
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "pomopatch"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+
+    def _post(self, body):
+        request = urllib.request.Request(
+            self.url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+
+    async def flush(self):
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            body = json.dumps(self._payload(batch)).encode()
+            try:
+                await asyncio.to_thread(self._post, body)
+                self.exported += len(batch)
+            except Exception as e:
+                self.errors += 1
+                self.dropped += len(batch)
+                print(f"Span export to {self.url} failed: {e}")
+                return
+
+    async def _export_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._export_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.enabled:
+            await self.flush()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "sample_ratio": self.sample_ratio,
+            "queued": len(self._queue),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+span_exporter = SpanExporter(
+    OTEL_EXPORTER_OTLP_ENDPOINT,
+    OTEL_SERVICE_NAME,
+    TRACE_SAMPLE_RATIO,
+    TRACE_QUEUE_SIZE,
+    TRACE_EXPORT_BATCH_SIZE,
+    TRACE_EXPORT_INTERVAL,
+)
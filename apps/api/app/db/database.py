@@ -1,12 +1,92 @@
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
 import asyncpg
-from app.core.config import DATABASE_URL
+from fastapi import HTTPException
+
+from app.core.config import (
+    DATABASE_URL,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_ACQUIRE_TIMEOUT,
+    DB_COMMAND_TIMEOUT,
+    DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_PGBOUNCER,
+    METRICS_ENABLED,
+)
+from app.core.metrics import on_query, record_phase
 
 pool = None
 
 
+class PoolStats:
+    """Acquire wait times and timeouts for connections handed out by `get_db`."""
+
+    def __init__(self, samples=1024):
+        self.acquires = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent = deque(maxlen=samples)
+
+    def record_wait(self, seconds):
+        self.acquires += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        self._recent.append(seconds)
+
+    def snapshot(self):
+        recent = sorted(self._recent)
+
+        def percentile(q):
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))] * 1e3, 3)
+
+        stats = {
+            "acquires": self.acquires,
+            "timeouts": self.timeouts,
+            "waiting": self.waiting,
+            "wait_ms_mean": round(self.wait_total / self.acquires * 1e3, 3) if self.acquires else 0.0,
+            "wait_ms_p50": percentile(0.50),
+            "wait_ms_p99": percentile(0.99),
+            "wait_ms_max": round(self.wait_max * 1e3, 3),
+        }
+        if pool is not None:
+            size = pool.get_size()
+            idle = pool.get_idle_size()
+            stats.update(
+                size=size,
+                idle=idle,
+                in_use=size - idle,
+                min_size=pool.get_min_size(),
+                max_size=pool.get_max_size(),
+            )
+        return stats
+
+
+pool_stats = PoolStats()
+
+
+async def _init_connection(conn):
+    if METRICS_ENABLED:
+        conn.add_query_logger(on_query)
+
+
 async def create_pool():
     global pool
-    pool = await asyncpg.create_pool(DATABASE_URL)
+    pool = await asyncpg.create_pool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        command_timeout=DB_COMMAND_TIMEOUT,
+        max_inactive_connection_lifetime=DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+        statement_cache_size=0 if DB_PGBOUNCER else DB_STATEMENT_CACHE_SIZE,
+        init=_init_connection,
+    )
 
 
 async def close_pool():
@@ -15,6 +95,29 @@ async def close_pool():
         await pool.close()
 
 
+@asynccontextmanager
+async def acquire():
+    """A pool connection with the same wait accounting and 503-on-timeout
+    as `get_db`, for code that only sometimes needs the database."""
+    started = time.perf_counter()
+    pool_stats.waiting += 1
+    try:
+        conn = await pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT)
+    except TimeoutError:
+        pool_stats.timeouts += 1
+        raise HTTPException(status_code=503, detail="Database is busy, try again")
+    finally:
+        pool_stats.waiting -= 1
+        waited = time.perf_counter() - started
+        record_phase("pool_wait", waited)
+    pool_stats.record_wait(waited)
+
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
 async def get_db():
-    async with pool.acquire() as conn:
+    async with acquire() as conn:
         yield conn
@@ -0,0 +1,825 @@
+"""Single-statement state transitions.
+
+Each function below is one statement, except moves (see LOCK_OWNER),
+which take the user's row lock in a statement of their own first, in the
+same transaction, and purchases, which run inside `rolls_locked`; that
+takes the lock and their roll seeds (LOCK_ROLLS). Rows that a transition
+reads are locked with FOR UPDATE inside a CTE, the guard (stage, balance,
+plant limit) is folded into the WHERE clause of the writes, and the
+returned row carries both the new state and the pre-write values a
+handler needs to explain a refusal. A NULL "new_*" column means the guard did not pass and nothing was
+written.
+
+Statements that touch a user's plants lock that user's "user" row first
+(an `owner` CTE read with FOR UPDATE, or the "user" UPDATE itself) and only
+then their plant rows. With one lock order per user, concurrent writes on
+the same garden queue on the "user" row instead of deadlocking on plants
+locked in different orders; writes on different users never meet. The
+`EXISTS (SELECT 1 FROM owner)` guards make the lock an InitPlan, which
+Postgres runs before the plant scan.
+
+Every write also moves "user".garden_version to the next value of
+garden_version_seq (migration 004; purchases take theirs in LOCK_ROLLS), which is what garden ETags are built
+from. Every write that changes "user".money also appends its entry to
+money_ledger (migration 008) in a `ledger` CTE, so the entry commits or
+rolls back with the change; reason codes are listed in app.core.ledger.
+"""
+from contextlib import asynccontextmanager
+
+GROW_PLANTS = """
+    WITH owner AS (
+        SELECT 1 FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    settled AS (
+        UPDATE plant
+        SET stage = stage + 1,
+            growth_time_remaining = NULL,
+            ready_at = NULL,
+            fertilizer_remaining = CASE
+                WHEN stage = 0 THEN COALESCE(($4::int[])[rarity + 1], 1)
+            END
+        WHERE email = $1
+          AND ready_at <= $5
+          AND stage < 2
+          AND ($3::int[] IS NULL OR plant_id = ANY($3::int[]))
+          AND EXISTS (SELECT 1 FROM owner)
+        RETURNING plant_id, stage, growth_time_remaining,
+                  fertilizer_remaining, TRUE AS stage_advanced
+    ),
+    target AS (
+        SELECT plant_id, stage, rarity,
+               GREATEST(0, growth_time_remaining - $2) AS new_time
+        FROM plant
+        WHERE email = $1
+          AND growth_time_remaining IS NOT NULL
+          AND ready_at IS NULL
+          AND stage < 2
+          AND ($3::int[] IS NULL OR plant_id = ANY($3::int[]))
+          AND EXISTS (SELECT 1 FROM owner)
+        FOR UPDATE
+    ),
+    ticked AS (
+        UPDATE plant p
+        SET stage = CASE WHEN t.new_time = 0 THEN t.stage + 1 ELSE t.stage END,
+            growth_time_remaining = NULLIF(t.new_time, 0),
+            fertilizer_remaining = CASE
+                WHEN t.new_time > 0 THEN p.fertilizer_remaining
+                WHEN t.stage = 0 THEN COALESCE(($4::int[])[t.rarity + 1], 1)
+                ELSE NULL
+            END
+        FROM target t
+        WHERE p.plant_id = t.plant_id
+        RETURNING p.plant_id, p.stage, p.growth_time_remaining,
+                  p.fertilizer_remaining, t.new_time = 0 AS stage_advanced
+    ),
+    bumped AS (
+        UPDATE "user" SET garden_version = nextval('garden_version_seq')
+        WHERE email = $1
+          AND (EXISTS (SELECT 1 FROM settled) OR EXISTS (SELECT 1 FROM ticked))
+    )
+    SELECT * FROM settled
+    UNION ALL
+    SELECT * FROM ticked
+"""
+
+# Purchases and moves check the new positions for overlaps with a plain
+# read of plant, which only sees what was committed when the statement
+# started. Taking the "user" row lock in an earlier statement of the same
+# transaction means the statement that checks starts after every other
+# write to the garden has committed, so concurrent purchases and moves
+# queue on the lock and then see each other's plants.
+LOCK_OWNER = 'SELECT 1 FROM "user" WHERE email = $1 FOR UPDATE'
+
+# LOCK_OWNER for purchases. It also takes the purchase's garden_version and
+# computes the seeds of its $3 plants from it (see app.core.rolls; $2 is the
+# key), which the handler rolls the plants from before sending them.
+LOCK_ROLLS = """
+    WITH owner AS (
+        SELECT 1 FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    version AS (
+        SELECT nextval('garden_version_seq') AS garden_version FROM owner
+    )
+    SELECT garden_version,
+           ARRAY(
+               SELECT (('x' || encode(substr(sha256(
+                          $2::bytea || int8send(garden_version) || int4send(i) || convert_to($1, 'UTF8')
+                      ), 1, 8), 'hex'))::bit(64) >> 11)::bigint
+               FROM generate_series(0, $3 - 1) AS i
+               ORDER BY i
+           ) AS roll_seeds
+    FROM version
+"""
+
+# Run after LOCK_ROLLS, with the garden_version ($10) and seed ($11) it
+# returned. The plant limit and balance checks are one conditional UPDATE
+# on "user". `blocking` is a plant the new one would overlap ($9 is the
+# spacing), read from plant_email_x_y_idx.
+CREATE_PLANT = """
+    WITH u AS (
+        SELECT money, plant_limit, plant_count FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    blocking AS (
+        SELECT plant_id FROM plant
+        WHERE email = $1
+          AND x > $7::float8 - $9::float8 AND x < $7::float8 + $9::float8
+          AND y > $8::float8 - $9::float8 AND y < $8::float8 + $9::float8
+        LIMIT 1
+    ),
+    charged AS (
+        UPDATE "user"
+        SET money = money - $2,
+            plant_count = plant_count + 1,
+            garden_version = $10
+        WHERE email = $1
+          AND plant_count < plant_limit
+          AND money >= $2
+          AND NOT EXISTS (SELECT 1 FROM blocking)
+        RETURNING money, plant_count, garden_version
+    ),
+    inserted AS (
+        INSERT INTO plant (plant_type, plant_species, size, rarity, x, y,
+                           stage, growth_time_remaining, email)
+        SELECT $3::text, $4::text, $5::float8, $6::int, $7::float8, $8::float8, 0, NULL, $1
+        FROM charged
+        RETURNING plant_id
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, roll_seeds, recorded_at)
+        SELECT $1, -$2, money, garden_version, 'plant_purchase', ARRAY(SELECT plant_id FROM inserted),
+               ARRAY[$11::bigint], now()
+        FROM charged
+    )
+    SELECT u.money, u.plant_limit, u.plant_count,
+           (SELECT plant_id FROM blocking) AS blocked_by,
+           (SELECT money FROM charged) AS new_balance,
+           (SELECT garden_version FROM charged) AS new_garden_version,
+           (SELECT plant_id FROM inserted) AS plant_id
+    FROM u
+"""
+
+# Run after LOCK_ROLLS, like CREATE_PLANT. $3..$8 and the seeds, $11, are
+# parallel arrays, one element per plant.
+# The whole batch is charged and counted against plant_limit at once;
+# nothing is inserted unless all of it fits. Overlaps with existing plants
+# are checked like CREATE_PLANT's, one index probe per position; `blocking`
+# reports the first position (1-based) that overlaps. Overlaps within the
+# batch are the handler's to reject before sending it.
+CREATE_PLANTS = """
+    WITH u AS (
+        SELECT money, plant_limit, plant_count FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    blocking AS (
+        SELECT t.ord, p.plant_id
+        FROM unnest($7::float8[], $8::float8[]) WITH ORDINALITY AS t(x, y, ord)
+        JOIN plant p
+          ON p.email = $1
+         AND p.x > t.x - $9::float8 AND p.x < t.x + $9::float8
+         AND p.y > t.y - $9::float8 AND p.y < t.y + $9::float8
+        ORDER BY t.ord
+        LIMIT 1
+    ),
+    charged AS (
+        UPDATE "user"
+        SET money = money - $2 * cardinality($3::text[]),
+            plant_count = plant_count + cardinality($3::text[]),
+            garden_version = $10
+        WHERE email = $1
+          AND plant_count + cardinality($3::text[]) <= plant_limit
+          AND money >= $2 * cardinality($3::text[])
+          AND NOT EXISTS (SELECT 1 FROM blocking)
+        RETURNING money, garden_version
+    ),
+    inserted AS (
+        INSERT INTO plant (plant_type, plant_species, size, rarity, x, y,
+                           stage, growth_time_remaining, email)
+        SELECT t.plant_type, t.plant_species, t.size, t.rarity, t.x, t.y, 0, NULL, $1
+        FROM charged,
+             unnest($3::text[], $4::text[], $5::float8[], $6::int[], $7::float8[], $8::float8[])
+                 WITH ORDINALITY AS t(plant_type, plant_species, size, rarity, x, y, ord)
+        ORDER BY t.ord
+        RETURNING plant_id
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, roll_seeds, recorded_at)
+        SELECT $1, -$2 * cardinality($3::text[]), money, garden_version, 'plant_purchase',
+               ARRAY(SELECT plant_id FROM inserted ORDER BY plant_id), $11::bigint[], now()
+        FROM charged
+    )
+    SELECT u.money, u.plant_limit, u.plant_count,
+           (SELECT ord FROM blocking) AS blocked_position,
+           (SELECT plant_id FROM blocking) AS blocked_by,
+           (SELECT money FROM charged) AS new_balance,
+           (SELECT garden_version FROM charged) AS new_garden_version,
+           ARRAY(SELECT plant_id FROM inserted ORDER BY plant_id) AS plant_ids
+    FROM u
+"""
+
+APPLY_WATER = """
+    WITH u AS (
+        SELECT money FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    p AS (
+        SELECT stage, growth_time_remaining FROM plant
+        WHERE plant_id = $2 AND email = $1 AND EXISTS (SELECT 1 FROM u)
+        FOR UPDATE
+    ),
+    ok AS (
+        SELECT 1 FROM u, p
+        WHERE p.stage = 0 AND p.growth_time_remaining IS NULL AND u.money >= $3
+    ),
+    charged AS (
+        UPDATE "user" SET money = money - $3, garden_version = nextval('garden_version_seq')
+        WHERE email = $1 AND EXISTS (SELECT 1 FROM ok)
+        RETURNING money, garden_version
+    ),
+    watered AS (
+        UPDATE plant SET growth_time_remaining = $4, ready_at = $5
+        WHERE plant_id = $2 AND email = $1 AND EXISTS (SELECT 1 FROM ok)
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, recorded_at)
+        SELECT $1, -$3, money, garden_version, 'water', ARRAY[$2::int], now()
+        FROM charged
+    )
+    SELECT p.stage, p.growth_time_remaining, u.money,
+           (SELECT money FROM charged) AS new_money,
+           (SELECT garden_version FROM charged) AS new_garden_version
+    FROM (SELECT 1) AS one
+    LEFT JOIN p ON TRUE
+    LEFT JOIN u ON TRUE
+"""
+
+# `e` is the plant as of $4: an elapsed wall-clock timer is applied before
+# the guard, and the write persists that stage along with the fertilizer.
+APPLY_FERTILIZER = """
+    WITH u AS (
+        SELECT money FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    p AS (
+        SELECT rarity, stage, fertilizer_remaining, growth_time_remaining,
+               COALESCE(ready_at <= $4, FALSE) AND stage < 2 AS matured
+        FROM plant
+        WHERE plant_id = $2 AND email = $1 AND EXISTS (SELECT 1 FROM u)
+        FOR UPDATE
+    ),
+    e AS (
+        SELECT rarity,
+               CASE WHEN matured THEN stage + 1 ELSE stage END AS stage,
+               CASE
+                   WHEN NOT matured THEN fertilizer_remaining
+                   WHEN stage = 0 THEN COALESCE(($5::int[])[rarity + 1], 1)
+               END AS fertilizer_remaining,
+               CASE WHEN matured THEN NULL ELSE growth_time_remaining END AS growth_time_remaining
+        FROM p
+    ),
+    n AS (
+        SELECT e.stage, e.rarity, e.fertilizer_remaining - 1 AS next_fertilizer
+        FROM e, u
+        WHERE e.stage = 1
+          AND e.fertilizer_remaining > 0
+          AND e.growth_time_remaining IS NULL
+          AND u.money >= $3
+    ),
+    charged AS (
+        UPDATE "user" SET money = money - $3, garden_version = nextval('garden_version_seq')
+        WHERE email = $1 AND EXISTS (SELECT 1 FROM n)
+        RETURNING money, garden_version
+    ),
+    fertilized AS (
+        UPDATE plant
+        SET stage = n.stage,
+            fertilizer_remaining = NULLIF(n.next_fertilizer, 0),
+            growth_time_remaining = CASE
+                WHEN n.next_fertilizer = 0 THEN ($6::int[])[n.rarity + 1]
+            END,
+            ready_at = CASE
+                WHEN n.next_fertilizer = 0 THEN ($7::timestamptz[])[n.rarity + 1]
+            END
+        FROM n
+        WHERE plant.plant_id = $2 AND plant.email = $1
+        RETURNING plant.fertilizer_remaining, plant.growth_time_remaining, plant.ready_at
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, recorded_at)
+        SELECT $1, -$3, money, garden_version, 'fertilizer', ARRAY[$2::int], now()
+        FROM charged
+    )
+    SELECT e.stage, e.fertilizer_remaining, e.growth_time_remaining, u.money,
+           (SELECT money FROM charged) AS new_money,
+           (SELECT garden_version FROM charged) AS new_garden_version,
+           f.fertilizer_remaining AS new_fertilizer_remaining,
+           f.growth_time_remaining AS new_growth_time_remaining,
+           f.ready_at AS new_ready_at
+    FROM (SELECT 1) AS one
+    LEFT JOIN e ON TRUE
+    LEFT JOIN u ON TRUE
+    LEFT JOIN fertilized f ON TRUE
+"""
+
+SELL_PLANT = """
+    WITH owner AS (
+        SELECT 1 FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    sold AS (
+        DELETE FROM plant
+        WHERE plant_id = $2 AND email = $1 AND EXISTS (SELECT 1 FROM owner)
+        RETURNING rarity,
+                  CASE
+                      WHEN COALESCE(ready_at <= $3, FALSE) AND stage < 2 THEN stage + 1
+                      ELSE stage
+                  END AS stage
+    ),
+    earned AS (
+        SELECT CASE stage
+                   WHEN 0 THEN 0
+                   WHEN 1 THEN ($4::int[])[rarity + 1]
+                   ELSE ($5::int[])[rarity + 1]
+               END AS money_earned
+        FROM sold
+    ),
+    credited AS (
+        UPDATE "user"
+        SET money = money + earned.money_earned,
+            plant_count = plant_count - 1,
+            garden_version = nextval('garden_version_seq')
+        FROM earned
+        WHERE email = $1
+        RETURNING money, garden_version
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, recorded_at)
+        SELECT $1, earned.money_earned, credited.money, credited.garden_version, 'plant_sale',
+               ARRAY[$2::int], now()
+        FROM earned, credited
+    )
+    SELECT earned.money_earned, credited.money AS new_balance,
+           credited.garden_version AS new_garden_version
+    FROM earned, credited
+"""
+
+SELL_PLANTS = """
+    WITH owner AS (
+        SELECT 1 FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    sold AS (
+        DELETE FROM plant
+        WHERE plant_id = ANY($2::int[]) AND email = $1 AND EXISTS (SELECT 1 FROM owner)
+        RETURNING plant_id, rarity,
+                  CASE
+                      WHEN COALESCE(ready_at <= $3, FALSE) AND stage < 2 THEN stage + 1
+                      ELSE stage
+                  END AS stage
+    ),
+    earned AS (
+        SELECT plant_id,
+               CASE stage
+                   WHEN 0 THEN 0
+                   WHEN 1 THEN ($4::int[])[rarity + 1]
+                   ELSE ($5::int[])[rarity + 1]
+               END AS money_earned
+        FROM sold
+    ),
+    credited AS (
+        UPDATE "user"
+        SET money = money + t.total,
+            plant_count = plant_count - t.n,
+            garden_version = CASE
+                WHEN t.n > 0 THEN nextval('garden_version_seq')
+                ELSE garden_version
+            END
+        FROM (SELECT COALESCE(SUM(money_earned), 0) AS total, COUNT(*) AS n FROM earned) t
+        WHERE email = $1
+        RETURNING money, garden_version
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, recorded_at)
+        SELECT $1, (SELECT SUM(money_earned) FROM earned), money, garden_version, 'plant_sale',
+               ARRAY(SELECT plant_id FROM earned ORDER BY plant_id), now()
+        FROM credited
+        WHERE EXISTS (SELECT 1 FROM earned)
+    )
+    SELECT credited.money AS new_balance,
+           credited.garden_version AS new_garden_version,
+           ARRAY(SELECT plant_id FROM earned ORDER BY plant_id) AS plant_ids,
+           ARRAY(SELECT money_earned FROM earned ORDER BY plant_id) AS money_earned
+    FROM credited
+"""
+
+# Claims the next tag for base name $1 from username_tag (migration 006)
+# and creates the user with it. ON CONFLICT DO NOTHING leaves `username`
+# NULL instead of aborting when the tag was taken by a rename or the email
+# already exists, so the counter still advances and a retry gets a fresh
+# tag. A `tag` of at least $6 means the counter has run out.
+CREATE_USER = """
+    WITH claimed AS (
+        INSERT INTO username_tag (base, next_tag) VALUES ($1, 1)
+        ON CONFLICT (base) DO UPDATE
+        SET next_tag = LEAST(username_tag.next_tag, $6) + 1
+        RETURNING next_tag - 1 AS tag
+    ),
+    created AS (
+        INSERT INTO "user" (username, email, money, plant_limit, weather)
+        SELECT $1 || '#' || lpad(claimed.tag::text, 4, '0'), $2, $3, $4, $5
+        FROM claimed
+        WHERE claimed.tag < $6
+        ON CONFLICT DO NOTHING
+        RETURNING username, money, garden_version
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, recorded_at)
+        SELECT $2, money, money, garden_version, 'signup', NULL, now()
+        FROM created
+    )
+    SELECT claimed.tag, created.username, created.money, created.garden_version
+    FROM claimed
+    LEFT JOIN created ON TRUE
+"""
+
+# Once a base name's counter has run out: the first free tag (freed by a
+# delete or rename) walking from $7, so concurrent callers start apart.
+CREATE_USER_FREE_TAG = """
+    WITH free AS (
+        SELECT ($7 + g) % $6 AS tag
+        FROM generate_series(0, $6 - 1) AS g
+        WHERE NOT EXISTS (
+            SELECT 1 FROM "user"
+            WHERE username = $1 || '#' || lpad((($7 + g) % $6)::text, 4, '0')
+        )
+        LIMIT 1
+    ),
+    created AS (
+        INSERT INTO "user" (username, email, money, plant_limit, weather)
+        SELECT $1 || '#' || lpad(free.tag::text, 4, '0'), $2, $3, $4, $5
+        FROM free
+        ON CONFLICT DO NOTHING
+        RETURNING username, money, garden_version
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, recorded_at)
+        SELECT $2, money, money, garden_version, 'signup', NULL, now()
+        FROM created
+    )
+    SELECT username, money, garden_version FROM created
+"""
+
+# `max_amount` is the most a session awards this garden: $3 base, times 1
+# plus each plant's income bonus ($4/$5, stage 1/2 by rarity), times $7
+# when the weather is $6. A plant whose wall-clock timer has run out counts
+# at its next stage, as the client shows it; the 1e-9 keeps float sums that
+# land just under a whole coin from rounding down past the client's figure.
+# A NULL "money" means $2 was above it. The plants are read as of the
+# statement's start, so a purchase or sale committing meanwhile can leave
+# the cap one change behind; that isn't worth taking LOCK_OWNER first.
+CHANGE_MONEY = """
+    WITH owner AS (
+        SELECT weather FROM "user" WHERE email = $1
+    ),
+    reward AS (
+        SELECT floor(
+            $3::float8 * (1 + COALESCE(sum(CASE p.stage + (COALESCE(p.ready_at <= now(), FALSE) AND p.stage < 2)::int
+                WHEN 1 THEN ($4::float8[])[p.rarity + 1]
+                WHEN 2 THEN ($5::float8[])[p.rarity + 1]
+            END), 0))
+            * CASE WHEN (SELECT weather FROM owner) = $6 THEN $7::float8 ELSE 1 END
+            + 1e-9
+        ) AS max_amount
+        FROM plant p
+        WHERE p.email = $1
+    ),
+    changed AS (
+        UPDATE "user" SET money = money + $2, garden_version = nextval('garden_version_seq')
+        FROM reward
+        WHERE email = $1 AND $2 <= reward.max_amount
+        RETURNING money, garden_version
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, recorded_at)
+        SELECT $1, $2, money, garden_version, 'session_reward', NULL, now()
+        FROM changed
+    )
+    SELECT reward.max_amount, changed.money, changed.garden_version
+    FROM owner CROSS JOIN reward LEFT JOIN changed ON TRUE
+"""
+
+# $2 is the upgrade cost indexed by the number of upgrades already bought.
+INCREASE_PLANT_LIMIT = """
+    WITH u AS (
+        SELECT money, plant_limit,
+               ($2::bigint[])[(plant_limit - $3) / $4 + 1] AS cost
+        FROM "user"
+        WHERE email = $1
+        FOR UPDATE
+    ),
+    upgraded AS (
+        UPDATE "user"
+        SET money = "user".money - u.cost,
+            plant_limit = "user".plant_limit + $4,
+            garden_version = nextval('garden_version_seq')
+        FROM u
+        WHERE "user".email = $1 AND u.money >= u.cost
+        RETURNING "user".money, "user".plant_limit, "user".garden_version
+    ),
+    ledger AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, plant_ids, recorded_at)
+        SELECT $1, -u.cost, upgraded.money, upgraded.garden_version, 'plant_limit_upgrade', NULL, now()
+        FROM u, upgraded
+    )
+    SELECT u.money, u.plant_limit, u.cost,
+           upgraded.money AS new_money,
+           upgraded.plant_limit AS new_plant_limit,
+           upgraded.garden_version AS new_garden_version
+    FROM u
+    LEFT JOIN upgraded ON TRUE
+"""
+
+CYCLE_WEATHER = """
+    UPDATE "user" SET weather = (weather + 1) % 3, garden_version = nextval('garden_version_seq')
+    WHERE email = $1
+    RETURNING weather
+"""
+
+# Run after LOCK_OWNER, like the purchases.
+MOVE_PLANT = """
+    WITH owner AS (
+        SELECT 1 FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    blocking AS (
+        SELECT plant_id FROM plant
+        WHERE email = $1
+          AND plant_id <> $2
+          AND x > $3::float8 - $5::float8 AND x < $3::float8 + $5::float8
+          AND y > $4::float8 - $5::float8 AND y < $4::float8 + $5::float8
+        LIMIT 1
+    ),
+    moved AS (
+        UPDATE plant SET x = $3, y = $4
+        WHERE plant_id = $2 AND email = $1
+          AND EXISTS (SELECT 1 FROM owner)
+          AND NOT EXISTS (SELECT 1 FROM blocking)
+        RETURNING plant_id
+    ),
+    bumped AS (
+        UPDATE "user" SET garden_version = nextval('garden_version_seq')
+        WHERE email = $1 AND EXISTS (SELECT 1 FROM moved)
+    )
+    SELECT (SELECT plant_id FROM moved) AS plant_id,
+           EXISTS (SELECT 1 FROM plant WHERE plant_id = $2 AND email = $1) AS found,
+           (SELECT plant_id FROM blocking) AS blocked_by
+"""
+
+# $2..$4 are parallel arrays of distinct plant IDs and their new
+# positions, applied by one UPDATE ... FROM unnest. Targets are checked for
+# overlaps against the plants that stay put, one index probe each; the
+# moving plants were checked against each other by the handler. Run after
+# LOCK_OWNER; nothing moves if `blocking` finds a plant. `found` lists the
+# IDs that name one of the user's plants.
+MOVE_PLANTS = """
+    WITH owner AS (
+        SELECT 1 FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    target AS (
+        SELECT * FROM unnest($2::int[], $3::float8[], $4::float8[])
+            WITH ORDINALITY AS t(plant_id, x, y, ord)
+    ),
+    blocking AS (
+        SELECT t.plant_id AS moving, p.plant_id
+        FROM target t
+        JOIN plant p
+          ON p.email = $1
+         AND p.x > t.x - $5::float8 AND p.x < t.x + $5::float8
+         AND p.y > t.y - $5::float8 AND p.y < t.y + $5::float8
+        WHERE p.plant_id <> ALL($2::int[])
+        ORDER BY t.ord
+        LIMIT 1
+    ),
+    moved AS (
+        UPDATE plant p SET x = t.x, y = t.y
+        FROM target t
+        WHERE p.plant_id = t.plant_id AND p.email = $1
+          AND EXISTS (SELECT 1 FROM owner)
+          AND NOT EXISTS (SELECT 1 FROM blocking)
+        RETURNING p.plant_id
+    ),
+    bumped AS (
+        UPDATE "user" SET garden_version = nextval('garden_version_seq')
+        WHERE email = $1 AND EXISTS (SELECT 1 FROM moved)
+    )
+    SELECT ARRAY(SELECT plant_id FROM moved) AS plant_ids,
+           ARRAY(SELECT plant_id FROM plant WHERE email = $1 AND plant_id = ANY($2::int[])) AS found,
+           (SELECT moving FROM blocking) AS blocked_plant,
+           (SELECT plant_id FROM blocking) AS blocked_by
+"""
+
+UPDATE_USERNAME = """
+    UPDATE "user" SET username = $2, garden_version = nextval('garden_version_seq')
+    WHERE email = $1
+    RETURNING email
+"""
+
+# Everything a garden read needs in one statement, so the version and the
+# plants come from the same snapshot. The user columns repeat on every row;
+# a garden without plants is a single row with NULL plant columns.
+GARDEN = """
+    SELECT u.garden_version, u.username, u.money, u.plant_limit, u.plant_count, u.weather,
+           p.plant_id, p.plant_type, p.plant_species, p.size, p.rarity, p.x, p.y,
+           p.stage, p.growth_time_remaining, p.fertilizer_remaining, p.ready_at
+    FROM "user" u
+    LEFT JOIN plant p ON p.email = u.email
+    WHERE u.email = $1
+    ORDER BY p.plant_id
+"""
+
+# Enough to recompute a garden's ETag without reading the plants: the
+# version, plus the wall-clock timers that change what a read returns.
+GARDEN_VERSION = """
+    SELECT garden_version,
+           ARRAY(
+               SELECT ready_at FROM plant
+               WHERE email = $1 AND ready_at IS NOT NULL
+               ORDER BY plant_id
+           ) AS timers
+    FROM "user"
+    WHERE email = $1
+"""
+
+# Plants positioned inside [$2, $4] x [$3, $5], edges included: a range
+# scan of plant_email_x_y_idx over x, with y checked on the index entries.
+PLANTS_IN_BOX = """
+    SELECT * FROM plant
+    WHERE email = $1 AND x BETWEEN $2 AND $4 AND y BETWEEN $3 AND $5
+"""
+
+# The same box, positions only (an index-only scan), leaving out plant $6.
+PLANT_POSITIONS_IN_BOX = """
+    SELECT x, y FROM plant
+    WHERE email = $1 AND x BETWEEN $2 AND $4 AND y BETWEEN $3 AND $5
+      AND plant_id IS DISTINCT FROM $6::int
+"""
+
+DELETE_USER = """
+    WITH owner AS (
+        SELECT 1 FROM "user" WHERE email = $1 FOR UPDATE
+    ),
+    plants AS (
+        DELETE FROM plant WHERE email = $1 AND EXISTS (SELECT 1 FROM owner)
+    )
+    DELETE FROM "user" WHERE email = $1 AND EXISTS (SELECT 1 FROM owner) RETURNING email
+"""
+
+
+# The hot queries by name, for the slow-query log and SQL spans (see
+# `app.core.metrics`). asyncpg prepares each one on first use per
+# connection and keeps it in its statement cache, sized by
+# DB_STATEMENT_CACHE_SIZE.
+REGISTRY = {
+    "lock_owner": LOCK_OWNER,
+    "lock_rolls": LOCK_ROLLS,
+    "grow_plants": GROW_PLANTS,
+    "create_plant": CREATE_PLANT,
+    "create_plants": CREATE_PLANTS,
+    "apply_water": APPLY_WATER,
+    "apply_fertilizer": APPLY_FERTILIZER,
+    "sell_plant": SELL_PLANT,
+    "sell_plants": SELL_PLANTS,
+    "create_user": CREATE_USER,
+    "create_user_free_tag": CREATE_USER_FREE_TAG,
+    "change_money": CHANGE_MONEY,
+    "increase_plant_limit": INCREASE_PLANT_LIMIT,
+    "cycle_weather": CYCLE_WEATHER,
+    "move_plant": MOVE_PLANT,
+    "move_plants": MOVE_PLANTS,
+    "update_username": UPDATE_USERNAME,
+    "garden": GARDEN,
+    "garden_version": GARDEN_VERSION,
+    "plants_in_box": PLANTS_IN_BOX,
+    "plant_positions_in_box": PLANT_POSITIONS_IN_BOX,
+    "delete_user": DELETE_USER,
+}
+
+
+async def grow_plants(conn, email, time, plant_ids, fertilizer_by_rarity, now):
+    return await conn.fetch(GROW_PLANTS, email, time, plant_ids, fertilizer_by_rarity, now)
+
+
+async def _fetchrow_locked(conn, query, email, *args):
+    async with conn.transaction():
+        await conn.execute(LOCK_OWNER, email)
+        return await conn.fetchrow(query, email, *args)
+
+
+@asynccontextmanager
+async def rolls_locked(conn, email, key, count):
+    """A transaction holding `email`'s row lock for a purchase of `count`
+    plants; yields LOCK_ROLLS's row, or None if there is no such user.
+    Roll the plants and run the purchase inside it."""
+    async with conn.transaction():
+        yield await conn.fetchrow(LOCK_ROLLS, email, key, count)
+
+
+async def create_plant(
+    conn, email, cost, plant_type, plant_species, size, rarity, x, y, spacing, garden_version, roll_seed
+):
+    return await conn.fetchrow(
+        CREATE_PLANT, email, cost, plant_type, plant_species, size, rarity, x, y, spacing,
+        garden_version, roll_seed,
+    )
+
+
+async def create_plants(
+    conn, email, cost, plant_types, species, sizes, rarities, xs, ys, spacing, garden_version, roll_seeds
+):
+    return await conn.fetchrow(
+        CREATE_PLANTS, email, cost, plant_types, species, sizes, rarities, xs, ys, spacing,
+        garden_version, roll_seeds,
+    )
+
+
+async def apply_water(conn, email, plant_id, cost, growth_time, ready_at):
+    return await conn.fetchrow(APPLY_WATER, email, plant_id, cost, growth_time, ready_at)
+
+
+async def apply_fertilizer(
+    conn, email, plant_id, cost, now, fertilizer_by_rarity, growth_by_rarity, ready_at_by_rarity
+):
+    return await conn.fetchrow(
+        APPLY_FERTILIZER,
+        email,
+        plant_id,
+        cost,
+        now,
+        fertilizer_by_rarity,
+        growth_by_rarity,
+        ready_at_by_rarity,
+    )
+
+
+async def sell_plant(conn, email, plant_id, now, stage_1_values, stage_2_values):
+    return await conn.fetchrow(SELL_PLANT, email, plant_id, now, stage_1_values, stage_2_values)
+
+
+async def sell_plants(conn, email, plant_ids, now, stage_1_values, stage_2_values):
+    return await conn.fetchrow(
+        SELL_PLANTS, email, plant_ids, now, stage_1_values, stage_2_values
+    )
+
+
+async def create_user(conn, base, email, money, plant_limit, weather, tags):
+    return await conn.fetchrow(CREATE_USER, base, email, money, plant_limit, weather, tags)
+
+
+async def create_user_free_tag(conn, base, email, money, plant_limit, weather, tags, start):
+    return await conn.fetchrow(
+        CREATE_USER_FREE_TAG, base, email, money, plant_limit, weather, tags, start
+    )
+
+
+async def change_money(
+    conn, email, amount, base, stage_1_bonus_by_rarity, stage_2_bonus_by_rarity, sunny, sunny_multiplier
+):
+    return await conn.fetchrow(
+        CHANGE_MONEY, email, amount, base,
+        stage_1_bonus_by_rarity, stage_2_bonus_by_rarity, sunny, sunny_multiplier,
+    )
+
+
+async def increase_plant_limit(conn, email, costs, initial_limit, increase):
+    return await conn.fetchrow(INCREASE_PLANT_LIMIT, email, costs, initial_limit, increase)
+
+
+async def cycle_weather(conn, email):
+    return await conn.fetchval(CYCLE_WEATHER, email)
+
+
+async def move_plant(conn, email, plant_id, x, y, spacing):
+    return await _fetchrow_locked(conn, MOVE_PLANT, email, plant_id, x, y, spacing)
+
+
+async def move_plants(conn, email, plant_ids, xs, ys, spacing):
+    return await _fetchrow_locked(conn, MOVE_PLANTS, email, plant_ids, xs, ys, spacing)
+
+
+async def update_username(conn, email, username):
+    return await conn.fetchval(UPDATE_USERNAME, email, username)
+
+
+async def garden(conn, email):
+    return await conn.fetch(GARDEN, email)
+
+
+async def garden_version(conn, email):
+    return await conn.fetchrow(GARDEN_VERSION, email)
+
+
+async def plants_in_box(conn, email, min_x, min_y, max_x, max_y):
+    return await conn.fetch(PLANTS_IN_BOX, email, min_x, min_y, max_x, max_y)
+
+
+async def plant_positions_in_box(conn, email, min_x, min_y, max_x, max_y, exclude=None):
+    return await conn.fetch(
+        PLANT_POSITIONS_IN_BOX, email, min_x, min_y, max_x, max_y, exclude
+    )
+
+
+async def delete_user(conn, email):
+    return await conn.fetchval(DELETE_USER, email)
@@ -0,0 +1,368 @@
+"""Bulk export and import of "user" and plant rows, for `scripts.garden_data`
+and `GET /admin/export/{table}`.
+
+Rows leave Postgres through COPY ... TO STDOUT already encoded: CSV by
+Postgres itself, NDJSON as one row_to_json value per row, copied out as a
+single CSV column whose delimiter and quote characters JSON never contains,
+so each value comes out verbatim. Output is gzip-compressed chunk by chunk
+as COPY hands it over, so memory stays flat however many rows there are.
+
+A table is read in key order (email, plant_id), `rows` keys at a time:
+`chunk_end` finds where the next chunk ends with an index-only scan, then
+`copy_out` copies that key range. A chunk that didn't finish is redone
+from the key the previous one ended at.
+
+Imports parse and validate each row as the API would have (`PlantCreate`,
+PLANT_SPECIES), COPY valid ones into a temporary table in batches and
+insert those whose key isn't taken yet, so running an import twice is
+harmless. Plants are only inserted for users that exist, and bump their
+owner's plant_count and garden_version like a purchase would. Like a
+purchase, a plant is refused if it overlaps one of its owner's plants,
+already in the database or earlier in its batch, or if it would take
+them past plant_limit.
+"""
+import csv
+import gzip
+import io
+import math
+import zlib
+from datetime import datetime
+
+import orjson
+from pydantic import ValidationError
+
+from app.core.config import PLANT_SPACING, PLANT_SPECIES
+from app.core.ledger import OPENING_BALANCE
+from app.core.spatial import PositionGrid
+from app.models.schemas import PlantCreate, UserCreate
+
+FORMATS = {"ndjson": ".ndjson.gz", "csv": ".csv.gz"}
+
+# Bytes JSON text never contains unescaped; see the module docstring.
+NDJSON_DELIMITER = "\x02"
+NDJSON_QUOTE = "\x01"
+
+
+class TableSpec:
+    def __init__(self, name, relation, key, start, columns):
+        self.name = name
+        self.relation = relation
+        self.key = key
+        # Sorts before every key, for the first chunk.
+        self.start = start
+        # Column name -> converter from a parsed NDJSON or CSV value.
+        self.columns = columns
+
+    def parse_key(self, text):
+        return self.columns[self.key](text)
+
+    def _where(self, emails):
+        where = f"{self.key} > $1 AND {self.key} <= $2"
+        if emails:
+            where += " AND email = ANY($3::text[])"
+        return where
+
+    def select(self, emails):
+        return (
+            f"SELECT {', '.join(self.columns)} FROM {self.relation} "
+            f"WHERE {self._where(emails)} ORDER BY {self.key}"
+        )
+
+    def chunk_end_query(self, emails):
+        where = f"{self.key} > $1" + (" AND email = ANY($3::text[])" if emails else "")
+        return (
+            f"SELECT max({self.key}) AS until, count(*) AS rows FROM ("
+            f"SELECT {self.key} FROM {self.relation} WHERE {where} ORDER BY {self.key} LIMIT $2"
+            f") chunk"
+        )
+
+
+def _timestamp(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+TABLES = {
+    "user": TableSpec("user", '"user"', "email", "", {
+        "email": str,
+        "username": str,
+        "money": float,
+        "plant_limit": int,
+        "weather": int,
+        "plant_count": int,
+    }),
+    "plant": TableSpec("plant", "plant", "plant_id", 0, {
+        "plant_id": int,
+        "plant_type": str,
+        "plant_species": str,
+        "size": float,
+        "rarity": int,
+        "x": float,
+        "y": float,
+        "stage": int,
+        "growth_time_remaining": int,
+        "fertilizer_remaining": int,
+        "ready_at": _timestamp,
+        "email": str,
+    }),
+}
+
+
+async def chunk_end(conn, table, after, rows, emails=None):
+    """`(until, count)` for the next `rows` keys after `after`; `until` is
+    None once there are none left."""
+    args = (after, rows, emails) if emails else (after, rows)
+    row = await conn.fetchrow(table.chunk_end_query(emails), *args)
+    return row["until"], row["rows"]
+
+
+async def copy_out(conn, table, fmt, output, after, until, emails=None):
+    """COPY the rows with keys in (after, until] to `output`, an async
+    callable taking each chunk of encoded bytes. Returns the row count."""
+    query = table.select(emails)
+    args = (after, until, emails) if emails else (after, until)
+    if fmt == "ndjson":
+        status = await conn.copy_from_query(
+            f"SELECT row_to_json(r) FROM ({query}) r", *args,
+            output=output, format="csv", delimiter=NDJSON_DELIMITER, quote=NDJSON_QUOTE,
+        )
+    else:
+        status = await conn.copy_from_query(query, *args, output=output, format="csv", header=True)
+    return int(status.split()[-1])
+
+
+class GzipStream:
+    """Incremental gzip encoder: feed it bytes, get compressed bytes back."""
+
+    def __init__(self, level=6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+def read_rows(path, fmt):
+    """`(line, row)` for each row of a gzip-compressed NDJSON or CSV file,
+    with CSV's empty fields as None."""
+    with gzip.open(path, "rb") as raw:
+        if fmt == "ndjson":
+            for line, text in enumerate(raw, 1):
+                if text.strip():
+                    yield line, orjson.loads(text)
+        else:
+            reader = csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8", newline=""))
+            for row in reader:
+                yield reader.line_num, {key: value if value != "" else None for key, value in row.items()}
+
+
+def _convert(table, row):
+    record = {}
+    for column, convert in table.columns.items():
+        value = row.get(column)
+        record[column] = None if value is None else convert(value)
+    return record
+
+
+def validate_user(record):
+    UserCreate(email=record["email"])
+    if not record["username"]:
+        raise ValueError("username is empty")
+    if record["money"] is None or not math.isfinite(record["money"]):
+        raise ValueError("money must be a finite number")
+    if record["plant_limit"] is None or record["plant_limit"] < 0:
+        raise ValueError("plant_limit must be at least 0")
+    if record["weather"] not in (0, 1, 2):
+        raise ValueError("weather must be 0, 1 or 2")
+
+
+def validate_plant(record):
+    PlantCreate(plant_type=record["plant_type"], x=record["x"], y=record["y"])
+    by_rarity = PLANT_SPECIES.get(record["plant_type"])
+    if by_rarity is None:
+        raise ValueError(f"Invalid plant_type. Must be one of: {', '.join(PLANT_SPECIES)}")
+    if record["plant_species"] not in by_rarity.get(record["rarity"], ()):
+        raise ValueError(
+            f"{record['plant_species']!r} is not a {record['plant_type']} of rarity {record['rarity']}"
+        )
+    if record["stage"] not in (0, 1, 2):
+        raise ValueError("stage must be 0, 1 or 2")
+    if not record["email"]:
+        raise ValueError("email is empty")
+
+
+VALIDATORS = {"user": validate_user, "plant": validate_plant}
+
+
+def parse_row(table, row):
+    """The row as a record ready for COPY, or raise ValueError."""
+    try:
+        record = _convert(table, row)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"unreadable value: {e}") from e
+    try:
+        VALIDATORS[table.name](record)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+        )) from e
+    return record
+
+
+# New users start with no plants and a fresh garden_version (versions are
+# only meaningful within one database); imported plants count themselves
+# in. Each gets an opening_balance ledger entry, and username_tag is moved
+# past their tags as migration 006 does.
+INSERT_USERS = """
+    WITH inserted AS (
+        INSERT INTO "user" (email, username, money, plant_limit, weather, plant_count, garden_version)
+        SELECT email, username, money, plant_limit, weather, 0, nextval('garden_version_seq')
+        FROM import_user
+        ON CONFLICT DO NOTHING
+        RETURNING email, username, money, garden_version
+    ),
+    tags AS (
+        INSERT INTO username_tag (base, next_tag)
+        SELECT substring(username FROM '^(.*)#[0-9]{4}$'), MAX(right(username, 4)::integer) + 1
+        FROM inserted
+        WHERE username ~ '#[0-9]{4}$'
+        GROUP BY 1
+        ON CONFLICT (base) DO UPDATE SET next_tag = GREATEST(username_tag.next_tag, EXCLUDED.next_tag)
+    ),
+    opened AS (
+        INSERT INTO money_ledger (email, amount, balance, garden_version, reason, recorded_at)
+        SELECT email, money, money, garden_version, $1, now()
+        FROM inserted
+    )
+    SELECT count(*) FROM inserted
+"""
+
+# The owners' row locks, taken in a statement of their own before
+# INSERT_PLANTS for the reason queries.LOCK_OWNER gives: the overlap check
+# then sees every plant bought or moved before the import got the lock.
+LOCK_PLANT_OWNERS = """
+    SELECT 1 FROM "user"
+    WHERE email IN (SELECT DISTINCT email FROM import_plant)
+    ORDER BY email
+    FOR UPDATE
+"""
+
+# Run after LOCK_PLANT_OWNERS. Plants already present are skipped before
+# anything is checked. `blocked_by` is an existing plant of the owner's the new one would
+# overlap ($1 is the spacing), read from plant_email_x_y_idx as purchases
+# check it. Of those that fit, each owner gets them in plant_id order
+# until plant_limit.
+INSERT_PLANTS = """
+    WITH owner AS (
+        SELECT email, plant_limit, plant_count FROM "user"
+        WHERE email IN (SELECT DISTINCT email FROM import_plant)
+    ),
+    new AS (
+        SELECT s.*, owner.plant_limit, owner.plant_count
+        FROM import_plant s
+        JOIN owner USING (email)
+        WHERE NOT EXISTS (SELECT 1 FROM plant p WHERE p.plant_id = s.plant_id)
+    ),
+    checked AS (
+        SELECT new.*, (
+            SELECT p.plant_id FROM plant p
+            WHERE p.email = new.email
+              AND p.x > new.x - $1::float8 AND p.x < new.x + $1::float8
+              AND p.y > new.y - $1::float8 AND p.y < new.y + $1::float8
+            LIMIT 1
+        ) AS blocked_by
+        FROM new
+    ),
+    ranked AS (
+        SELECT checked.*, row_number() OVER (PARTITION BY email ORDER BY plant_id) AS rank
+        FROM checked
+        WHERE blocked_by IS NULL
+    ),
+    inserted AS (
+        INSERT INTO plant (plant_id, plant_type, plant_species, size, rarity, x, y, stage,
+                           growth_time_remaining, fertilizer_remaining, ready_at, email)
+        SELECT plant_id, plant_type, plant_species, size, rarity, x, y, stage,
+               growth_time_remaining, fertilizer_remaining, ready_at, email
+        FROM ranked
+        WHERE plant_count + rank <= plant_limit
+        ON CONFLICT DO NOTHING
+        RETURNING email
+    ),
+    counted AS (
+        UPDATE "user" u
+        SET plant_count = u.plant_count + c.n,
+            garden_version = nextval('garden_version_seq')
+        FROM (SELECT email, count(*) AS n FROM inserted GROUP BY email) c
+        WHERE u.email = c.email
+    )
+    SELECT (SELECT count(*) FROM inserted) AS inserted,
+           ARRAY(SELECT plant_id FROM checked WHERE blocked_by IS NOT NULL ORDER BY plant_id) AS blocked,
+           ARRAY(SELECT blocked_by FROM checked WHERE blocked_by IS NOT NULL ORDER BY plant_id) AS blocked_by,
+           ARRAY(SELECT plant_id FROM ranked WHERE plant_count + rank > plant_limit ORDER BY plant_id)
+               AS over_limit
+"""
+
+PRESENT_PLANTS = "SELECT plant_id FROM plant WHERE plant_id = ANY($1::int[])"
+
+# Keeps new purchases from reusing imported plant ids.
+ADVANCE_PLANT_ID = """
+    SELECT setval(pg_get_serial_sequence('plant', 'plant_id'),
+                  GREATEST(max(plant_id), nextval(pg_get_serial_sequence('plant', 'plant_id'))))
+    FROM plant
+    HAVING max(plant_id) IS NOT NULL
+"""
+
+
+def overlapping_in_batch(records, spacing=PLANT_SPACING):
+    """Split plant records into those to import and `(plant_id, reason)`
+    for each that overlaps an earlier one of the same owner's."""
+    grids = {}
+    kept, refused = [], []
+    for record in records:
+        grid = grids.setdefault(record["email"], PositionGrid(spacing))
+        other = grid.overlapping(record["x"], record["y"])
+        if other is None:
+            grid.add(record["x"], record["y"], record["plant_id"])
+            kept.append(record)
+        else:
+            refused.append((record["plant_id"], f"position overlaps plant {other} in the same batch"))
+    return kept, refused
+
+
+async def import_batch(conn, table, records):
+    """Insert a batch of parsed records. Returns how many were new and
+    `(plant_id, reason)` for each plant refused for its position or its
+    owner's plant_limit."""
+    refused = []
+    if table.name == "plant":
+        # Plants already imported are skipped before the batch is checked
+        # against itself, so a second run refuses nothing the first didn't.
+        present = {
+            row["plant_id"]
+            for row in await conn.fetch(PRESENT_PLANTS, [record["plant_id"] for record in records])
+        }
+        records, refused = overlapping_in_batch([r for r in records if r["plant_id"] not in present])
+    staging = f"import_{table.name}"
+    async with conn.transaction():
+        await conn.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS AS "
+            f"SELECT {', '.join(table.columns)} FROM {table.relation} WITH NO DATA"
+        )
+        await conn.copy_records_to_table(
+            staging,
+            records=[tuple(record.values()) for record in records],
+            columns=list(table.columns),
+        )
+        if table.name == "user":
+            return await conn.fetchval(INSERT_USERS, OPENING_BALANCE), refused
+        await conn.execute(LOCK_PLANT_OWNERS)
+        result = await conn.fetchrow(INSERT_PLANTS, PLANT_SPACING)
+        if result["inserted"]:
+            await conn.execute(ADVANCE_PLANT_ID)
+    refused += [
+        (plant_id, f"position overlaps plant {other}")
+        for plant_id, other in zip(result["blocked"], result["blocked_by"])
+    ]
+    refused += [(plant_id, "owner's plant limit reached") for plant_id in result["over_limit"]]
+    return result["inserted"], sorted(refused)
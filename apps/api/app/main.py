@@ -1,16 +1,85 @@
+import asyncio
+import os
+
 from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
+from app.db import database
 from app.db.database import create_pool, close_pool
-from app.routers import users, plants
-from app.core.config import CORS_ORIGINS
+from app.core.cache import read_cache
+from app.core.encoding import json_response
+from app.core.events import garden_events
+from app.core.idempotency import idempotency_store
+from app.core.leaderboard import leaderboard
+from app.core.ledger import money_ledger
+from app.core.locks import user_write_locks
+from app.core.metrics import MetricsMiddleware, render_prometheus, slow_queries
+from app.core.scheduler import scheduler
+from app.core.search import username_index
+from app.core.security import jwks_cache, token_cache
+from app.core.tracing import span_exporter
+from app.routers import users, plants, garden, admin
+from app.core.config import (
+    CACHE_SWEEP_INTERVAL,
+    CORS_ORIGINS,
+    LEADERBOARD_RECONCILE_INTERVAL,
+    LEDGER_COMPACT_SCHEDULE,
+    METRICS_ENABLED,
+)
+
+
+async def reconcile_leaderboard():
+    await leaderboard.refresh_from(database.pool)
+
+
+async def compact_ledger():
+    await money_ledger.compact(database.pool)
+
+
+async def sweep_expired():
+    read_cache.purge_expired()
+    idempotency_store.purge_expired()
+    token_cache.purge_expired()
+
+
+# Every worker keeps its own leaderboard, so every worker reconciles its
+# own; the jitter keeps their occasional full reads of "user" apart.
+scheduler.every(
+    "leaderboard_reconcile",
+    LEADERBOARD_RECONCILE_INTERVAL,
+    reconcile_leaderboard,
+    jitter=LEADERBOARD_RECONCILE_INTERVAL / 10,
+)
+scheduler.every("cache_sweep", CACHE_SWEEP_INTERVAL, sweep_expired, jitter=CACHE_SWEEP_INTERVAL / 10)
+scheduler.cron("ledger_compact", LEDGER_COMPACT_SCHEDULE, compact_ledger, leader=True)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_pool()
+    # Independent, so a slow JWKS fetch overlaps with opening the pool.
+    await asyncio.gather(create_pool(), jwks_cache.start())
+    # The username index is rebuilt from the leaderboard's `"user"` snapshot
+    # rather than scanning the table a second time.
+    leaderboard.on_snapshot(username_index.sync)
+    await leaderboard.start(database.pool)
+    # Writes on other workers reach a per-worker cache through the same
+    # NOTIFY relay as garden events.
+    garden_events.on_remote(read_cache.forget_garden)
+    await garden_events.start()
+    await span_exporter.start()
+    await scheduler.start()
     yield
+    # Jobs first, so none is left holding a connection when the pool closes.
+    await scheduler.stop()
+    await span_exporter.stop()
+    await garden_events.stop()
+    await read_cache.close()
+    await idempotency_store.close()
+    await jwks_cache.stop()
     await close_pool()
 
 
@@ -22,10 +91,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed", "Export-Next-After", "Export-Rows"],
 )
 
+if METRICS_ENABLED:
+    # Added last so it wraps CORS too and sees each request's full time.
+    app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request, exc):
+    # The default handler echoes the rejected input through json.dumps,
+    # which raises on a NaN or Infinity sent as a coordinate; orjson writes
+    # them as null.
+    return json_response({"detail": jsonable_encoder(exc.errors())}, status_code=422)
+
+
 app.include_router(users.router)
 app.include_router(plants.router)
+app.include_router(garden.router)
+app.include_router(admin.router)
 
 
 @app.get("/")
@@ -33,6 +118,84 @@ async def read_root():
     return {"message": "Welcome to the Pomo Patch API"}
 
 
+@app.get("/health/live")
+async def liveness():
+    """The worker's event loop is answering."""
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Whether this worker can serve traffic: a pool connection answers
+    and signing keys are loaded. 503 otherwise."""
+    checks = {"database": False, "jwks": jwks_cache.ready}
+    try:
+        async with database.acquire() as conn:
+            checks["database"] = await conn.fetchval("SELECT 1") == 1
+    except Exception as e:
+        print("Readiness check failed:", e)
+    ready = all(checks.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "unavailable", "checks": checks},
+        status_code=200 if ready else 503,
+    )
+
+
+@app.get("/health/db")
+async def db_health():
+    return database.pool_stats.snapshot()
+
+
+@app.get("/health/cache")
+async def cache_health():
+    return read_cache.stats()
+
+
+@app.get("/health/locks")
+async def locks_health():
+    return user_write_locks.stats()
+
+
+@app.get("/health/idempotency")
+async def idempotency_health():
+    return idempotency_store.stats()
+
+
+@app.get("/health/ledger")
+async def ledger_health():
+    return money_ledger.stats()
+
+
+@app.get("/health/scheduler")
+async def scheduler_health():
+    return scheduler.stats()
+
+
+@app.get("/health/slow-queries")
+async def slow_queries_health():
+    return slow_queries.snapshot()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: per-route request counts, latency and phase
+    histograms, SQL statements per request, scheduled job runs and
+    durations, and the `/health/*` numbers as gauges."""
+    return PlainTextResponse(
+        render_prometheus({
+            "db_pool": database.pool_stats.snapshot(),
+            "cache": read_cache.stats(),
+            "locks": user_write_locks.stats(),
+            "idempotency": idempotency_store.stats(),
+            "auth_token_cache": token_cache.stats(),
+            "tracing": span_exporter.stats(),
+            "ledger": money_ledger.stats(),
+            "scheduler": scheduler.stats(),
+        }),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,4 +1,11 @@
-from pydantic import BaseModel, EmailStr
+from typing import Annotated, Optional
+
+from pydantic import BaseModel, EmailStr, Field
+
+from app.core.config import GARDEN_EXTENT, PLANT_BATCH_MAX_SIZE, PLANT_MOVE_BATCH_MAX_SIZE
+
+# Also rejects NaN and infinities, which would fail every overlap check.
+Coordinate = Annotated[float, Field(ge=-GARDEN_EXTENT, le=GARDEN_EXTENT)]
 
 
 class UserCreate(BaseModel):
@@ -10,19 +17,44 @@ class UsernameUpdate(BaseModel):
 
 
 class MoneyChange(BaseModel):
-    amount: float
+    # A session reward: positive, and capped per garden by the handler. A NaN
+    # would make the balance, and every ledger total after it, NaN.
+    amount: float = Field(gt=0, allow_inf_nan=False)
 
 
 class PlantCreate(BaseModel):
     plant_type: str
-    x: float
-    y: float
+    x: Coordinate
+    y: Coordinate
+
+
+class PlantBatchCreate(BaseModel):
+    plants: list[PlantCreate] = Field(min_length=1, max_length=PLANT_BATCH_MAX_SIZE)
+
+
+class PlantBatchSell(BaseModel):
+    plant_ids: list[int] = Field(min_length=1, max_length=PLANT_BATCH_MAX_SIZE)
 
 
 class PlantPosition(BaseModel):
-    x: float
-    y: float
+    x: Coordinate
+    y: Coordinate
+
+
+class PlantMove(BaseModel):
+    plant_id: int
+    x: Coordinate
+    y: Coordinate
+
+
+class PlantBatchMove(BaseModel):
+    plants: list[PlantMove] = Field(min_length=1, max_length=PLANT_MOVE_BATCH_MAX_SIZE)
 
 
 class GrowthTimeUpdate(BaseModel):
     time: int
+
+
+class BulkGrowthUpdate(BaseModel):
+    time: int
+    plant_ids: Optional[list[int]] = None
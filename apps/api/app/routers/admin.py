@@ -0,0 +1,79 @@
+import asyncio
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+
+from app.core.config import EXPORT_CHUNK_ROWS, EXPORT_MAX_CHUNK_ROWS
+from app.core.security import verify_admin
+from app.db import database, transfer
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+# Compressed chunks buffered between COPY and a slow client.
+EXPORT_QUEUE_SIZE = 8
+
+
+@router.get("/export/{table}")
+async def export_table(
+    table: Literal["user", "plant"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    email: Optional[list[str]] = Query(None),
+    after: Optional[str] = None,
+    limit: int = Query(EXPORT_CHUNK_ROWS, ge=1, le=EXPORT_MAX_CHUNK_ROWS),
+    admin_email: str = Depends(verify_admin),
+):
+    """One chunk of `table` in key order (email for users, plant_id for
+    plants), gzip-compressed NDJSON or CSV, optionally only `email`'s rows.
+
+    The response carries `Export-Next-After` while more rows may follow;
+    pass it back as `after` for the next chunk. A download cut short fails
+    to decompress rather than looking complete.
+    """
+    spec = transfer.TABLES[table]
+    try:
+        start = spec.start if after is None else spec.parse_key(after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid after")
+
+    async with database.acquire() as conn:
+        until, rows = await transfer.chunk_end(conn, spec, start, limit, email)
+
+    filename = f"{table}{transfer.FORMATS[format]}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Export-Rows": str(rows)}
+    if until is None:
+        return Response(transfer.GzipStream().flush(), media_type="application/gzip", headers=headers)
+    if rows == limit:
+        headers["Export-Next-After"] = str(until)
+
+    async def stream():
+        queue = asyncio.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        gzip = transfer.GzipStream()
+
+        async def output(data):
+            compressed = gzip.compress(data)
+            if compressed:
+                await queue.put(compressed)
+
+        async def copy():
+            try:
+                async with database.acquire() as conn:
+                    await transfer.copy_out(conn, spec, format, output, start, until, email)
+                await queue.put(gzip.flush())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Ends the body without the gzip trailer.
+                print("Export failed:", e)
+            await queue.put(None)
+
+        task = asyncio.create_task(copy())
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+        finally:
+            # The client went away: stop COPY and give the connection back.
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    return StreamingResponse(stream(), media_type="application/gzip", headers=headers)
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import math
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.db import database, queries
+from app.core.cache import garden_key, read_cache
+from app.core.config import GARDEN_EVENTS_KEEPALIVE, GROWTH_TIME_UNIT_SECONDS
+from app.core.encoding import columns, encode, etag_matches, wants_msgpack
+from app.core.events import RESYNC, encode_json, garden_events
+from app.core.growth import effective_plant, utcnow
+
+router = APIRouter(tags=["garden"])
+
+GARDEN_USER_FIELDS = ("username", "money", "plant_limit", "plant_count", "weather")
+GARDEN_PLANT_FIELDS = (
+    "plant_id",
+    "plant_type",
+    "plant_species",
+    "size",
+    "rarity",
+    "x",
+    "y",
+    "stage",
+    "growth_time_remaining",
+    "fertilizer_remaining",
+    "ready_at",
+)
+
+
+def garden_from_rows(rows):
+    """Build `{"version", "user", "plants"}` from `queries.garden` rows.
+
+    Plants are as stored; `effective_garden` applies wall-clock growth.
+    """
+    first = rows[0]
+    return {
+        "version": first["garden_version"],
+        "user": {field: first[field] for field in GARDEN_USER_FIELDS},
+        "plants": [
+            {field: row[field] for field in GARDEN_PLANT_FIELDS}
+            for row in rows
+            if row["plant_id"] is not None
+        ],
+    }
+
+
+async def load_garden(email):
+    async with database.acquire() as conn:
+        rows = await queries.garden(conn, email)
+    return garden_from_rows(rows) if rows else None
+
+
+async def cached_garden(email):
+    return await read_cache.get_or_load(garden_key(email), lambda: load_garden(email))
+
+
+def effective_garden(garden, now=None):
+    now = now or utcnow()
+    return {**garden, "plants": [effective_plant(p, now) for p in garden["plants"]]}
+
+
+def garden_timers(garden):
+    return [p["ready_at"] for p in garden["plants"] if p["ready_at"] is not None]
+
+
+def garden_etag(version, timers, now, variant):
+    """Weak ETag for a garden read.
+
+    The version covers every write. In server growth mode a read also
+    depends on the clock through running timers, so the remaining time of
+    each one, in the units a read reports, goes into the tag as well.
+    """
+    tag = str(version)
+    if timers:
+        remaining = [
+            max(0, math.ceil((ready_at - now).total_seconds() / GROWTH_TIME_UNIT_SECONDS))
+            for ready_at in timers
+        ]
+        tag += "." + hashlib.blake2b(repr(remaining).encode(), digest_size=6).hexdigest()
+    return f'W/"{tag}-{variant}"'
+
+
+def cache_headers(etag):
+    # no-cache: browsers keep the body but revalidate it with the ETag on
+    # every use.
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+
+
+@router.get("/users/{email}/garden")
+async def get_garden(
+    email: str,
+    request: Request,
+    layout: Literal["rows", "columns"] = "rows",
+):
+    """The user's public fields and all plants in one response.
+
+    Responses carry an ETag; sending it back in If-None-Match returns 304
+    while the garden is unchanged.
+    `layout=columns` returns plants as one list per field, and
+    `Accept: application/msgpack` returns MessagePack instead of JSON.
+    """
+    msgpack_body = wants_msgpack(request)
+    variant = ("m" if msgpack_body else "j") + layout[0]
+    now = utcnow()
+
+    if request.headers.get("if-none-match") and not read_cache.enabled:
+        # Without the cache a revalidation only needs the version.
+        async with database.acquire() as conn:
+            row = await queries.garden_version(conn, email)
+        if not row:
+            raise HTTPException(status_code=404, detail="User not found")
+        etag = garden_etag(row["garden_version"], row["timers"], now, variant)
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=cache_headers(etag))
+
+    garden = await cached_garden(email)
+    if not garden:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    etag = garden_etag(garden["version"], garden_timers(garden), now, variant)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+
+    garden = effective_garden(garden, now)
+    if layout == "columns":
+        garden["plants"] = columns(garden["plants"], GARDEN_PLANT_FIELDS)
+    body, media_type = encode(garden, msgpack_body)
+    return Response(body, media_type=media_type, headers=cache_headers(etag))
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {encode_json(data)}\n\n"
+
+
+@router.get("/users/{email}/garden/events")
+async def garden_events_stream(email: str):
+    """Server-sent events for one garden.
+
+    The first `snapshot` event carries the user and all plants; each later
+    `delta` event carries only what a mutation changed (see
+    `app.core.events.GardenEvents`). A client that falls too far behind is
+    sent a new `snapshot`.
+    """
+    if not await cached_garden(email):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Subscribe before reading the snapshot so nothing committed in between
+    # is missed; replaying a delta the snapshot already includes is harmless.
+    queue = garden_events.subscribe(email)
+
+    async def stream():
+        try:
+            item = RESYNC
+            while True:
+                if item is RESYNC:
+                    garden = await cached_garden(email)
+                    if garden is None:
+                        yield _sse("delta", {"deleted": True})
+                        return
+                    yield _sse("snapshot", effective_garden(garden))
+                else:
+                    yield _sse("delta", item)
+                    if item.get("deleted"):
+                        return
+
+                while True:
+                    try:
+                        item = await asyncio.wait_for(queue.get(), GARDEN_EVENTS_KEEPALIVE)
+                        break
+                    except TimeoutError:
+                        yield ": keepalive\n\n"
+        finally:
+            garden_events.unsubscribe(email, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
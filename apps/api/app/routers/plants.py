@@ -1,29 +1,77 @@
-from fastapi import APIRouter, HTTPException, Depends
+import math
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
 import asyncpg
-import random
 
+from app.db import database, queries
 from app.db.database import get_db
+from app.core.cache import plants_key, read_cache
 from app.core.security import verify_clerk_token
+from app.core.encoding import json_response
+from app.core.events import garden_events
+from app.core.idempotency import IdempotentRoute
+from app.core.leaderboard import leaderboard
+from app.core.rolls import ROLL_SEED_HASH_KEY, roll, roll_one
+from app.core.spatial import first_overlap, nearest_free, parse_bbox
 from app.core.config import (
     WATER_COST,
     FERTILIZER_COST,
     PLANT_COST,
+    PLANT_SPACING,
+    GARDEN_EXTENT,
+    FREE_SLOT_SEARCH_RADIUS,
     STAGE_0_GROWTH_TIME,
     PLANT_SPECIES,
-    RARITY_PROBABILITIES,
-    STAGE_1_GROWTH_TIMES,
     STAGE_1_SELL_VALUES,
     STAGE_2_SELL_VALUES,
 )
-from app.models.schemas import PlantCreate, PlantPosition, GrowthTimeUpdate
+from app.core.growth import (
+    SERVER_GROWTH,
+    FERTILIZER_BY_RARITY,
+    STAGE_1_GROWTH_BY_RARITY,
+    effective_plant,
+    ready_at_after,
+    stage_1_ready_at_by_rarity,
+    utcnow,
+)
+from app.models.schemas import (
+    PlantCreate,
+    PlantBatchCreate,
+    PlantBatchSell,
+    PlantPosition,
+    PlantBatchMove,
+    GrowthTimeUpdate,
+    BulkGrowthUpdate,
+)
 
-router = APIRouter(tags=["plants"])
+router = APIRouter(tags=["plants"], route_class=IdempotentRoute)
 
 
-def generate_random_size():
-    """Generate a random size between 0 and 1 using normal distribution."""
-    size = random.gauss(0.5, 0.2)
-    return max(0.0, min(1.0, size))
+def check_plant_type(plant_type):
+    if plant_type not in PLANT_SPECIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid plant_type. Must be one of: {', '.join(PLANT_SPECIES.keys())}"
+        )
+
+
+def grown_delta(row):
+    """Garden event fields for a row returned by `queries.grow_plants`."""
+    delta = {
+        "plant_id": row["plant_id"],
+        "stage": row["stage"],
+        "growth_time_remaining": row["growth_time_remaining"],
+        "fertilizer_remaining": row["fertilizer_remaining"],
+    }
+    if row["stage_advanced"]:
+        delta["ready_at"] = None
+    return delta
+
+
+# Sell values indexed by rarity + 1 inside SQL.
+STAGE_1_SELL_BY_RARITY = [STAGE_1_SELL_VALUES[r] for r in sorted(STAGE_1_SELL_VALUES)]
+STAGE_2_SELL_BY_RARITY = [STAGE_2_SELL_VALUES[r] for r in sorted(STAGE_2_SELL_VALUES)]
 
 
 @router.post("/users/{email}/plants/", status_code=201)
@@ -38,67 +86,69 @@ async def create_plant(
             status_code=403, detail="Cannot modify another user's plants"
         )
 
-    async with conn.transaction():
-        user = await conn.fetchrow('SELECT money, plant_limit FROM "user" WHERE email = $1', email)
-        if not user:
+    check_plant_type(plant.plant_type)
+
+    async with queries.rolls_locked(conn, email, ROLL_SEED_HASH_KEY, 1) as rolls:
+        if rolls is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        current_plant_count = await conn.fetchval(
-            "SELECT COUNT(*) FROM plant WHERE email = $1",
-            email
+        [roll_seed] = rolls["roll_seeds"]
+        rarity, plant_species, plant_size = roll_one(plant.plant_type, roll_seed)
+
+        result = await queries.create_plant(
+            conn,
+            email,
+            PLANT_COST,
+            plant.plant_type,
+            plant_species,
+            plant_size,
+            rarity,
+            plant.x,
+            plant.y,
+            PLANT_SPACING,
+            rolls["garden_version"],
+            roll_seed,
         )
 
-        if current_plant_count >= user["plant_limit"]:
+    if result["plant_id"] is None:
+        if result["plant_count"] >= result["plant_limit"]:
             raise HTTPException(
                 status_code=400,
-                detail=f"Plant limit reached. Current: {current_plant_count}/{user['plant_limit']}"
+                detail=f"Plant limit reached. Current: {result['plant_count']}/{result['plant_limit']}"
             )
-
-        if user["money"] < PLANT_COST:
+        if result["money"] < PLANT_COST:
             raise HTTPException(
                 status_code=400, detail=f"Insufficient money. Need {PLANT_COST} to create a plant"
             )
-
-        if plant.plant_type not in PLANT_SPECIES:
+        if result["blocked_by"] is not None:
             raise HTTPException(
-                status_code=400,
-                detail=f"Invalid plant_type. Must be one of: {', '.join(PLANT_SPECIES.keys())}"
+                status_code=409, detail=f"Position overlaps plant {result['blocked_by']}"
             )
 
-        rand = random.random()
-        if rand < RARITY_PROBABILITIES[0]:
-            rarity = 0
-        elif rand < RARITY_PROBABILITIES[0] + RARITY_PROBABILITIES[1]:
-            rarity = 1
-        else:
-            rarity = 2
-
-        species_list = PLANT_SPECIES[plant.plant_type][rarity]
-        plant_species = random.choice(species_list)
-
-        plant_size = generate_random_size()
-
-        await conn.execute(
-            'UPDATE "user" SET money = money - $1 WHERE email = $2',
-            PLANT_COST,
-            email
-        )
-
-        plant_id = await conn.fetchval(
-            """INSERT INTO plant (plant_type, plant_species, size, rarity, x, y, stage, growth_time_remaining, email)
-               VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9) RETURNING plant_id""",
-            plant.plant_type,
-            plant_species,
-            plant_size,
-            rarity,
-            plant.x,
-            plant.y,
-            0,
-            None,
-            email,
-        )
+    plant_id = result["plant_id"]
+    new_balance = result["new_balance"]
 
-        new_balance = await conn.fetchval('SELECT money FROM "user" WHERE email = $1', email)
+    leaderboard.record_balance(email, new_balance)
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(
+        email,
+        plants=[
+            {
+                "plant_id": plant_id,
+                "plant_type": plant.plant_type,
+                "plant_species": plant_species,
+                "size": plant_size,
+                "rarity": rarity,
+                "x": plant.x,
+                "y": plant.y,
+                "stage": 0,
+                "growth_time_remaining": None,
+                "fertilizer_remaining": None,
+                "ready_at": None,
+            }
+        ],
+        user={"money": new_balance},
+    )
 
     return {
         "message": "Plant created successfully",
@@ -108,21 +158,166 @@ async def create_plant(
         "size": plant_size,
         "rarity": rarity,
         "money_spent": PLANT_COST,
-        "new_balance": new_balance
+        "new_balance": new_balance,
+        "roll_seed": roll_seed,
     }
 
 
-@router.get("/users/{email}/plants")
-async def get_user_plants(
+@router.post("/users/{email}/plants/batch", status_code=201)
+async def create_plants(
     email: str,
+    batch: PlantBatchCreate,
     conn: asyncpg.Connection = Depends(get_db),
+    auth_email: str = Depends(verify_clerk_token),
 ):
-    plants = await conn.fetch(
-        "SELECT * FROM plant WHERE email = $1",
+    """Buy several plants in one statement. Either all of them fit the
+    plant limit and balance, or none are bought.
+
+    Each plant's `roll_seed` replays its roll: `roll_one(plant_type,
+    roll_seed)` from app.core.rolls.
+    """
+    if email != auth_email:
+        raise HTTPException(
+            status_code=403, detail="Cannot modify another user's plants"
+        )
+
+    for plant in batch.plants:
+        check_plant_type(plant.plant_type)
+
+    overlap = first_overlap([(plant.x, plant.y) for plant in batch.plants])
+    if overlap is not None:
+        raise HTTPException(
+            status_code=400, detail=f"Plants {overlap[0]} and {overlap[1]} in the batch overlap"
+        )
+
+    plant_types = [plant.plant_type for plant in batch.plants]
+    count = len(batch.plants)
+    total_cost = PLANT_COST * count
+
+    async with queries.rolls_locked(conn, email, ROLL_SEED_HASH_KEY, count) as rolls:
+        if rolls is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        roll_seeds = rolls["roll_seeds"]
+        rarities, species, sizes = roll(plant_types, roll_seeds)
+
+        result = await queries.create_plants(
+            conn,
+            email,
+            PLANT_COST,
+            plant_types,
+            species,
+            sizes,
+            rarities,
+            [plant.x for plant in batch.plants],
+            [plant.y for plant in batch.plants],
+            PLANT_SPACING,
+            rolls["garden_version"],
+            roll_seeds,
+        )
+
+    if result["new_balance"] is None:
+        if result["plant_count"] + count > result["plant_limit"]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Plant limit reached. Current: {result['plant_count']}/{result['plant_limit']}, requested {count}"
+            )
+        if result["money"] < total_cost:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Insufficient money. Need {total_cost} to create {count} plants"
+            )
+        if result["blocked_by"] is not None:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Plant {result['blocked_position'] - 1} overlaps plant {result['blocked_by']}"
+            )
+
+    new_balance = result["new_balance"]
+    leaderboard.record_balance(email, new_balance)
+
+    created = [
+        {
+            "plant_id": plant_id,
+            "plant_type": plant.plant_type,
+            "plant_species": plant_species,
+            "size": size,
+            "rarity": rarity,
+            "x": plant.x,
+            "y": plant.y,
+            "roll_seed": roll_seed,
+        }
+        for plant_id, plant, rarity, plant_species, size, roll_seed in zip(
+            result["plant_ids"], batch.plants, rarities, species, sizes, roll_seeds
+        )
+    ]
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(
         email,
+        plants=[
+            {**p, "stage": 0, "growth_time_remaining": None, "fertilizer_remaining": None, "ready_at": None}
+            for p in created
+        ],
+        user={"money": new_balance},
     )
 
-    return {"plants": [dict(p) for p in plants]}
+    return {
+        "message": "Plants created successfully",
+        "plants": created,
+        "money_spent": total_cost,
+        "new_balance": new_balance,
+    }
+
+
+async def load_plants(email):
+    async with database.acquire() as conn:
+        plants = await conn.fetch("SELECT * FROM plant WHERE email = $1", email)
+    return [dict(p) for p in plants]
+
+
+@router.get("/users/{email}/plants")
+async def get_user_plants(email: str, bbox: Optional[str] = None):
+    """The whole garden, or with `bbox=min_x,min_y,max_x,max_y` only the
+    plants positioned inside that box, edges included. Box reads go to the
+    position index and skip the read cache."""
+    if bbox is None:
+        plants = await read_cache.get_or_load(plants_key(email), lambda: load_plants(email))
+    else:
+        try:
+            box = parse_bbox(bbox)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid bbox: {e}")
+        async with database.acquire() as conn:
+            plants = [dict(p) for p in await queries.plants_in_box(conn, email, *box)]
+
+    now = utcnow()
+    return json_response({"plants": [effective_plant(p, now) for p in plants]})
+
+
+@router.get("/users/{email}/plants/free-slot")
+async def find_free_slot(
+    email: str,
+    x: float = Query(ge=-GARDEN_EXTENT, le=GARDEN_EXTENT),
+    y: float = Query(ge=-GARDEN_EXTENT, le=GARDEN_EXTENT),
+    exclude: Optional[int] = None,
+    conn: asyncpg.Connection = Depends(get_db),
+):
+    """The position nearest (x, y) where a plant would overlap no other,
+    within FREE_SLOT_SEARCH_RADIUS. Pass the plant being dragged as
+    `exclude` so its current spot counts as free."""
+    reach = FREE_SLOT_SEARCH_RADIUS + PLANT_SPACING
+    rows = await queries.plant_positions_in_box(
+        conn, email, x - reach, y - reach, x + reach, y + reach, exclude
+    )
+    slot = nearest_free(x, y, [(r["x"], r["y"]) for r in rows])
+
+    if slot is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No free position within {FREE_SLOT_SEARCH_RADIUS} of ({x}, {y})"
+        )
+
+    return {"x": slot[0], "y": slot[1], "distance": math.dist((x, y), slot)}
 
 
 @router.get("/users/{email}/plants/{plant_id}")
@@ -140,7 +335,7 @@ async def get_user_plant(
     if not plant:
         raise HTTPException(status_code=404, detail="Plant not found")
 
-    return dict(plant)
+    return effective_plant(dict(plant))
 
 
 @router.patch("/users/{email}/plants/{plant_id}/position")
@@ -156,87 +351,144 @@ async def move_plant(
             status_code=403, detail="Cannot modify another user's plants"
         )
 
-    result = await conn.execute(
-        "UPDATE plant SET x = $1, y = $2 WHERE plant_id = $3 AND email = $4",
-        position.x,
-        position.y,
-        plant_id,
-        email,
+    result = await queries.move_plant(
+        conn, email, plant_id, position.x, position.y, PLANT_SPACING
     )
 
-    if result == "UPDATE 0":
+    if not result["found"]:
         raise HTTPException(status_code=404, detail="Plant not found")
 
+    if result["blocked_by"] is not None:
+        raise HTTPException(
+            status_code=409, detail=f"Position overlaps plant {result['blocked_by']}"
+        )
+
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(
+        email, plants=[{"plant_id": plant_id, "x": position.x, "y": position.y}]
+    )
+
     return {"message": "Plant moved successfully", "x": position.x, "y": position.y}
 
 
-@router.patch("/users/{email}/plants/{plant_id}/apply-water")
-async def apply_water(
+@router.patch("/users/{email}/plants/positions")
+async def move_plants(
     email: str,
-    plant_id: int,
+    batch: PlantBatchMove,
     conn: asyncpg.Connection = Depends(get_db),
     auth_email: str = Depends(verify_clerk_token),
 ):
+    """Move several plants in one statement, e.g. after rearranging the
+    garden. A plant named more than once ends up at its last position. If
+    any plant would overlap another, nothing moves; IDs that don't name one
+    of the user's plants are reported in `skipped`."""
     if email != auth_email:
         raise HTTPException(
             status_code=403, detail="Cannot modify another user's plants"
         )
 
-    async with conn.transaction():
-        plant = await conn.fetchrow(
-            "SELECT stage, growth_time_remaining FROM plant WHERE plant_id = $1 AND email = $2",
-            plant_id,
-            email,
+    targets = {move.plant_id: (move.x, move.y) for move in batch.plants}
+    plant_ids = list(targets)
+
+    overlap = first_overlap(list(targets.values()))
+    if overlap is not None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Plants {plant_ids[overlap[0]]} and {plant_ids[overlap[1]]} would overlap"
         )
 
-        if not plant:
-            raise HTTPException(status_code=404, detail="Plant not found")
+    result = await queries.move_plants(
+        conn,
+        email,
+        plant_ids,
+        [x for x, _ in targets.values()],
+        [y for _, y in targets.values()],
+        PLANT_SPACING,
+    )
 
-        stage = plant["stage"]
-        growth_time_remaining = plant.get("growth_time_remaining")
+    if result["blocked_by"] is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Plant {result['blocked_plant']} would overlap plant {result['blocked_by']}"
+        )
 
-        if stage != 0:
-            raise HTTPException(
-                status_code=400, detail="Can only water plants at stage 0"
-            )
+    moved_ids = set(result["plant_ids"])
+    moved = [
+        {"plant_id": plant_id, "x": targets[plant_id][0], "y": targets[plant_id][1]}
+        for plant_id in plant_ids
+        if plant_id in moved_ids
+    ]
+    if moved:
+        await read_cache.invalidate_garden(email)
+        garden_events.publish(email, plants=moved)
 
-        if growth_time_remaining is not None:
-            raise HTTPException(
-                status_code=400, detail="Plant is already growing and doesn't need water"
-            )
+    return {
+        "message": "Plants moved successfully",
+        "moved": moved,
+        "skipped": [plant_id for plant_id in plant_ids if plant_id not in moved_ids],
+    }
 
-        user = await conn.fetchrow('SELECT money FROM "user" WHERE email = $1', email)
 
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+@router.patch("/users/{email}/plants/{plant_id}/apply-water")
+async def apply_water(
+    email: str,
+    plant_id: int,
+    conn: asyncpg.Connection = Depends(get_db),
+    auth_email: str = Depends(verify_clerk_token),
+):
+    if email != auth_email:
+        raise HTTPException(
+            status_code=403, detail="Cannot modify another user's plants"
+        )
 
-        if user["money"] < WATER_COST:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient money. Need {WATER_COST}, have {user['money']}"
-            )
+    ready_at = ready_at_after(STAGE_0_GROWTH_TIME) if SERVER_GROWTH else None
+    result = await queries.apply_water(
+        conn, email, plant_id, WATER_COST, STAGE_0_GROWTH_TIME, ready_at
+    )
+
+    if result["stage"] is None:
+        raise HTTPException(status_code=404, detail="Plant not found")
 
-        await conn.execute(
-            'UPDATE "user" SET money = money - $1 WHERE email = $2',
-            WATER_COST,
-            email
+    if result["stage"] != 0:
+        raise HTTPException(
+            status_code=400, detail="Can only water plants at stage 0"
         )
 
-        await conn.execute(
-            "UPDATE plant SET growth_time_remaining = $1 WHERE plant_id = $2 AND email = $3",
-            STAGE_0_GROWTH_TIME,
-            plant_id,
-            email,
+    if result["growth_time_remaining"] is not None:
+        raise HTTPException(
+            status_code=400, detail="Plant is already growing and doesn't need water"
         )
 
-        new_money = await conn.fetchval('SELECT money FROM "user" WHERE email = $1', email)
+    if result["money"] is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        return {
-            "message": "Water applied, plant started growing",
-            "cost": WATER_COST,
-            "new_money": new_money,
-            "growth_time_remaining": STAGE_0_GROWTH_TIME
-        }
+    if result["new_money"] is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient money. Need {WATER_COST}, have {result['money']}"
+        )
+
+    new_money = result["new_money"]
+    leaderboard.record_balance(email, new_money)
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(
+        email,
+        plants=[
+            {
+                "plant_id": plant_id,
+                "growth_time_remaining": STAGE_0_GROWTH_TIME,
+                "ready_at": ready_at,
+            }
+        ],
+        user={"money": new_money},
+    )
+
+    return {
+        "message": "Water applied, plant started growing",
+        "cost": WATER_COST,
+        "new_money": new_money,
+        "growth_time_remaining": STAGE_0_GROWTH_TIME
+    }
 
 
 @router.patch("/users/{email}/plants/{plant_id}/apply-fertilizer")
@@ -251,90 +503,78 @@ async def apply_fertilizer(
             status_code=403, detail="Cannot modify another user's plants"
         )
 
-    async with conn.transaction():
-        plant = await conn.fetchrow(
-            "SELECT stage, fertilizer_remaining, rarity, growth_time_remaining FROM plant WHERE plant_id = $1 AND email = $2",
-            plant_id,
-            email,
-        )
-
-        if not plant:
-            raise HTTPException(status_code=404, detail="Plant not found")
-
-        stage = plant["stage"]
-        fertilizer_remaining = plant["fertilizer_remaining"]
-        growth_time_remaining = plant.get("growth_time_remaining")
-
-        if stage != 1:
-            raise HTTPException(
-                status_code=400, detail="Can only fertilize plants at stage 1"
-            )
-
-        if fertilizer_remaining is None or fertilizer_remaining == 0:
-            raise HTTPException(
-                status_code=400, detail="Plant doesn't need fertilizer"
-            )
-
-        if growth_time_remaining is not None:
-            raise HTTPException(
-                status_code=400, detail="Plant is already growing and doesn't need fertilizer"
-            )
-
-        user = await conn.fetchrow('SELECT money FROM "user" WHERE email = $1', email)
-
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+    now = utcnow()
+    result = await queries.apply_fertilizer(
+        conn,
+        email,
+        plant_id,
+        FERTILIZER_COST,
+        now,
+        FERTILIZER_BY_RARITY,
+        STAGE_1_GROWTH_BY_RARITY,
+        stage_1_ready_at_by_rarity(now),
+    )
 
-        if user["money"] < FERTILIZER_COST:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient money. Need {FERTILIZER_COST}, have {user['money']}"
-            )
+    if result["stage"] is None:
+        raise HTTPException(status_code=404, detail="Plant not found")
 
-        await conn.execute(
-            'UPDATE "user" SET money = money - $1 WHERE email = $2',
-            FERTILIZER_COST,
-            email
+    if result["stage"] != 1:
+        raise HTTPException(
+            status_code=400, detail="Can only fertilize plants at stage 1"
         )
 
-        new_fertilizer_remaining = fertilizer_remaining - 1
+    if result["fertilizer_remaining"] is None or result["fertilizer_remaining"] == 0:
+        raise HTTPException(
+            status_code=400, detail="Plant doesn't need fertilizer"
+        )
 
-        if new_fertilizer_remaining == 0:
-            growth_time = STAGE_1_GROWTH_TIMES[plant["rarity"]]
+    if result["growth_time_remaining"] is not None:
+        raise HTTPException(
+            status_code=400, detail="Plant is already growing and doesn't need fertilizer"
+        )
 
-            await conn.execute(
-                "UPDATE plant SET fertilizer_remaining = NULL, growth_time_remaining = $1 WHERE plant_id = $2 AND email = $3",
-                growth_time,
-                plant_id,
-                email
-            )
+    if result["money"] is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-            new_money = await conn.fetchval('SELECT money FROM "user" WHERE email = $1', email)
+    if result["new_money"] is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient money. Need {FERTILIZER_COST}, have {result['money']}"
+        )
 
-            return {
-                "message": "Fertilizer applied, plant started growing",
-                "cost": FERTILIZER_COST,
-                "new_money": new_money,
-                "fertilizer_remaining": None,
-                "growth_time_remaining": growth_time
+    new_money = result["new_money"]
+    leaderboard.record_balance(email, new_money)
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(
+        email,
+        plants=[
+            {
+                "plant_id": plant_id,
+                "stage": result["stage"],
+                "fertilizer_remaining": result["new_fertilizer_remaining"],
+                "growth_time_remaining": result["new_growth_time_remaining"],
+                "ready_at": result["new_ready_at"],
             }
-        else:
-            await conn.execute(
-                "UPDATE plant SET fertilizer_remaining = $1 WHERE plant_id = $2 AND email = $3",
-                new_fertilizer_remaining,
-                plant_id,
-                email
-            )
+        ],
+        user={"money": new_money},
+    )
 
-            new_money = await conn.fetchval('SELECT money FROM "user" WHERE email = $1', email)
+    if result["new_fertilizer_remaining"] is None:
+        return {
+            "message": "Fertilizer applied, plant started growing",
+            "cost": FERTILIZER_COST,
+            "new_money": new_money,
+            "fertilizer_remaining": None,
+            "growth_time_remaining": result["new_growth_time_remaining"]
+        }
 
-            return {
-                "message": "Fertilizer applied",
-                "cost": FERTILIZER_COST,
-                "new_money": new_money,
-                "fertilizer_remaining": new_fertilizer_remaining,
-                "growth_time_remaining": None
-            }
+    return {
+        "message": "Fertilizer applied",
+        "cost": FERTILIZER_COST,
+        "new_money": new_money,
+        "fertilizer_remaining": result["new_fertilizer_remaining"],
+        "growth_time_remaining": None
+    }
 
 
 @router.patch("/users/{email}/plants/{plant_id}/grow")
@@ -350,72 +590,93 @@ async def grow_plant_by_time(
             status_code=403, detail="Cannot modify another user's plants"
         )
 
-    async with conn.transaction():
-        plant = await conn.fetchrow(
-            "SELECT growth_time_remaining, stage, rarity FROM plant WHERE plant_id = $1 AND email = $2",
-            plant_id,
-            email,
-        )
-
-        if not plant:
-            raise HTTPException(status_code=404, detail="Plant not found")
-
-        if plant["growth_time_remaining"] is None:
-            raise HTTPException(
-                status_code=400, detail="Plant is not currently growing"
-            )
-
-        new_time = max(0, plant["growth_time_remaining"] - update.time)
-
-        if new_time == 0:
-            current_stage = plant["stage"]
-
-            if current_stage >= 2:
-                raise HTTPException(
-                    status_code=400, detail="Plant is already at maximum stage"
-                )
-
-            new_stage = current_stage + 1
-
-            if new_stage == 1:
-                rarity = plant.get("rarity", 0)
-                fertilizer_map = {0: 1, 1: 2, 2: 5}
-                fertilizer_init = fertilizer_map.get(rarity, 1)
-
-                await conn.execute(
-                    "UPDATE plant SET stage = $1, growth_time_remaining = NULL, fertilizer_remaining = $2 WHERE plant_id = $3 AND email = $4",
-                    new_stage,
-                    fertilizer_init,
-                    plant_id,
-                    email,
-                )
-            else:
-                await conn.execute(
-                    "UPDATE plant SET stage = $1, growth_time_remaining = NULL, fertilizer_remaining = NULL WHERE plant_id = $2 AND email = $3",
-                    new_stage,
-                    plant_id,
-                    email,
-                )
+    grown = await queries.grow_plants(
+        conn, email, update.time, [plant_id], FERTILIZER_BY_RARITY, utcnow()
+    )
 
+    if grown:
+        plant = grown[0]
+        await read_cache.invalidate_garden(email)
+        garden_events.publish(email, plants=[grown_delta(plant)])
+        if plant["stage_advanced"]:
             return {
                 "message": "Plant growth completed and advanced to next stage",
                 "growth_time_remaining": None,
-                "new_stage": new_stage,
+                "new_stage": plant["stage"],
                 "stage_advanced": True,
             }
-        else:
-            await conn.execute(
-                "UPDATE plant SET growth_time_remaining = $1 WHERE plant_id = $2 AND email = $3",
-                new_time,
-                plant_id,
-                email,
-            )
 
-            return {
-                "message": "Plant growth updated",
-                "growth_time_remaining": new_time,
-                "stage_advanced": False
-            }
+        return {
+            "message": "Plant growth updated",
+            "growth_time_remaining": plant["growth_time_remaining"],
+            "stage_advanced": False
+        }
+
+    # Nothing was grown; work out why.
+    plant = await conn.fetchrow(
+        "SELECT growth_time_remaining, stage, rarity, fertilizer_remaining, ready_at FROM plant WHERE plant_id = $1 AND email = $2",
+        plant_id,
+        email,
+    )
+
+    if not plant:
+        raise HTTPException(status_code=404, detail="Plant not found")
+
+    if plant["growth_time_remaining"] is None:
+        raise HTTPException(
+            status_code=400, detail="Plant is not currently growing"
+        )
+
+    if plant["stage"] >= 2:
+        raise HTTPException(
+            status_code=400, detail="Plant is already at maximum stage"
+        )
+
+    # A wall-clock timer that hasn't elapsed yet; client ticks don't apply.
+    return {
+        "message": "Plant growth updated",
+        "growth_time_remaining": effective_plant(dict(plant))["growth_time_remaining"],
+        "stage_advanced": False
+    }
+
+
+@router.post("/users/{email}/plants/grow")
+async def grow_plants(
+    email: str,
+    update: BulkGrowthUpdate,
+    conn: asyncpg.Connection = Depends(get_db),
+    auth_email: str = Depends(verify_clerk_token),
+):
+    """Grow every growing plant (or only `plant_ids`) in a single statement.
+
+    Applies the same rules as `grow_plant_by_time`: a plant whose timer hits
+    zero advances one stage, and reaching stage 1 sets the fertilizer count
+    for its rarity. Plants on wall-clock timers (`ready_at`) ignore the
+    client's time and are only caught up if their timer has elapsed.
+    """
+    if email != auth_email:
+        raise HTTPException(
+            status_code=403, detail="Cannot modify another user's plants"
+        )
+
+    rows = await queries.grow_plants(
+        conn, email, update.time, update.plant_ids, FERTILIZER_BY_RARITY, utcnow()
+    )
+
+    results = [dict(r) for r in rows]
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(email, plants=[grown_delta(r) for r in results])
+    skipped = []
+    if update.plant_ids is not None:
+        grown_ids = {r["plant_id"] for r in results}
+        skipped = [pid for pid in dict.fromkeys(update.plant_ids) if pid not in grown_ids]
+
+    return {
+        "message": "Plant growth updated",
+        "plants": results,
+        "stages_advanced": sum(1 for r in results if r["stage_advanced"]),
+        "skipped": skipped,
+    }
 
 
 @router.delete("/users/{email}/plants/{plant_id}/sell")
@@ -430,45 +691,68 @@ async def sell_plant(
             status_code=403, detail="Cannot modify another user's plants"
         )
 
-    async with conn.transaction():
-        plant = await conn.fetchrow(
-            "SELECT stage, rarity FROM plant WHERE plant_id = $1 AND email = $2",
-            plant_id,
-            email,
-        )
+    result = await queries.sell_plant(
+        conn, email, plant_id, utcnow(), STAGE_1_SELL_BY_RARITY, STAGE_2_SELL_BY_RARITY
+    )
 
-        if not plant:
-            raise HTTPException(status_code=404, detail="Plant not found")
+    if not result:
+        raise HTTPException(status_code=404, detail="Plant not found")
 
-        stage = plant["stage"]
-        rarity = plant["rarity"]
+    money_earned = result["money_earned"]
+    new_balance = result["new_balance"]
 
-        if stage == 0:
-            money_earned = 0
-        elif stage == 1:
-            money_earned = STAGE_1_SELL_VALUES[rarity]
-        else:
-            money_earned = STAGE_2_SELL_VALUES[rarity]
+    leaderboard.record_balance(email, new_balance)
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(email, removed=[plant_id], user={"money": new_balance})
 
-        await conn.execute(
-            "DELETE FROM plant WHERE plant_id = $1 AND email = $2",
-            plant_id,
-            email,
-        )
+    return {
+        "message": "Plant sold successfully",
+        "money_earned": money_earned,
+        "new_balance": new_balance,
+    }
 
-        if money_earned > 0:
-            await conn.execute(
-                'UPDATE "user" SET money = money + $1 WHERE email = $2',
-                money_earned,
-                email,
-            )
 
-        new_balance = await conn.fetchval(
-            'SELECT money FROM "user" WHERE email = $1', email
+@router.post("/users/{email}/plants/sell-batch")
+async def sell_plants(
+    email: str,
+    batch: PlantBatchSell,
+    conn: asyncpg.Connection = Depends(get_db),
+    auth_email: str = Depends(verify_clerk_token),
+):
+    """Sell several plants in one statement. IDs that don't name one of the
+    user's plants are reported in `skipped`."""
+    if email != auth_email:
+        raise HTTPException(
+            status_code=403, detail="Cannot modify another user's plants"
         )
 
+    result = await queries.sell_plants(
+        conn,
+        email,
+        batch.plant_ids,
+        utcnow(),
+        STAGE_1_SELL_BY_RARITY,
+        STAGE_2_SELL_BY_RARITY,
+    )
+
+    if not result:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    new_balance = result["new_balance"]
+    leaderboard.record_balance(email, new_balance)
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(email, removed=result["plant_ids"], user={"money": new_balance})
+
+    sold = [
+        {"plant_id": plant_id, "money_earned": money_earned}
+        for plant_id, money_earned in zip(result["plant_ids"], result["money_earned"])
+    ]
+    sold_ids = set(result["plant_ids"])
+
     return {
-        "message": "Plant sold successfully",
-        "money_earned": money_earned,
+        "message": "Plants sold successfully",
+        "sold": sold,
+        "money_earned": sum(plant["money_earned"] for plant in sold),
         "new_balance": new_balance,
+        "skipped": [pid for pid in dict.fromkeys(batch.plant_ids) if pid not in sold_ids],
     }
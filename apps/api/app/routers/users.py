@@ -1,19 +1,56 @@
-from fastapi import APIRouter, HTTPException, Depends
+import random
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
 import asyncpg
 
+from app.db import database, queries
 from app.db.database import get_db
+from app.core.cache import read_cache, user_key, username_key
 from app.core.security import verify_clerk_token
+from app.core.encoding import json_response
+from app.core.events import garden_events
+from app.core.idempotency import IdempotentRoute
+from app.core.leaderboard import leaderboard, encode_cursor, decode_cursor
+from app.core.search import username_index, base_username
 from app.core.config import (
     INITIAL_USER_MONEY,
     INITIAL_PLANT_LIMIT,
     INITIAL_WEATHER,
+    USERNAME_TAGS,
+    USERNAME_TAG_ATTEMPTS,
     PLANT_LIMIT_BASE_COST,
     PLANT_LIMIT_COST_MULTIPLIER,
     PLANT_LIMIT_INCREASE,
+    LEADERBOARD_PAGE_SIZE,
+    LEADERBOARD_MAX_PAGE_SIZE,
+    LEDGER_PAGE_SIZE,
+    LEDGER_MAX_PAGE_SIZE,
+    SEARCH_PAGE_SIZE,
+    SEARCH_MAX_PAGE_SIZE,
+    SEARCH_MAX_OFFSET,
+    SEARCH_FUZZY_MAX_LENGTH,
+    SEARCH_FUZZY_MIN_LENGTH,
+    SESSION_REWARD_BASE,
+    INCOME_BONUS,
+    SUNNY_WEATHER,
+    SUNNY_REWARD_MULTIPLIER,
 )
 from app.models.schemas import UserCreate, UsernameUpdate, MoneyChange
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=IdempotentRoute)
+
+# Income bonuses indexed by rarity + 1 inside SQL.
+STAGE_1_INCOME_BY_RARITY = [INCOME_BONUS[1][r] for r in sorted(INCOME_BONUS[1])]
+STAGE_2_INCOME_BY_RARITY = [INCOME_BONUS[2][r] for r in sorted(INCOME_BONUS[2])]
+
+
+def plant_limit_upgrade_cost(num_upgrades):
+    return round(int(PLANT_LIMIT_BASE_COST * (PLANT_LIMIT_COST_MULTIPLIER ** num_upgrades)), -2)
+
+
+# Upgrade cost by number of upgrades already bought, looked up inside SQL.
+PLANT_LIMIT_UPGRADE_COSTS = [plant_limit_upgrade_cost(n) for n in range(200)]
 
 
 @router.post("/", status_code=201)
@@ -31,64 +68,195 @@ async def create_user(
     if existing:
         raise HTTPException(status_code=400, detail="User with this email already exists")
 
-    base_username = user.email.split('@')[0]
-
-    for i in range(10000):
-        candidate = f"{base_username}#{i:04d}"
-        try:
-            await conn.execute(
-                'INSERT INTO "user" (username, email, money, plant_limit, weather) VALUES ($1, $2, $3, $4, $5)',
-                candidate,
-                user.email,
-                INITIAL_USER_MONEY,
-                INITIAL_PLANT_LIMIT,
-                INITIAL_WEATHER,
-            )
+    base = user.email.split('@')[0]
+    initial = (user.email, INITIAL_USER_MONEY, INITIAL_PLANT_LIMIT, INITIAL_WEATHER, USERNAME_TAGS)
+
+    created = None
+    for _ in range(USERNAME_TAG_ATTEMPTS):
+        row = await queries.create_user(conn, base, *initial)
+        if row["username"] is not None:
+            created = row
+            break
+        if row["tag"] >= USERNAME_TAGS:
+            break
+        # The claimed tag was taken by a rename, or a concurrent request
+        # created this user first.
+        if await conn.fetchval('SELECT 1 FROM "user" WHERE email = $1', user.email):
+            raise HTTPException(status_code=400, detail="User with this email already exists")
+
+    if created is None:
+        created = await queries.create_user_free_tag(
+            conn, base, *initial, random.randrange(USERNAME_TAGS)
+        )
+    if created is None:
+        if await conn.fetchval('SELECT 1 FROM "user" WHERE email = $1', user.email):
+            raise HTTPException(status_code=400, detail="User with this email already exists")
+        raise HTTPException(
+            status_code=409, detail=f"All {USERNAME_TAGS} tags for username {base} are taken"
+        )
 
-            return {
-                "message": "User created successfully",
-                "email": user.email,
-                "username": candidate,
-                "money": INITIAL_USER_MONEY,
-                "plant_limit": INITIAL_PLANT_LIMIT,
-                "weather": INITIAL_WEATHER,
-            }
-        except asyncpg.UniqueViolationError:
-            continue
+    username = created["username"]
+    leaderboard.record_balance(user.email, INITIAL_USER_MONEY, username)
+    username_index.add(user.email, username)
 
-    raise HTTPException(status_code=500, detail="Unable to generate a unique username")
+    return {
+        "message": "User created successfully",
+        "email": user.email,
+        "username": username,
+        "money": INITIAL_USER_MONEY,
+        "plant_limit": INITIAL_PLANT_LIMIT,
+        "weather": INITIAL_WEATHER,
+    }
 
 
 @router.get("")
 async def get_users(
+    limit: int = Query(LEADERBOARD_PAGE_SIZE, ge=1, le=LEADERBOARD_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    rank_for: Optional[str] = None,
     conn: asyncpg.Connection = Depends(get_db),
 ):
-    users = await conn.fetch('SELECT * FROM "user" ORDER BY money DESC')
-    return {"users": [dict(u) for u in users]}
+    """Leaderboard page, ordered by money then email (both descending).
+
+    Pass the returned `next_cursor` back as `cursor` for the next page, and
+    `rank_for=<email>` to include that user's rank. Served from the
+    in-process leaderboard once it has loaded, otherwise from the
+    `(money, email)` index.
+    """
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if leaderboard.ready:
+        if after is None:
+            users = leaderboard.top(limit)
+        else:
+            users = leaderboard.page_after(*after, limit)
+    elif after is None:
+        rows = await conn.fetch(
+            'SELECT username, email, money FROM "user" ORDER BY money DESC, email DESC LIMIT $1',
+            limit,
+        )
+        users = [dict(u) for u in rows]
+    else:
+        rows = await conn.fetch(
+            """SELECT username, email, money FROM "user"
+               WHERE (money, email) < ($1, $2)
+               ORDER BY money DESC, email DESC LIMIT $3""",
+            *after,
+            limit,
+        )
+        users = [dict(u) for u in rows]
 
+    response = {
+        "users": users,
+        "next_cursor": encode_cursor(users[-1]) if len(users) == limit else None,
+    }
 
-@router.get("/{email}")
-async def get_user(
-    email: str,
+    if rank_for is not None:
+        if leaderboard.ready:
+            response["my_rank"] = leaderboard.rank(rank_for)
+        else:
+            my_rank = await conn.fetchrow(
+                """SELECT u.username, u.email, u.money,
+                          (SELECT COUNT(*) FROM "user" o
+                           WHERE (o.money, o.email) > (u.money, u.email)) + 1 AS rank
+                   FROM "user" u WHERE u.email = $1""",
+                rank_for,
+            )
+            response["my_rank"] = dict(my_rank) if my_rank else None
+
+    return response
+
+
+@router.get("/search")
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET),
     conn: asyncpg.Connection = Depends(get_db),
 ):
-    user = await conn.fetchrow('SELECT * FROM "user" WHERE email = $1', email)
+    """Users whose username (ignoring the `#tag`) starts with `q`, then
+    users one typo away from that.
+
+    Each result has `match` set to `prefix` or `fuzzy`. Pass `next_offset`
+    back as `offset` for the next page. Served from the in-process index
+    once it has loaded; until then only prefix matches, from the
+    `lower(username)` index.
+    """
+    if username_index.ready:
+        users, more = username_index.search(
+            q, limit, offset, SEARCH_FUZZY_MIN_LENGTH, SEARCH_FUZZY_MAX_LENGTH
+        )
+    else:
+        prefix = base_username(q)
+        if not prefix:
+            users, more = [], False
+        else:
+            pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            rows = await conn.fetch(
+                """SELECT username, email, 'prefix' AS match FROM "user"
+                   WHERE lower(username) COLLATE "C" LIKE $1
+                   ORDER BY lower(username) COLLATE "C", email
+                   LIMIT $2 OFFSET $3""",
+                pattern,
+                limit + 1,
+                offset,
+            )
+            users = [dict(u) for u in rows[:limit]]
+            more = len(rows) > limit
+
+    return {
+        "users": users,
+        "next_offset": offset + limit if more and offset + limit <= SEARCH_MAX_OFFSET else None,
+    }
+
+
+async def load_user(email):
+    async with database.acquire() as conn:
+        user = await conn.fetchrow('SELECT * FROM "user" WHERE email = $1', email)
+    return dict(user) if user else None
+
+
+async def load_email_for_username(username):
+    async with database.acquire() as conn:
+        return await conn.fetchval('SELECT email FROM "user" WHERE username = $1', username)
+
+
+@router.get("/{email}")
+async def get_user(email: str):
+    user = await read_cache.get_or_load(user_key(email), lambda: load_user(email))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return dict(user)
+    return json_response(user)
 
 
 @router.get("/by-username/{username}/{tag}")
 async def get_user_from_username(
     username: str,
     tag: str,
-    conn: asyncpg.Connection = Depends(get_db),
 ):
     full_username = f"{username}#{tag}"
-    user = await conn.fetchrow('SELECT * FROM "user" WHERE username = $1', full_username)
-    if not user:
+    key = username_key(full_username)
+
+    async def lookup():
+        email = await read_cache.get_or_load(key, lambda: load_email_for_username(full_username))
+        if not email:
+            return None
+        return await read_cache.get_or_load(user_key(email), lambda: load_user(email))
+
+    user = await lookup()
+    if user is not None and user["username"] != full_username:
+        # The cached name -> email entry is stale: the user has been renamed
+        # since, and renames only invalidate that user's own keys.
+        await read_cache.invalidate(key)
+        user = await lookup()
+    if user is None or user["username"] != full_username:
         raise HTTPException(status_code=404, detail="User not found")
-    return dict(user)
+    return json_response(user)
 
 
 @router.patch("/{email}/username")
@@ -103,13 +271,16 @@ async def update_username(
             status_code=403, detail="Cannot update another user's username"
         )
 
-    result = await conn.execute(
-        'UPDATE "user" SET username = $1 WHERE email = $2', update.new_username, email
-    )
+    updated = await queries.update_username(conn, email, update.new_username)
 
-    if result == "UPDATE 0":
+    if updated is None:
         raise HTTPException(status_code=404, detail="User not found")
 
+    leaderboard.rename(email, update.new_username)
+    username_index.add(email, update.new_username)
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(email, user={"username": update.new_username})
+
     return {
         "message": "Username updated successfully",
         "new_username": update.new_username,
@@ -127,12 +298,15 @@ async def delete_user(
             status_code=403, detail="Cannot delete another user's account"
         )
 
-    async with conn.transaction():
-        await conn.execute("DELETE FROM plant WHERE email = $1", email)
-        result = await conn.execute('DELETE FROM "user" WHERE email = $1', email)
+    deleted = await queries.delete_user(conn, email)
+
+    if not deleted:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        if result == "DELETE 0":
-            raise HTTPException(status_code=404, detail="User not found")
+    leaderboard.remove(email)
+    username_index.remove(email)
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(email, deleted=True)
 
     return {"message": "User deleted successfully"}
 
@@ -149,19 +323,67 @@ async def change_money(
             status_code=403, detail="Cannot modify another user's money"
         )
 
-    result = await conn.execute(
-        'UPDATE "user" SET money = money + $1 WHERE email = $2', update.amount, email
+    result = await queries.change_money(
+        conn, email, update.amount, SESSION_REWARD_BASE,
+        STAGE_1_INCOME_BY_RARITY, STAGE_2_INCOME_BY_RARITY, SUNNY_WEATHER, SUNNY_REWARD_MULTIPLIER,
     )
 
-    if result == "UPDATE 0":
+    if result is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    new_balance = await conn.fetchval(
-        'SELECT money FROM "user" WHERE email = $1', email
-    )
+    if result["money"] is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A session awards this garden at most {result['max_amount']:g} coins",
+        )
+
+    new_balance = result["money"]
+    leaderboard.record_balance(email, new_balance)
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(email, user={"money": new_balance})
     return {"message": "Money updated successfully", "new_balance": new_balance}
 
 
+@router.get("/{email}/ledger")
+async def get_ledger(
+    email: str,
+    limit: int = Query(LEDGER_PAGE_SIZE, ge=1, le=LEDGER_MAX_PAGE_SIZE),
+    before: Optional[int] = None,
+    conn: asyncpg.Connection = Depends(get_db),
+    auth_email: str = Depends(verify_clerk_token),
+):
+    """The user's money ledger, newest first, and the running total it was
+    last compacted to. Pass `next_before` back as `before` for older
+    entries."""
+    if email != auth_email:
+        raise HTTPException(
+            status_code=403, detail="Cannot view another user's ledger"
+        )
+
+    rows = await conn.fetch(
+        """SELECT amount, balance, garden_version, reason, plant_ids, recorded_at
+           FROM money_ledger
+           WHERE email = $1 AND garden_version < $2
+           ORDER BY garden_version DESC
+           LIMIT $3""",
+        email,
+        before if before is not None else 2 ** 63 - 1,
+        limit,
+    )
+    compacted = await conn.fetchrow(
+        """SELECT balance, garden_version, entries, drift, compacted_at
+           FROM money_balance WHERE email = $1""",
+        email,
+    )
+    entries = [dict(row) for row in rows]
+
+    return json_response({
+        "entries": entries,
+        "next_before": entries[-1]["garden_version"] if len(entries) == limit else None,
+        "compacted": dict(compacted) if compacted else None,
+    })
+
+
 @router.post("/{email}/increase-plant-limit")
 async def increase_plant_limit(
     email: str,
@@ -173,32 +395,31 @@ async def increase_plant_limit(
             status_code=403, detail="Cannot modify another user's plant limit"
         )
 
-    async with conn.transaction():
-        user = await conn.fetchrow('SELECT money, plant_limit FROM "user" WHERE email = $1', email)
-
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+    result = await queries.increase_plant_limit(
+        conn, email, PLANT_LIMIT_UPGRADE_COSTS, INITIAL_PLANT_LIMIT, PLANT_LIMIT_INCREASE
+    )
 
-        num_upgrades = (user["plant_limit"] - INITIAL_PLANT_LIMIT) // PLANT_LIMIT_INCREASE
-        cost = round(int(PLANT_LIMIT_BASE_COST * (PLANT_LIMIT_COST_MULTIPLIER ** num_upgrades)), -2)
+    if not result:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        if user["money"] < cost:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient money to increase plant limit. Need {cost}, have {user['money']}"
-            )
+    cost = result["cost"]
+    if cost is None:
+        raise HTTPException(status_code=400, detail="Plant limit is already at its maximum")
 
-        await conn.execute(
-            'UPDATE "user" SET money = money - $1, plant_limit = plant_limit + $2 WHERE email = $3',
-            cost,
-            PLANT_LIMIT_INCREASE,
-            email
+    if result["new_money"] is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient money to increase plant limit. Need {cost}, have {result['money']}"
         )
 
-        new_money = await conn.fetchval('SELECT money FROM "user" WHERE email = $1', email)
-        new_plant_limit = await conn.fetchval('SELECT plant_limit FROM "user" WHERE email = $1', email)
+    new_money = result["new_money"]
+    new_plant_limit = result["new_plant_limit"]
+    num_upgrades = (new_plant_limit - INITIAL_PLANT_LIMIT) // PLANT_LIMIT_INCREASE
+    next_cost = plant_limit_upgrade_cost(num_upgrades)
 
-        next_cost = round(int(PLANT_LIMIT_BASE_COST * (PLANT_LIMIT_COST_MULTIPLIER ** (num_upgrades + 1))), -2)
+    leaderboard.record_balance(email, new_money)
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(email, user={"money": new_money, "plant_limit": new_plant_limit})
 
     return {
         "message": "Plant limit increased successfully",
@@ -220,19 +441,14 @@ async def cycle_weather(
             status_code=403, detail="Cannot modify another user's weather"
         )
 
-    user = await conn.fetchrow('SELECT weather FROM "user" WHERE email = $1', email)
+    new_weather = await queries.cycle_weather(conn, email)
 
-    if not user:
+    if new_weather is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    current_weather = user["weather"]
-    new_weather = (current_weather + 1) % 3
-
-    await conn.execute(
-        'UPDATE "user" SET weather = $1 WHERE email = $2',
-        new_weather,
-        email
-    )
+    current_weather = (new_weather + 2) % 3
+    await read_cache.invalidate_garden(email)
+    garden_events.publish(email, user={"weather": new_weather})
 
     return {
         "message": "Weather cycled successfully",
@@ -0,0 +1,151 @@
+"""Production entry point: `python -m app.server`.
+
+Runs uvicorn with WEB_CONCURRENCY workers (by default one per CPU the
+cgroup quota allows, once idempotency is shared), uvloop and httptools
+when installed, and the keep-alive, recycling and shutdown settings from
+app.core.config. A worker accepts connections only once its
+lifespan has opened the pool, fetched the JWKS and loaded the leaderboard;
+`GET /health/ready` reports whether the pool and keys are still usable.
+
+Only this module and the config are imported here; workers import the
+app themselves, so the supervisor stays small.
+"""
+import importlib.util
+import math
+import os
+import sys
+from pathlib import Path
+
+import uvicorn
+
+from app.core.config import (
+    FORWARDED_ALLOW_IPS,
+    GARDEN_EVENTS_NOTIFY,
+    GRACEFUL_SHUTDOWN_TIMEOUT,
+    HOST,
+    IDEMPOTENCY_BACKEND,
+    IDEMPOTENCY_TTL,
+    KEEP_ALIVE_TIMEOUT,
+    PORT,
+    READ_CACHE_BACKEND,
+    READ_CACHE_TTL,
+    WEB_CONCURRENCY,
+    WORKER_MAX_REQUESTS,
+    WORKER_MAX_REQUESTS_JITTER,
+)
+
+CGROUP = Path("/sys/fs/cgroup")
+
+
+def cgroup_cpu_quota(root=CGROUP):
+    """CPUs the cgroup's CFS quota allows (v2 `cpu.max`, else v1), or None
+    when there is no quota or it can't be read."""
+    try:
+        quota, period = (root / "cpu.max").read_text().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int((root / "cpu" / "cpu.cfs_quota_us").read_text())
+        period = int((root / "cpu" / "cpu.cfs_period_us").read_text())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def cpu_limit(root=CGROUP):
+    """CPUs this process can use: the ones it may run on (honouring
+    affinity, unlike os.cpu_count()), capped by the cgroup quota rounded up."""
+    cpus = os.process_cpu_count() or 1
+    quota = cgroup_cpu_quota(root)
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def worker_count(setting, root=CGROUP):
+    """`setting`, or for 0 one worker per CPU, falling back to 1 when this
+    configuration can't run more (`check_workers`)."""
+    if setting:
+        return setting
+    workers = cpu_limit(root)
+    if workers > 1 and check_workers(workers):
+        return 1
+    return workers
+
+
+def check_workers(workers):
+    """Why `workers` can't run with this configuration, or None."""
+    if workers < 1:
+        return f"WEB_CONCURRENCY must be 0 (one worker per CPU) or more, got {workers}"
+    # A retry landing on another worker wouldn't find the stored response
+    # and would run the purchase or sale again.
+    if workers > 1 and IDEMPOTENCY_TTL > 0 and IDEMPOTENCY_BACKEND == "local":
+        return (
+            "WEB_CONCURRENCY > 1 needs a shared idempotency store: "
+            "set IDEMPOTENCY_BACKEND=redis (or IDEMPOTENCY_TTL=0)"
+        )
+    return None
+
+
+def worker_warnings(workers):
+    """State kept per worker that behaves differently with `workers` of them."""
+    if workers <= 1:
+        return []
+    warnings = [
+        # Postgres still serializes them on the user's row lock, but each
+        # waits there holding a pool connection.
+        (
+            "per-user write queues are per worker: same-user writes on different "
+            "workers aren't queued against each other, and USER_WRITE_QUEUE_LIMIT "
+            "counts per worker"
+        ),
+        (
+            "the leaderboard and username search are per worker: writes served by "
+            "another worker show up after its next reconcile "
+            "(LEADERBOARD_RECONCILE_INTERVAL)"
+        ),
+    ]
+    if not GARDEN_EVENTS_NOTIFY:
+        warnings.append(
+            "GARDEN_EVENTS_NOTIFY is off: garden streams miss writes served by other workers"
+        )
+        if READ_CACHE_BACKEND == "local" and READ_CACHE_TTL > 0:
+            warnings.append(
+                "GARDEN_EVENTS_NOTIFY is off: the local read cache can serve another "
+                "worker's stale data for up to READ_CACHE_TTL"
+            )
+    return warnings
+
+
+def installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    workers = worker_count(WEB_CONCURRENCY)
+    problem = check_workers(workers)
+    if problem:
+        sys.exit(problem)
+    if WEB_CONCURRENCY == 0 and workers < cpu_limit():
+        print(f"Starting 1 worker, not {cpu_limit()}:", check_workers(cpu_limit()))
+    for warning in worker_warnings(workers):
+        print("Warning:", warning)
+    uvicorn.run(
+        "app.main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop="uvloop" if installed("uvloop") else "asyncio",
+        http="httptools" if installed("httptools") else "h11",
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        limit_max_requests=WORKER_MAX_REQUESTS or None,
+        limit_max_requests_jitter=WORKER_MAX_REQUESTS_JITTER,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+    )
+
+
+if __name__ == "__main__":
+    main()
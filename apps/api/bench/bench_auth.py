@@ -0,0 +1,77 @@
+"""Per-request cost of `verify_clerk_token` against a local JWKS stand-in.
+
+Run from apps/api:  python -m bench.bench_auth [iterations]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from bench.jwks_server import JWKSServer
+
+
+def summarize(label, samples):
+    samples = sorted(samples)
+
+    def p(q):
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    print(
+        f"{label:<34} mean {statistics.fmean(samples) * 1e6:9.1f}us"
+        f"  p50 {p(0.50) * 1e6:9.1f}us  p99 {p(0.99) * 1e6:9.1f}us"
+    )
+
+
+async def main(iterations):
+    server = JWKSServer().start()
+    os.environ["CLERK_JWKS_URL"] = server.url
+
+    import jwt
+    from app.core import security
+
+    token = server.mint_token("bench@example.com")
+    header = f"Bearer {token}"
+
+    # Previous implementation: PyJWKClient lookup + full RS256 decode per request.
+    client = jwt.PyJWKClient(server.url)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        key = client.get_signing_key_from_jwt(token)
+        jwt.decode(token, key.key, algorithms=["RS256"], options={"verify_exp": True})
+        samples.append(time.perf_counter() - start)
+    summarize("PyJWKClient + decode (before)", samples)
+
+    await security.jwks_cache.start()
+
+    samples = []
+    for _ in range(iterations):
+        security.token_cache.clear()
+        start = time.perf_counter()
+        await security.verify_clerk_token(header)
+        samples.append(time.perf_counter() - start)
+    summarize("verify, token cache miss", samples)
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await security.verify_clerk_token(header)
+        samples.append(time.perf_counter() - start)
+    summarize("verify, token cache hit", samples)
+
+    server.rotate_key()
+    security.jwks_cache.min_refresh_interval = 0
+    rotated = f"Bearer {server.mint_token('bench@example.com')}"
+    start = time.perf_counter()
+    await security.verify_clerk_token(rotated)
+    summarize("verify, unknown kid (refetch)", [time.perf_counter() - start])
+
+    await security.jwks_cache.stop()
+    server.stop()
+    print("token cache:", security.token_cache.stats())
+    print("JWKS fetches:", security.jwks_cache.fetches, "/ server requests:", server.requests)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
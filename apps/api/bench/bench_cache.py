@@ -0,0 +1,103 @@
+"""Read cache under a crowd of visitors to one popular garden.
+
+Run from apps/api against a scratch database (it creates and deletes a
+bench user):
+
+    DATABASE_URL=postgresql://... python -m bench.bench_cache [visitors] [rounds] [out.json]
+
+For each backend (cache off, in-process, Redis protocol via the local
+stand-in in bench/resp_server.py) it runs `rounds` rounds of two waves of
+`visitors` concurrent GET /users/{email}/garden and GET /users/{email}
+requests followed by a write, and reports latency, statements sent to
+Postgres and the cache counters. The first wave of a round starts on cold
+keys, so `loads` vs `misses` shows how many misses were collapsed into one
+query; the second is served from the cache.
+"""
+import asyncio
+import os
+import sys
+import time
+
+import asyncpg
+
+from bench.common import app_client, summarize, write_results
+from bench.resp_server import RESPServer
+
+EMAIL = "bench-cache@example.com"
+PLANTS = 200
+
+
+async def main(visitors, rounds, out_path):
+    db = await asyncpg.connect(os.environ["DATABASE_URL"])
+    await db.execute("DELETE FROM plant WHERE email = $1", EMAIL)
+    await db.execute('DELETE FROM "user" WHERE email = $1', EMAIL)
+    resp_server = RESPServer().start()
+
+    results = {}
+
+    async with app_client() as (client, jwks, counter):
+        from app.core.cache import LocalBackend, RedisBackend, read_cache
+
+        headers = {"Authorization": f"Bearer {jwks.mint_token(EMAIL)}"}
+        base = f"/users/{EMAIL}"
+        response = await client.post("/users/", json={"email": EMAIL}, headers=headers)
+        response.raise_for_status()
+        await db.execute(
+            """INSERT INTO plant (plant_type, plant_species, size, rarity, x, y, stage, email)
+               SELECT 'rose', 'red_rose', 0.5, 0, g, g, 0, $2 FROM generate_series(1, $1) AS g""",
+            PLANTS,
+            EMAIL,
+        )
+
+        backends = {
+            "off": (LocalBackend(0), 0),
+            "local": (LocalBackend(10000), 30),
+            "redis": (RedisBackend(resp_server.url, 8, 0.5), 30),
+        }
+        for name, (backend, ttl) in backends.items():
+            read_cache.__init__(backend, ttl)
+            counter.count = 0
+            latencies = []
+
+            async def visit(url, latencies=latencies):
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url}: {response.status_code} {response.text}")
+
+            started = time.perf_counter()
+            for _ in range(rounds):
+                # The first wave finds cold keys, the second warm ones.
+                for _ in range(2):
+                    await asyncio.gather(*(
+                        visit(f"{base}/garden" if i % 2 else base) for i in range(visitors)
+                    ))
+                response = await client.patch(f"{base}/money", json={"amount": 1}, headers=headers)
+                response.raise_for_status()
+            elapsed = time.perf_counter() - started
+            # Query loggers run via call_soon.
+            await asyncio.sleep(0)
+
+            reads = 2 * visitors * rounds
+            results[name] = {
+                **summarize(latencies),
+                "reads_per_s": round(reads / elapsed),
+                "statements_per_read": round((counter.count - rounds) / reads, 3),
+                "cache": read_cache.stats(),
+            }
+            await read_cache.close()
+
+        await client.delete(base, headers=headers)
+
+    resp_server.stop()
+    await db.close()
+    write_results(results, out_path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+        sys.argv[3] if len(sys.argv) > 3 else None,
+    ))
@@ -0,0 +1,158 @@
+"""Concurrent writes on one hot garden.
+
+Run from apps/api against a scratch database (it creates and deletes its
+own users):
+
+    DATABASE_URL=postgresql://... python -m bench.bench_contention [rounds] [out.json]
+
+`sql`: several raw connections (standing in for separate API workers)
+run water, move and grow-all statements on the same plants of one user at
+once, and count deadlocks.
+
+`app`: per round, one hot user gets a burst of mixed writes (the client's
+parallel grow calls racing sells and waters) while a few other users get
+one write each. Reports latency for both, the per-user write queue
+counters from /health/locks and errors.
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import UTC, datetime
+
+import asyncpg
+
+from bench.common import app_client, summarize, write_results
+
+HOT = "hot@contention.bench"
+COLD = [f"cold{i}@contention.bench" for i in range(8)]
+PLANTS = 40
+CONNECTIONS = 6
+BURST = 24
+
+
+async def seed(db, email, plants):
+    await db.execute("DELETE FROM plant WHERE email = $1", email)
+    await db.execute('DELETE FROM "user" WHERE email = $1', email)
+    await db.execute(
+        """INSERT INTO "user" (username, email, money, plant_limit, weather, plant_count)
+           VALUES ($1, $2, 1e9, 100000, 0, $3)""",
+        email.split("@")[0] + "#0000",
+        email,
+        plants,
+    )
+    rows = await db.fetch(
+        """INSERT INTO plant (plant_type, plant_species, size, rarity, x, y, stage,
+                              growth_time_remaining, email)
+           SELECT 'rose', 'red_rose', 0.5, 0, g, 0, g % 2, CASE WHEN g % 2 = 0 THEN 5 END, $2
+           FROM generate_series(1, $1) AS g
+           RETURNING plant_id""",
+        plants,
+        email,
+    )
+    return [r["plant_id"] for r in rows]
+
+
+async def sql_contention(rounds):
+    from app.db import queries
+
+    dsn = os.environ["DATABASE_URL"]
+    db = await asyncpg.connect(dsn)
+    conns = [await asyncpg.connect(dsn) for _ in range(CONNECTIONS)]
+    deadlocks = 0
+    statements = 0
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+        plant_ids = await seed(db, HOT, PLANTS)
+        now = datetime.now(UTC)
+
+        async def worker(i, conn, plant_ids=plant_ids, now=now):
+            nonlocal deadlocks, statements
+            # Waters lock the user before the plant; before every statement
+            # took the user row first, moves and grow-all locked plants first.
+            for j, pid in enumerate(plant_ids[:12]):
+                statements += 1
+                try:
+                    kind = (i + j) % 3
+                    if kind == 0:
+                        await queries.apply_water(conn, HOT, pid, 25, 5, None)
+                    elif kind == 1:
+                        await queries.move_plant(conn, HOT, pid, 1.0, 2.0)
+                    else:
+                        await queries.grow_plants(conn, HOT, 1, None, [1, 2, 5], now)
+                except asyncpg.DeadlockDetectedError:
+                    deadlocks += 1
+
+        await asyncio.gather(*(worker(i, conn) for i, conn in enumerate(conns)))
+
+    elapsed = time.perf_counter() - start
+    for conn in conns:
+        await conn.close()
+    await db.execute("DELETE FROM plant WHERE email = $1", HOT)
+    await db.execute('DELETE FROM "user" WHERE email = $1', HOT)
+    await db.close()
+    return {"rounds": rounds, "connections": CONNECTIONS, "statements": statements,
+            "deadlocks": deadlocks, "seconds": round(elapsed, 3)}
+
+
+async def app_contention(rounds):
+    db = await asyncpg.connect(os.environ["DATABASE_URL"])
+    hot_latencies, cold_latencies = [], []
+    errors = {}
+
+    async with app_client() as (client, jwks, _):
+        from app.core.locks import user_write_locks
+
+        tokens = {email: jwks.mint_token(email) for email in [HOT, *COLD]}
+
+        async def send(latencies, email, method, url, **kwargs):
+            start = time.perf_counter()
+            response = await client.request(
+                method, url, headers={"Authorization": f"Bearer {tokens[email]}"}, **kwargs
+            )
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 500:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+        for _ in range(rounds):
+            plant_ids = await seed(db, HOT, PLANTS)
+            for email in COLD:
+                await seed(db, email, 1)
+            hot = f"/users/{HOT}"
+            requests = []
+            for i in range(BURST):
+                kind = i % 4
+                if kind == 0:
+                    requests.append(send(hot_latencies, HOT, "POST", f"{hot}/plants/grow", json={"time": 1}))
+                elif kind == 1:
+                    requests.append(send(hot_latencies, HOT, "POST", f"{hot}/plants/sell-batch",
+                                         json={"plant_ids": plant_ids[i::BURST]}))
+                elif kind == 2:
+                    requests.append(send(hot_latencies, HOT, "PATCH", f"{hot}/plants/{plant_ids[i]}/apply-water"))
+                else:
+                    requests.append(send(hot_latencies, HOT, "PATCH", f"{hot}/money", json={"amount": 1}))
+            for email in COLD:
+                requests.append(send(cold_latencies, email, "PATCH", f"/users/{email}/money", json={"amount": 1}))
+            await asyncio.gather(*requests)
+
+        locks = user_write_locks.stats()
+
+    for email in [HOT, *COLD]:
+        await db.execute("DELETE FROM plant WHERE email = $1", email)
+        await db.execute('DELETE FROM "user" WHERE email = $1', email)
+    await db.close()
+    return {"hot_user": summarize(hot_latencies), "other_users": summarize(cold_latencies),
+            "errors": errors, "locks": locks}
+
+
+async def main(rounds, out_path):
+    results = {"sql": await sql_contention(rounds), "app": await app_contention(rounds)}
+    write_results(results, out_path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 30,
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    ))
@@ -0,0 +1,125 @@
+"""Garden reads: payload size, latency and statements per encoding, and the
+cost of a 304 revalidation.
+
+Run from apps/api against a scratch database (it creates and deletes a
+bench user):
+
+    DATABASE_URL=postgresql://... python -m bench.bench_garden [iterations] [out.json]
+
+For each garden size it compares the two-request visit flow
+(GET /users/{email} + GET /users/{email}/plants) with GET /users/{email}/garden
+in each encoding, then times serialization alone: FastAPI's default path
+(jsonable_encoder + json.dumps) against orjson and msgpack.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import asyncpg
+from fastapi.encoders import jsonable_encoder
+
+from bench.common import app_client, measure, summarize, write_results
+
+EMAIL = "bench-garden@example.com"
+GARDEN_SIZES = (25, 200, 1000)
+
+
+async def seed_garden(conn, count):
+    await conn.execute("DELETE FROM plant WHERE email = $1", EMAIL)
+    await conn.execute(
+        """INSERT INTO plant (plant_type, plant_species, size, rarity, x, y, stage,
+                              growth_time_remaining, fertilizer_remaining, email)
+           SELECT 'rose', 'red_rose', random(), g % 3, g, -g, g % 3, NULL, NULL, $2
+           FROM generate_series(1, $1) AS g""",
+        count,
+        EMAIL,
+    )
+    await conn.execute(
+        'UPDATE "user" SET plant_count = $2, plant_limit = $2 WHERE email = $1', EMAIL, count
+    )
+
+
+def per_call_us(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return round((time.perf_counter() - start) / repeat * 1e6, 1)
+
+
+async def main(iterations, out_path):
+    db = await asyncpg.connect(os.environ["DATABASE_URL"])
+    await db.execute("DELETE FROM plant WHERE email = $1", EMAIL)
+    await db.execute('DELETE FROM "user" WHERE email = $1', EMAIL)
+
+    results = {}
+
+    async with app_client() as (client, jwks, counter):
+        # app_client points auth at its JWKS stand-in before the app
+        # modules are first imported.
+        from app.core.encoding import encode
+        from app.db import queries
+        from app.routers.garden import garden_from_rows
+
+        headers = {"Authorization": f"Bearer {jwks.mint_token(EMAIL)}"}
+        base = f"/users/{EMAIL}"
+        response = await client.post("/users/", json={"email": EMAIL}, headers=headers)
+        response.raise_for_status()
+
+        async def run(name, requests):
+            latencies, sizes, statements = [], [], 0
+            for _ in range(iterations):
+                elapsed = count = size = 0
+                for url, extra in requests:
+                    response, seconds, n = await measure(
+                        client, counter, "GET", url, headers={**headers, **extra}
+                    )
+                    if response.status_code not in (200, 304):
+                        raise RuntimeError(f"{name}: {response.status_code} {response.text}")
+                    elapsed += seconds
+                    count += n
+                    size += len(response.content)
+                latencies.append(elapsed)
+                sizes.append(size)
+                statements = count
+            results[name] = summarize(latencies)
+            results[name]["bytes"] = sizes[-1]
+            results[name]["statements"] = statements
+
+        for size in GARDEN_SIZES:
+            await seed_garden(db, size)
+            response = await client.get(f"{base}/garden", headers=headers)
+            etag = response.headers["etag"]
+
+            await run(f"{size}/user+plants", [(base, {}), (f"{base}/plants", {})])
+            await run(f"{size}/garden_json", [(f"{base}/garden", {})])
+            await run(f"{size}/garden_json_columns", [(f"{base}/garden?layout=columns", {})])
+            await run(f"{size}/garden_msgpack", [(f"{base}/garden", {"Accept": "application/msgpack"})])
+            await run(
+                f"{size}/garden_msgpack_columns",
+                [(f"{base}/garden?layout=columns", {"Accept": "application/msgpack"})],
+            )
+            await run(f"{size}/garden_304", [(f"{base}/garden", {"If-None-Match": etag})])
+
+            garden = garden_from_rows(await queries.garden(db, EMAIL))
+            repeat = max(10, iterations)
+            results[f"{size}/serialize_us"] = {
+                "fastapi_default": per_call_us(
+                    lambda garden=garden: json.dumps(jsonable_encoder(garden)).encode(), repeat
+                ),
+                "orjson": per_call_us(lambda garden=garden: encode(garden, False), repeat),
+                "msgpack": per_call_us(lambda garden=garden: encode(garden, True), repeat),
+            }
+
+        await client.delete(base, headers=headers)
+
+    await db.close()
+    write_results(results, out_path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    ))
@@ -0,0 +1,112 @@
+"""Statements per request and latency for each mutation endpoint.
+
+Run from apps/api against a scratch database (it creates and deletes a
+bench user):
+
+    DATABASE_URL=postgresql://... python -m bench.bench_mutations [iterations] [out.json]
+"""
+import asyncio
+import os
+import statistics
+import sys
+
+import asyncpg
+
+from bench.common import app_client, measure, summarize, write_results
+
+EMAIL = "bench-mutations@example.com"
+
+
+async def seed_plants(conn, count, stage, fertilizer_remaining=None, growth_time_remaining=None):
+    rows = await conn.fetch(
+        """INSERT INTO plant (plant_type, plant_species, size, rarity, x, y, stage,
+                              growth_time_remaining, fertilizer_remaining, email)
+           SELECT 'rose', 'red_rose', 0.5, 0, g, 0, $2, $3, $4, $5
+           FROM generate_series(1, $1) AS g
+           RETURNING plant_id""",
+        count,
+        stage,
+        growth_time_remaining,
+        fertilizer_remaining,
+        EMAIL,
+    )
+    return [r["plant_id"] for r in rows]
+
+
+async def main(iterations, out_path):
+    db = await asyncpg.connect(os.environ["DATABASE_URL"])
+    await db.execute("DELETE FROM plant WHERE email = $1", EMAIL)
+    await db.execute('DELETE FROM "user" WHERE email = $1', EMAIL)
+
+    results = {}
+
+    async with app_client() as (client, jwks, counter):
+        headers = {"Authorization": f"Bearer {jwks.mint_token(EMAIL)}"}
+        base = f"/users/{EMAIL}"
+
+        response = await client.post("/users/", json={"email": EMAIL}, headers=headers)
+        response.raise_for_status()
+        await db.execute(
+            'UPDATE "user" SET money = 1e12, plant_limit = 1000000 WHERE email = $1', EMAIL
+        )
+
+        async def run(name, requests):
+            latencies, statements = [], []
+            for method, url, kwargs in requests:
+                response, elapsed, count = await measure(
+                    client, counter, method, url, headers=headers, **kwargs
+                )
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{name}: {response.status_code} {response.text}")
+                latencies.append(elapsed)
+                statements.append(count)
+            results[name] = summarize(latencies)
+            results[name]["statements_per_request"] = statistics.mode(statements)
+
+        # 40 apart, so no placement overlaps another.
+        await run("create_plant", [
+            ("POST", f"{base}/plants/", {"json": {"plant_type": "rose", "x": i % 100 * 40, "y": i // 100 * 40}})
+            for i in range(iterations)
+        ])
+
+        seedlings = await seed_plants(db, iterations, stage=0)
+        await run("apply_water", [
+            ("PATCH", f"{base}/plants/{pid}/apply-water", {}) for pid in seedlings
+        ])
+        await run("grow_plant_by_time", [
+            ("PATCH", f"{base}/plants/{pid}/grow", {"json": {"time": 1}}) for pid in seedlings
+        ])
+        await run("grow_plants", [
+            ("POST", f"{base}/plants/grow", {"json": {"time": 0}}) for _ in range(iterations)
+        ])
+
+        sprouts = await seed_plants(db, iterations, stage=1, fertilizer_remaining=5)
+        await run("apply_fertilizer", [
+            ("PATCH", f"{base}/plants/{pid}/apply-fertilizer", {}) for pid in sprouts
+        ])
+        await run("sell_plant", [
+            ("DELETE", f"{base}/plants/{pid}/sell", {}) for pid in sprouts
+        ])
+
+        await run("change_money", [
+            ("PATCH", f"{base}/money", {"json": {"amount": 1}}) for _ in range(iterations)
+        ])
+        await db.execute('UPDATE "user" SET plant_limit = 25 WHERE email = $1', EMAIL)
+        await run("increase_plant_limit", [
+            ("POST", f"{base}/increase-plant-limit", {}) for _ in range(min(iterations, 50))
+        ])
+        await run("cycle_weather", [
+            ("POST", f"{base}/cycle-weather", {}) for _ in range(iterations)
+        ])
+
+        await client.delete(base, headers=headers)
+
+    await db.close()
+    write_results(results, out_path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    ))
@@ -0,0 +1,85 @@
+"""Cost per plant roll and a goodness-of-fit check on the rarity split.
+
+Run from apps/api:  python -m bench.bench_rolls [rolls]
+
+Compares the old per-plant roll (chained comparisons on the global RNG,
+random.choice, one gauss per plant) with app.core.rolls as the handlers
+use it: roll_one for a single purchase, roll for a batch, from seeds
+Postgres computed in the statement that took the row lock. user_seed, the
+same derivation in Python, is timed on its own for comparison. It also
+runs a chi-square test of the rarities against RARITY_PROBABILITIES.
+tests/test_rolls.py runs the same test in CI.
+"""
+import gc
+import random
+import sys
+import time
+
+from app.core.config import PLANT_SPECIES, RARITY_PROBABILITIES
+from app.core.rolls import RARITIES, roll, roll_one, user_seed
+
+# Critical value of chi-square with 2 degrees of freedom at p = 0.001.
+CHI_SQUARE_CRITICAL = 13.816
+
+
+def legacy_roll(plant_type):
+    rand = random.random()
+    if rand < RARITY_PROBABILITIES[0]:
+        rarity = 0
+    elif rand < RARITY_PROBABILITIES[0] + RARITY_PROBABILITIES[1]:
+        rarity = 1
+    else:
+        rarity = 2
+    species = random.choice(PLANT_SPECIES[plant_type][rarity])
+    size = max(0.0, min(1.0, random.gauss(0.5, 0.2)))
+    return rarity, species, size
+
+
+def per_roll_ns(label, rolls, fn):
+    # Best of five, so a noisy neighbour doesn't decide the comparison, and
+    # with the cyclic GC off as timeit runs: the results kept alive would
+    # otherwise set off collections that charge the lists a batch returns.
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(5):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    print(f"{label:<40} {best / rolls * 1e9:9.1f} ns/roll")
+
+
+def main(rolls):
+    seeds = [user_seed("bench@example.com", version, 0) for version in range(rolls)]
+    per_roll_ns("legacy, one plant at a time", rolls, lambda: [legacy_roll("rose") for _ in range(rolls)])
+    per_roll_ns("roll_one", rolls, lambda: [roll_one("rose", seed) for seed in seeds])
+    for batch in (2, 3, 4, 8, 25, 100):
+        batches = [seeds[i:i + batch] for i in range(0, rolls - batch + 1, batch)]
+        types = ["rose"] * batch
+        per_roll_ns(
+            f"roll, batch of {batch}",
+            len(batches) * batch,
+            lambda types=types, batches=batches: [roll(types, batch_seeds) for batch_seeds in batches],
+        )
+    per_roll_ns(
+        "user_seed (Postgres computes it)", rolls,
+        lambda: [user_seed("bench@example.com", version, 0) for version in range(rolls)],
+    )
+
+    rarities, _, _ = roll(["rose"] * rolls, seeds)
+    counts = {rarity: rarities.count(rarity) for rarity in RARITIES}
+    chi_square = sum(
+        (counts[r] - rolls * RARITY_PROBABILITIES[r]) ** 2 / (rolls * RARITY_PROBABILITIES[r])
+        for r in RARITIES
+    )
+    split = ", ".join(f"{r}: {counts[r] / rolls:.4f}" for r in RARITIES)
+    verdict = "ok" if chi_square < CHI_SQUARE_CRITICAL else "FAIL"
+    print(f"rarity split over {rolls} rolls: {split}")
+    print(f"chi-square {chi_square:.3f} (critical {CHI_SQUARE_CRITICAL} at p=0.001): {verdict}")
+    return 0 if chi_square < CHI_SQUARE_CRITICAL else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
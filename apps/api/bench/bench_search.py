@@ -0,0 +1,82 @@
+"""Username search latency on a synthetic user base.
+
+Run from apps/api:  python -m bench.bench_search [users] [out.json]
+
+Builds the in-process username index from `users` generated names and
+times short and long prefix queries, one-typo queries that fall through
+to fuzzy matching, deep pages and renames.
+"""
+import random
+import sys
+import time
+
+from app.core.config import SEARCH_FUZZY_ALPHABET_SIZE
+from app.core.search import UsernameIndex
+from bench.common import summarize, write_results
+
+SYLLABLES = [
+    "ba", "be", "bo", "da", "di", "fa", "fe", "ga", "go", "ka", "ki", "la", "le", "lo", "ma",
+    "mi", "na", "no", "pa", "pi", "ra", "re", "ro", "sa", "se", "ta", "ti", "va", "ze", "zu",
+]
+QUERIES_PER_KIND = 2000
+
+
+def make_name(rng):
+    base = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5)))
+    return f"{base}#{rng.randrange(10000):04d}"
+
+
+def typo(rng, word):
+    i = rng.randrange(len(word) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + rng.choice("abdefgiklmnoprstvz") + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def timed(index, queries, limit=20, offset=0):
+    latencies = []
+    returned = 0
+    for query in queries:
+        start = time.perf_counter()
+        results, _ = index.search(query, limit, offset)
+        latencies.append(time.perf_counter() - start)
+        returned += len(results)
+    return {**summarize(latencies), "results_per_query": round(returned / len(queries), 2)}
+
+
+def main(users, out_path):
+    rng = random.Random(14)
+    rows = [{"email": f"user{i}@example.com", "username": make_name(rng)} for i in range(users)]
+    bases = [row["username"].split("#")[0] for row in rows]
+
+    index = UsernameIndex(SEARCH_FUZZY_ALPHABET_SIZE)
+    start = time.perf_counter()
+    index.load(rows)
+    results = {"users": users, "load_ms": round((time.perf_counter() - start) * 1e3, 1)}
+
+    picks = [rng.choice(bases) for _ in range(QUERIES_PER_KIND)]
+    results["prefix_2_chars"] = timed(index, [b[:2] for b in picks])
+    results["prefix_4_chars"] = timed(index, [b[:4] for b in picks])
+    results["exact_base"] = timed(index, picks)
+    results["typo_fuzzy"] = timed(index, [typo(rng, b) for b in picks])
+    results["prefix_page_10"] = timed(index, [b[:2] for b in picks], offset=200)
+
+    latencies = []
+    for i in range(QUERIES_PER_KIND):
+        email = rows[rng.randrange(users)]["email"]
+        start = time.perf_counter()
+        index.add(email, make_name(rng))
+        latencies.append(time.perf_counter() - start)
+    results["rename"] = summarize(latencies)
+
+    write_results(results, out_path)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300_000,
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    )
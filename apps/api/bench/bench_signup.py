@@ -0,0 +1,138 @@
+"""Signup bursts on popular base names.
+
+Run from apps/api against a scratch database (it creates and deletes its
+own users and username_tag rows):
+
+    DATABASE_URL=postgresql://... python -m bench.bench_signup [burst] [taken] [out.json]
+
+For each of a few base names that already have `taken` users, `burst`
+concurrent POST /users/ signups arrive at once. Reports latency,
+statements per signup, and checks every signup got a distinct tag. The
+same burst is replayed against the old allocator (try base#0000,
+base#0001, ... until an INSERT succeeds) on a plain pool for comparison.
+"""
+import asyncio
+import os
+import sys
+import time
+
+import asyncpg
+
+from bench.common import app_client, summarize, write_results
+
+BASES = ["john", "alex", "sam"]
+DOMAIN = "signup.bench"
+
+
+async def reset(db, taken):
+    await db.execute('DELETE FROM "user" WHERE email LIKE $1', f"%@%{DOMAIN}")
+    await db.execute("DELETE FROM username_tag WHERE base = ANY($1::text[])", BASES)
+    for base in BASES:
+        await db.execute(
+            """INSERT INTO "user" (username, email, money, plant_limit, weather)
+               SELECT $1 || '#' || lpad(g::text, 4, '0'), 'seed-' || g || '@' || $1 || '.' || $3,
+                      0, 25, 0
+               FROM generate_series(0, $2 - 1) AS g""",
+            base,
+            taken,
+            DOMAIN,
+        )
+        # What migration 006 backfills for existing users.
+        await db.execute(
+            "INSERT INTO username_tag (base, next_tag) VALUES ($1, $2)", base, taken
+        )
+
+
+def signup_emails(burst):
+    return [f"{BASES[i % len(BASES)]}@{i}.{DOMAIN}" for i in range(burst)]
+
+
+async def legacy_signup(pool, email, initial, attempts):
+    base = email.split("@")[0]
+    async with pool.acquire() as conn:
+        for i in range(10000):
+            attempts.append(1)
+            try:
+                await conn.execute(
+                    'INSERT INTO "user" (username, email, money, plant_limit, weather) VALUES ($1, $2, $3, $4, $5)',
+                    f"{base}#{i:04d}",
+                    email,
+                    *initial,
+                )
+                return f"{base}#{i:04d}"
+            except asyncpg.UniqueViolationError:
+                continue
+
+
+def check_unique(usernames, burst):
+    if len(usernames) != burst or len(set(usernames)) != burst:
+        raise RuntimeError(f"{burst} signups got {len(set(usernames))} distinct usernames")
+
+
+async def main(burst, taken, out_path):
+    db = await asyncpg.connect(os.environ["DATABASE_URL"])
+    emails = signup_emails(burst)
+    results = {"burst": burst, "taken_per_base": taken}
+
+    await reset(db, taken)
+    async with app_client() as (client, jwks, counter):
+        from app.core.config import INITIAL_PLANT_LIMIT, INITIAL_USER_MONEY, INITIAL_WEATHER
+
+        initial = (INITIAL_USER_MONEY, INITIAL_PLANT_LIMIT, INITIAL_WEATHER)
+        tokens = {email: jwks.mint_token(email) for email in emails}
+        latencies = []
+
+        async def signup(email):
+            start = time.perf_counter()
+            response = await client.post(
+                "/users/", json={"email": email}, headers={"Authorization": f"Bearer {tokens[email]}"}
+            )
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+            return response.json()["username"]
+
+        counter.count = 0
+        started = time.perf_counter()
+        usernames = await asyncio.gather(*(signup(email) for email in emails))
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0)
+        check_unique(usernames, burst)
+        results["allocator"] = {
+            **summarize(latencies),
+            "signups_per_s": round(burst / elapsed),
+            "statements_per_signup": round(counter.count / burst, 2),
+        }
+
+    await reset(db, taken)
+    pool = await asyncpg.create_pool(os.environ["DATABASE_URL"], min_size=10, max_size=10)
+    latencies, attempts = [], []
+
+    async def legacy(email):
+        start = time.perf_counter()
+        username = await legacy_signup(pool, email, initial, attempts)
+        latencies.append(time.perf_counter() - start)
+        return username
+
+    started = time.perf_counter()
+    usernames = await asyncio.gather(*(legacy(email) for email in emails))
+    elapsed = time.perf_counter() - started
+    check_unique(usernames, burst)
+    results["retry_loop"] = {
+        **summarize(latencies),
+        "signups_per_s": round(burst / elapsed),
+        "statements_per_signup": round(len(attempts) / burst, 2),
+    }
+    await pool.close()
+
+    await db.execute('DELETE FROM "user" WHERE email LIKE $1', f"%@%{DOMAIN}")
+    await db.execute("DELETE FROM username_tag WHERE base = ANY($1::text[])", BASES)
+    await db.close()
+    write_results(results, out_path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1000,
+        sys.argv[3] if len(sys.argv) > 3 else None,
+    ))
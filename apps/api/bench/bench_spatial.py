@@ -0,0 +1,149 @@
+"""Viewport reads, placement checks and free-slot search as a garden grows.
+
+Run from apps/api against a scratch database (it creates and deletes a
+bench user):
+
+    DATABASE_URL=postgresql://... python -m bench.bench_spatial [iterations] [out.json]
+
+For each garden size, plants are laid out 32 px apart from one corner of
+the garden. It times reading the whole garden (uncached) against a
+1920x1080 viewport with ?bbox=, buying a plant on a free spot and on an
+occupied one (refused), moving a plant, moving 100 plants in one
+request, and asking for the free slot nearest a point inside the planted
+area. Everything but the
+whole-garden read should stay flat as the garden grows.
+"""
+import asyncio
+import os
+import sys
+
+import asyncpg
+
+from bench.common import app_client, measure, summarize, write_results
+
+EMAIL = "bench-spatial@example.com"
+GARDEN_SIZES = (1000, 10000, 50000)
+GAP = 32
+ROW = 300
+ORIGIN = -4900
+
+
+async def seed_garden(conn, count):
+    await conn.execute("DELETE FROM plant WHERE email = $1", EMAIL)
+    await conn.execute(
+        """INSERT INTO plant (plant_type, plant_species, size, rarity, x, y, stage,
+                              growth_time_remaining, fertilizer_remaining, email)
+           SELECT 'rose', 'red_rose', 1, 0, $3 + g % $4 * $5, $3 + g / $4 * $5, 0, NULL, NULL, $2
+           FROM generate_series(0, $1 - 1) AS g""",
+        count,
+        EMAIL,
+        ORIGIN,
+        ROW,
+        GAP,
+    )
+    await conn.execute(
+        'UPDATE "user" SET money = 1e9, plant_count = $2, plant_limit = $2 + 100000 WHERE email = $1',
+        EMAIL,
+        count,
+    )
+    await conn.execute("ANALYZE plant")
+
+
+async def main(iterations, out_path):
+    db = await asyncpg.connect(os.environ["DATABASE_URL"])
+    await db.execute("DELETE FROM plant WHERE email = $1", EMAIL)
+    await db.execute('DELETE FROM "user" WHERE email = $1', EMAIL)
+
+    results = {}
+
+    async with app_client() as (client, jwks, counter):
+        from app.core.cache import read_cache
+
+        headers = {"Authorization": f"Bearer {jwks.mint_token(EMAIL)}"}
+        base = f"/users/{EMAIL}"
+        response = await client.post("/users/", json={"email": EMAIL}, headers=headers)
+        response.raise_for_status()
+
+        async def run(name, request, expect=200, before=None):
+            latencies, statements, size = [], 0, 0
+            for i in range(iterations):
+                if before is not None:
+                    await before()
+                method, url, kwargs = request(i)
+                response, elapsed, statements = await measure(
+                    client, counter, method, url, headers=headers, **kwargs
+                )
+                if response.status_code != expect:
+                    raise RuntimeError(f"{name}: {response.status_code} {response.text}")
+                latencies.append(elapsed)
+                size = len(response.content)
+            results[name] = summarize(latencies)
+            results[name]["bytes"] = size
+            results[name]["statements"] = statements
+
+        for size in GARDEN_SIZES:
+            await seed_garden(db, size)
+            rows = -(-size // ROW)
+            # A point inside the planted area, at most ten rows from its free
+            # side, and free spots past its last row.
+            middle_x, middle_y = ORIGIN + ROW // 2 * GAP + 5, ORIGIN + max(0, rows - 10) * GAP + 5
+            free_y = ORIGIN + (rows + 1) * GAP
+            first_row = await db.fetch(
+                "SELECT plant_id FROM plant WHERE email = $1 ORDER BY plant_id LIMIT 100", EMAIL
+            )
+            plant_id = first_row[0]["plant_id"]
+
+            await run(
+                f"{size}/plants_uncached",
+                lambda i: ("GET", f"{base}/plants", {}),
+                before=lambda: read_cache.invalidate_garden(EMAIL),
+            )
+            await run(
+                f"{size}/plants_bbox",
+                lambda i, middle_x=middle_x, middle_y=middle_y: ("GET", f"{base}/plants", {"params": {
+                    "bbox": f"{middle_x - 960},{middle_y - 540},{middle_x + 960},{middle_y + 540}"
+                }}),
+            )
+            await run(
+                f"{size}/free_slot",
+                lambda i, middle_x=middle_x, middle_y=middle_y: ("GET", f"{base}/plants/free-slot", {"params": {"x": middle_x, "y": middle_y}}),
+            )
+            await run(
+                f"{size}/create_plant",
+                lambda i, free_y=free_y: ("POST", f"{base}/plants/", {"json": {
+                    "plant_type": "rose", "x": ORIGIN + i % ROW * GAP, "y": free_y + i // ROW * GAP
+                }}),
+                expect=201,
+            )
+            await run(
+                f"{size}/create_plant_overlapping",
+                lambda i, middle_x=middle_x, middle_y=middle_y: ("POST", f"{base}/plants/", {"json": {
+                    "plant_type": "rose", "x": middle_x, "y": middle_y
+                }}),
+                expect=409,
+            )
+            await run(
+                f"{size}/move_plant",
+                lambda i, plant_id=plant_id: ("PATCH", f"{base}/plants/{plant_id}/position", {"json": {
+                    "x": ORIGIN + i % 2, "y": ORIGIN
+                }}),
+            )
+            await run(
+                f"{size}/move_plants_100",
+                lambda i, first_row=first_row: ("PATCH", f"{base}/plants/positions", {"json": {"plants": [
+                    {"plant_id": row["plant_id"], "x": ORIGIN + k * GAP + i % 2, "y": ORIGIN}
+                    for k, row in enumerate(first_row)
+                ]}}),
+            )
+
+        await client.delete(base, headers=headers)
+
+    await db.close()
+    write_results(results, out_path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    ))
@@ -0,0 +1,179 @@
+"""Cold start, readiness and worker recycle times of `python -m app.server`.
+
+Run from apps/api:
+
+    python -m bench.bench_startup [--workers N] [--runs N] [--out PATH]
+
+Measures:
+  * importing app.main with and without compiled bytecode (what a fresh
+    container pays when dependencies were installed without
+    UV_COMPILE_BYTECODE);
+  * time from spawning the server to the first 200 from /health/ready, and
+    until every worker has answered /health/live;
+  * with WORKER_MAX_REQUESTS set, the gap between a worker's last response
+    and its replacement's first one, and the longest a request waited
+    meanwhile (it stalls if every worker happens to be restarting at once).
+
+Uses DATABASE_URL when set, otherwise a throwaway Postgres (bench/postgres.py).
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from bench.common import write_results
+from bench.jwks_server import JWKSServer
+from bench.postgres import local_postgres
+
+
+def import_seconds(env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(url, timeout=2):
+    """`(status, body)`, or `(None, None)` if nothing answered."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except OSError:
+        return None, None
+
+
+def start_server(env, workers, max_requests=0):
+    port = free_port()
+    # Nothing here replays mutations, so the per-worker idempotency store
+    # can be switched off rather than needing Redis.
+    env = {**env, "PORT": str(port), "HOST": "127.0.0.1", "WEB_CONCURRENCY": str(workers),
+           "WORKER_MAX_REQUESTS": str(max_requests), "IDEMPOTENCY_TTL": "0"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server"], env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def startup(env, workers, timeout=60):
+    started = time.perf_counter()
+    process, base = start_server(env, workers)
+    try:
+        ready = None
+        pids = set()
+        while time.perf_counter() - started < timeout:
+            if ready is None:
+                status, _ = get(f"{base}/health/ready")
+                if status == 200:
+                    ready = time.perf_counter() - started
+            else:
+                status, body = get(f"{base}/health/live")
+                if status == 200:
+                    pids.add(body["pid"])
+                if len(pids) == workers:
+                    return ready, time.perf_counter() - started
+            time.sleep(0.005)
+        raise RuntimeError(f"server not ready after {timeout}s (ready={ready}, workers seen={len(pids)})")
+    finally:
+        stop_server(process)
+
+
+def recycle(env, workers, max_requests, requests):
+    process, base = start_server(env, workers, max_requests)
+    try:
+        while get(f"{base}/health/ready")[0] != 200:
+            time.sleep(0.01)
+        last_seen = {}
+        gaps = []
+        latencies = []
+        failed = 0
+        for _ in range(requests):
+            start = time.perf_counter()
+            status, body = get(f"{base}/health/live", timeout=30)
+            now = time.perf_counter()
+            latencies.append(now - start)
+            if status != 200:
+                failed += 1
+                continue
+            pid = body["pid"]
+            if pid not in last_seen and len(last_seen) >= workers:
+                # A replacement: measure from the longest-silent worker.
+                retired = min(last_seen, key=last_seen.get)
+                gaps.append(now - last_seen.pop(retired))
+            last_seen[pid] = now
+        return gaps, max(latencies), failed
+    finally:
+        stop_server(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=min(4, os.process_cpu_count() or 1))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    jwks = JWKSServer().start()
+    results = {"workers": args.workers}
+    try:
+        with local_postgres() as dsn:
+            env = {**os.environ, "DATABASE_URL": dsn, "CLERK_JWKS_URL": jwks.url}
+
+            with tempfile.TemporaryDirectory() as empty:
+                cold_env = {**env, "PYTHONPYCACHEPREFIX": empty, "PYTHONDONTWRITEBYTECODE": "1"}
+                cold = [import_seconds(cold_env) for _ in range(args.runs)]
+            import_seconds(env)  # make sure bytecode is written
+            warm = [import_seconds(env) for _ in range(args.runs)]
+            results["import_seconds"] = {
+                "without_bytecode": round(statistics.median(cold), 3),
+                "with_bytecode": round(statistics.median(warm), 3),
+            }
+
+            for workers in sorted({1, args.workers}):
+                runs = [startup(env, workers) for _ in range(args.runs)]
+                results[f"startup_{workers}_workers"] = {
+                    "first_ready_s": round(statistics.median(r[0] for r in runs), 3),
+                    "all_workers_s": round(statistics.median(r[1] for r in runs), 3),
+                }
+
+            if args.workers > 1:
+                gaps, stall, failed = recycle(env, args.workers, max_requests=200, requests=2000)
+                results["recycle"] = {
+                    "max_requests": 200,
+                    "recycles_seen": len(gaps),
+                    "replacement_s_median": round(statistics.median(gaps), 3) if gaps else None,
+                    "replacement_s_max": round(max(gaps), 3) if gaps else None,
+                    "longest_request_s": round(stall, 3),
+                    "failed_requests": failed,
+                }
+    finally:
+        jwks.stop()
+
+    write_results(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Shared helpers for the benchmark scripts: an in-process app client with
+real (locally minted) auth, per-request statement counting and summaries."""
+import asyncio
+import contextvars
+import json
+import os
+import statistics
+import time
+from contextlib import asynccontextmanager
+
+from bench.jwks_server import JWKSServer
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1e3, 3),
+        "p50_ms": round(percentile(samples, 0.50) * 1e3, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1e3, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1e3, 3),
+    }
+
+
+# Set to a one-element list around a request to count its statements even
+# when other requests run concurrently. asyncpg invokes query loggers with
+# call_soon, which carries the caller's context along.
+request_statements = contextvars.ContextVar("request_statements", default=None)
+
+
+class StatementCounter:
+    """asyncpg query logger that counts statements sent by each request."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, record):
+        self.count += 1
+        tally = request_statements.get()
+        if tally is not None:
+            tally[0] += 1
+
+
+@asynccontextmanager
+async def app_client():
+    """Yield `(client, jwks, counter)` for the app running in-process.
+
+    Requires DATABASE_URL. Auth goes through the real `verify_clerk_token`
+    against a local JWKS stand-in.
+    """
+    jwks = JWKSServer().start()
+    os.environ["CLERK_JWKS_URL"] = jwks.url
+
+    import httpx
+    from app.main import app
+    from app.db import database
+
+    counter = StatementCounter()
+    acquire = database.acquire
+
+    # get_db and the cached read paths both go through database.acquire.
+    @asynccontextmanager
+    async def counted_acquire():
+        async with acquire() as conn:
+            with conn.query_logger(counter):
+                yield conn
+
+    database.acquire = counted_acquire
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client, jwks, counter
+
+    database.acquire = acquire
+    jwks.stop()
+
+
+async def measure(client, counter, method, url, **kwargs):
+    """Send one request; return `(response, seconds, statements)`."""
+    counter.count = 0
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - start
+    # Query loggers are invoked via call_soon; let them run.
+    await asyncio.sleep(0)
+    return response, elapsed, counter.count
+
+
+def write_results(results, path):
+    if path:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    print(json.dumps(results, indent=2, sort_keys=True))
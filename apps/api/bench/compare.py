@@ -0,0 +1,84 @@
+"""Compare two bench.load reports.
+
+Run from apps/api:
+
+    python -m bench.compare BASE.json NEW.json [--threshold 0.10]
+
+Prints p50/p95/p99, throughput and statements per request for every
+endpoint both reports measured, with the change from BASE. Exits 1 when an
+endpoint's p95 grew by more than `threshold` (as a fraction), its
+throughput fell by more than that, or it sends more statements per request
+than before, so it can gate a CI job. Latency only compares fairly between
+runs on the same machine with the same --scale and --rounds.
+"""
+import argparse
+import json
+import sys
+
+COLUMNS = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "statements_per_request"]
+
+
+def change(old, new):
+    if old == 0:
+        return 0.0 if new == 0 else float("inf")
+    return (new - old) / old
+
+
+def regressions(old, new, threshold):
+    found = []
+    if change(old["p95_ms"], new["p95_ms"]) > threshold:
+        found.append("p95")
+    if change(old["throughput_rps"], new["throughput_rps"]) < -threshold:
+        found.append("throughput")
+    if new["statements_per_request"] > old["statements_per_request"]:
+        found.append("statements")
+    return found
+
+
+def compare(base, new, threshold):
+    failed = False
+    for key in ("scale", "rounds"):
+        if base["meta"].get(key) != new["meta"].get(key):
+            print(f"warning: {key} differs ({base['meta'].get(key)} vs {new['meta'].get(key)})")
+    print(f"base {(base['meta']['commit'] or '?')[:7]}  new {(new['meta']['commit'] or '?')[:7]}"
+          f"{' (dirty)' if new['meta'].get('dirty') else ''}")
+
+    for scenario, result in new["scenarios"].items():
+        old_result = base["scenarios"].get(scenario)
+        if old_result is None:
+            print(f"\n{scenario}: not in base")
+            continue
+        print(f"\n{scenario}")
+        for label, endpoint in result["endpoints"].items():
+            old = old_result["endpoints"].get(label)
+            if old is None:
+                print(f"  {label}: not in base")
+                continue
+            cells = [
+                f"{column.removesuffix('_ms')} {old[column]:g}->{endpoint[column]:g}"
+                f" ({change(old[column], endpoint[column]):+.0%})"
+                for column in COLUMNS
+            ]
+            found = regressions(old, endpoint, threshold)
+            failed = failed or bool(found)
+            flag = f"  REGRESSED: {', '.join(found)}" if found else ""
+            print(f"  {label}{flag}\n    " + "  ".join(cells))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    sys.exit(1 if compare(base, new, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
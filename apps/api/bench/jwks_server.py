@@ -0,0 +1,70 @@
+"""Local stand-in for Clerk's JWKS endpoint plus token minting.
+
+    server = JWKSServer()
+    server.start()
+    os.environ["CLERK_JWKS_URL"] = server.url
+    token = server.mint_token("player@example.com")
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+
+class JWKSServer:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.kid = None
+        self._private_key = None
+        self._jwks = None
+        self.requests = 0
+        self._httpd = None
+        self.rotate_key()
+
+    def rotate_key(self):
+        """Replace the signing key; tokens minted afterwards carry a new `kid`."""
+        self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.kid = uuid.uuid4().hex
+        jwk = RSAAlgorithm.to_jwk(self._private_key.public_key(), as_dict=True)
+        jwk.update({"kid": self.kid, "alg": "RS256", "use": "sig"})
+        self._jwks = json.dumps({"keys": [jwk]}).encode()
+
+    def mint_token(self, email, ttl=3600):
+        now = int(time.time())
+        claims = {"sub": email, "email": email, "iat": now, "exp": now + ttl}
+        return jwt.encode(claims, self._private_key, algorithm="RS256", headers={"kid": self.kid})
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/.well-known/jwks.json"
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(server._jwks)))
+                self.end_headers()
+                self.wfile.write(server._jwks)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
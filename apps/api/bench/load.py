@@ -0,0 +1,302 @@
+"""Load scenarios against the API running in-process.
+
+Run from apps/api:
+
+    python -m bench.load [--scenario NAME ...] [--scale USERS] [--rounds N] [--out PATH]
+
+Uses DATABASE_URL when set; otherwise starts a throwaway Postgres (see
+bench/postgres.py). Requests carry real RS256 tokens minted by the local
+JWKS stand-in, so auth is part of every measurement.
+
+Scenarios:
+
+    signup_burst    4 x scale signups at once, spread over five common names
+    pomodoro_end    scale users with 40 growing plants each finish a session
+                    together: grow-all, money and weather per user, per round
+    leaderboard     scale readers page through the leaderboard with rank_for
+    garden_visits   scale visitors open random gardens (with ETag revisits),
+                    look players up by name#tag and search usernames
+    buy_sell_churn  scale users buy a batch of seeds, water one, sell the batch
+
+Per endpoint: requests, throughput over the scenario's wall time, latency
+percentiles, mean Postgres statements per request and status codes. The
+report is written as JSON (default bench/results/<UTC time>-<commit>.json)
+with the commit it ran on; compare two reports with `python -m
+bench.compare`.
+"""
+import argparse
+import asyncio
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter
+from datetime import UTC, datetime
+from pathlib import Path
+
+import asyncpg
+
+from bench.common import app_client, request_statements, summarize, write_results
+from bench.postgres import local_postgres
+
+DOMAIN = "load.bench"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+COMMON_NAMES = ["alex", "sam", "jordan", "taylor", "chris"]
+GARDEN_PLANTS = 40
+# Distance between plants the scenarios place; more than PLANT_SPACING so
+# none of them overlap.
+PLANT_GAP = 40
+
+
+class Recorder:
+    """Sends requests through the in-process client and records them under
+    an endpoint label such as `GET /users/{email}/garden`."""
+
+    def __init__(self, client):
+        self.client = client
+        self.endpoints = {}
+
+    async def call(self, label, method, url, token=None, headers=None, **kwargs):
+        headers = dict(headers or {})
+        if token is not None:
+            headers["Authorization"] = f"Bearer {token}"
+        tally = [0]
+        reset = request_statements.set(tally)
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_statements.reset(reset)
+        # Query loggers run via call_soon; let them land in the tally.
+        await asyncio.sleep(0)
+
+        endpoint = self.endpoints.setdefault(
+            label, {"latencies": [], "statements": [], "statuses": Counter()}
+        )
+        endpoint["latencies"].append(elapsed)
+        endpoint["statements"].append(tally[0])
+        endpoint["statuses"][response.status_code] += 1
+        return response
+
+    def report(self, elapsed):
+        endpoints = {}
+        for label, endpoint in sorted(self.endpoints.items()):
+            count = len(endpoint["latencies"])
+            endpoints[label] = {
+                **summarize(endpoint["latencies"]),
+                "throughput_rps": round(count / elapsed, 1),
+                "statements_per_request": round(statistics.fmean(endpoint["statements"]), 2),
+                "statuses": {str(status): n for status, n in sorted(endpoint["statuses"].items())},
+            }
+        requests = sum(len(e["latencies"]) for e in self.endpoints.values())
+        return {
+            "seconds": round(elapsed, 3),
+            "requests": requests,
+            "throughput_rps": round(requests / elapsed, 1),
+            "endpoints": endpoints,
+        }
+
+
+async def clean(db):
+    emails = f"%@%{DOMAIN}"
+    await db.execute(
+        'DELETE FROM plant WHERE email IN (SELECT email FROM "user" WHERE email LIKE $1)', emails
+    )
+    await db.execute('DELETE FROM "user" WHERE email LIKE $1', emails)
+    # Ledger entries outlive their users; a run would otherwise leave
+    # hundreds of thousands behind.
+    await db.execute("DELETE FROM money_ledger WHERE email LIKE $1", emails)
+    await db.execute("DELETE FROM money_balance WHERE email LIKE $1", emails)
+    await db.execute("DELETE FROM username_tag WHERE base = ANY($1::text[])", COMMON_NAMES)
+
+
+async def seed_users(db, count, prefix, plants=0):
+    """Create `count` rich users with `plants` watered seedlings each."""
+    emails = [f"{prefix}{i}@{DOMAIN}" for i in range(count)]
+    await db.execute(
+        """INSERT INTO "user" (username, email, money, plant_limit, weather, plant_count)
+           SELECT split_part(e, '@', 1) || '#0000', e, 1e6 + random() * 1e6, 1000, 0, $2
+           FROM unnest($1::text[]) AS e""",
+        emails,
+        plants,
+    )
+    if plants:
+        await db.execute(
+            """INSERT INTO plant (plant_type, plant_species, size, rarity, x, y, stage,
+                                  growth_time_remaining, email)
+               SELECT 'berry', 'blueberry', 0.5, 0, g * $3, 0, 0, 30 + g % 7 * 10, e
+               FROM unnest($1::text[]) AS e, generate_series(1, $2) AS g""",
+            emails,
+            plants,
+            PLANT_GAP,
+        )
+    return emails
+
+
+async def signup_burst(rec, db, jwks, scale, rounds):
+    emails = [f"{COMMON_NAMES[i % len(COMMON_NAMES)]}@{i}.{DOMAIN}" for i in range(4 * scale)]
+    tokens = {email: jwks.mint_token(email) for email in emails}
+    await asyncio.gather(*(
+        rec.call("POST /users/", "POST", "/users/", tokens[email], json={"email": email})
+        for email in emails
+    ))
+
+
+async def pomodoro_end(rec, db, jwks, scale, rounds):
+    emails = await seed_users(db, scale, "pomodoro", GARDEN_PLANTS)
+    tokens = {email: jwks.mint_token(email) for email in emails}
+
+    async def finish_session(email):
+        base, token = f"/users/{email}", tokens[email]
+        # What App.tsx sends when a work session ends.
+        await asyncio.gather(
+            rec.call("POST /users/{email}/plants/grow", "POST", f"{base}/plants/grow", token, json={"time": 25}),
+            rec.call("PATCH /users/{email}/money", "PATCH", f"{base}/money", token, json={"amount": 25}),
+            rec.call("POST /users/{email}/cycle-weather", "POST", f"{base}/cycle-weather", token),
+        )
+
+    for _ in range(rounds):
+        await asyncio.gather(*(finish_session(email) for email in emails))
+
+
+async def leaderboard(rec, db, jwks, scale, rounds):
+    emails = await seed_users(db, scale, "ranked")
+    token = jwks.mint_token(emails[0])
+
+    async def read(email):
+        cursor = None
+        for _ in range(rounds):
+            url = f"/users?limit=50&rank_for={email}"
+            if cursor:
+                url += f"&cursor={cursor}"
+            response = await rec.call("GET /users", "GET", url, token)
+            cursor = response.json().get("next_cursor")
+
+    await asyncio.gather(*(read(email) for email in emails))
+
+
+async def garden_visits(rec, db, jwks, scale, rounds):
+    emails = await seed_users(db, scale, "visited", GARDEN_PLANTS // 4)
+    token = jwks.mint_token(emails[0])
+    rng = random.Random(18)
+
+    async def visitor():
+        etags = {}
+        for _ in range(rounds):
+            email = rng.choice(emails)
+            headers = {"If-None-Match": etags[email]} if email in etags else None
+            response = await rec.call(
+                "GET /users/{email}/garden", "GET", f"/users/{email}/garden", token, headers=headers
+            )
+            if "etag" in response.headers:
+                etags[email] = response.headers["etag"]
+            name = email.split("@")[0]
+            await rec.call(
+                "GET /users/by-username/{username}/{tag}", "GET", f"/users/by-username/{name}/0000", token
+            )
+            await rec.call("GET /users/search", "GET", f"/users/search?q={name[:5]}", token)
+
+    await asyncio.gather(*(visitor() for _ in range(scale)))
+
+
+async def buy_sell_churn(rec, db, jwks, scale, rounds):
+    emails = await seed_users(db, scale, "churn")
+    tokens = {email: jwks.mint_token(email) for email in emails}
+
+    async def churn(email):
+        base, token = f"/users/{email}", tokens[email]
+        for _ in range(rounds):
+            response = await rec.call(
+                "POST /users/{email}/plants/batch",
+                "POST",
+                f"{base}/plants/batch",
+                token,
+                json={"plants": [{"plant_type": "rose", "x": i * PLANT_GAP, "y": 0} for i in range(5)]},
+            )
+            plant_ids = [p["plant_id"] for p in response.json()["plants"]]
+            await rec.call(
+                "PATCH /users/{email}/plants/{plant_id}/apply-water",
+                "PATCH",
+                f"{base}/plants/{plant_ids[0]}/apply-water",
+                token,
+            )
+            await rec.call(
+                "POST /users/{email}/plants/sell-batch",
+                "POST",
+                f"{base}/plants/sell-batch",
+                token,
+                json={"plant_ids": plant_ids},
+            )
+
+    await asyncio.gather(*(churn(email) for email in emails))
+
+
+SCENARIOS = {
+    "signup_burst": signup_burst,
+    "pomodoro_end": pomodoro_end,
+    "leaderboard": leaderboard,
+    "garden_visits": garden_visits,
+    "buy_sell_churn": buy_sell_churn,
+}
+
+
+def git(*args):
+    result = subprocess.run(["git", *args], capture_output=True, text=True, check=False)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+async def run(dsn, names, scale, rounds):
+    db = await asyncpg.connect(dsn)
+    report = {
+        "meta": {
+            "commit": git("rev-parse", "HEAD"),
+            "dirty": bool(git("status", "--porcelain", "--", ".")),
+            "started_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "postgres": await db.fetchval("SHOW server_version"),
+            "scale": scale,
+            "rounds": rounds,
+        },
+        "scenarios": {},
+    }
+
+    await clean(db)
+    async with app_client() as (client, jwks, _):
+        for name in names:
+            rec = Recorder(client)
+            start = time.perf_counter()
+            await SCENARIOS[name](rec, db, jwks, scale, rounds)
+            report["scenarios"][name] = rec.report(time.perf_counter() - start)
+            await clean(db)
+            print(f"{name:<16} {report['scenarios'][name]['throughput_rps']:>8} req/s")
+
+    await db.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, dest="scenarios")
+    parser.add_argument("--scale", type=int, default=50, help="users per scenario")
+    parser.add_argument("--rounds", type=int, default=5, help="repetitions per user")
+    parser.add_argument("--out", help="report path (default bench/results/<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    with local_postgres() as dsn:
+        os.environ["DATABASE_URL"] = dsn
+        report = asyncio.run(run(dsn, args.scenarios or list(SCENARIOS), args.scale, args.rounds))
+
+    out = args.out
+    if out is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+        out = RESULTS_DIR / f"{stamp}-{(report['meta']['commit'] or 'unknown')[:7]}.json"
+    write_results(report, out)
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
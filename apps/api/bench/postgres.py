@@ -0,0 +1,83 @@
+"""Throwaway Postgres cluster for benchmarks.
+
+    with local_postgres() as dsn:
+        os.environ["DATABASE_URL"] = dsn
+
+Uses DATABASE_URL as is when it is set. Otherwise runs `initdb` into a
+temporary directory, starts a server listening only on a Unix socket in
+that directory (fsync off, it is thrown away), creates the schema from
+bench/schema.sql and migrations/ and removes everything on exit. Server
+binaries are looked up in PG_BIN, then `pg_config --bindir`, then PATH.
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import asyncpg
+
+API_DIR = Path(__file__).resolve().parent.parent
+SCHEMA = API_DIR / "bench" / "schema.sql"
+MIGRATIONS = API_DIR / "migrations"
+
+
+def run(*args):
+    result = subprocess.run(args, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"{Path(args[0]).name} failed: {result.stderr.strip()}")
+
+
+def find_binary(name):
+    candidates = []
+    if os.environ.get("PG_BIN"):
+        candidates.append(Path(os.environ["PG_BIN"]) / name)
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        bindir = subprocess.run([pg_config, "--bindir"], capture_output=True, text=True, check=False).stdout.strip()
+        candidates.append(Path(bindir) / name)
+    found = shutil.which(name)
+    if found:
+        candidates.append(Path(found))
+    for candidate in candidates:
+        if candidate.is_file():
+            return str(candidate)
+    raise RuntimeError(f"{name} not found; set DATABASE_URL or PG_BIN")
+
+
+async def apply_schema(dsn):
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(SCHEMA.read_text())
+        # One file per call: CREATE INDEX CONCURRENTLY can't share an
+        # implicit transaction with other statements.
+        for path in sorted(MIGRATIONS.glob("*.sql")):
+            await conn.execute(path.read_text())
+    finally:
+        await conn.close()
+
+
+@contextmanager
+def local_postgres():
+    if os.environ.get("DATABASE_URL"):
+        yield os.environ["DATABASE_URL"]
+        return
+
+    initdb, pg_ctl = find_binary("initdb"), find_binary("pg_ctl")
+    root = Path(tempfile.mkdtemp(prefix="pomopatch-bench-"))
+    data = root / "data"
+    started = False
+    try:
+        run(initdb, "-D", str(data), "-U", "postgres", "--auth=trust", "--no-sync")
+        options = f"-k {root} -c listen_addresses='' -c fsync=off -c synchronous_commit=off -c max_connections=200"
+        run(pg_ctl, "-D", str(data), "-o", options, "-l", str(root / "postgres.log"), "-w", "start")
+        started = True
+        dsn = f"postgresql://postgres@/postgres?host={root}"
+        asyncio.run(apply_schema(dsn))
+        yield dsn
+    finally:
+        if started:
+            subprocess.run([pg_ctl, "-D", str(data), "-m", "immediate", "stop"], capture_output=True, check=False)
+        shutil.rmtree(root, ignore_errors=True)
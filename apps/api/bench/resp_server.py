@@ -0,0 +1,117 @@
+"""Local stand-in for a Redis server, enough for the read cache.
+
+    server = RESPServer().start()
+    os.environ["READ_CACHE_BACKEND"] = "redis"
+    os.environ["READ_CACHE_REDIS_URL"] = server.url
+
+Speaks RESP2 and implements PING, AUTH, SELECT, GET, SET (with EX/PX),
+DEL, DBSIZE and FLUSHDB on one keyspace. Runs its own event loop on a
+background thread, so it behaves like a separate server to the app.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter
+
+
+class RESPServer:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.commands = Counter()
+        self._data = {}
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._writers = set()
+        self._ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"redis://{self.host}:{self.port}/0"
+
+    def _get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _command(self, args):
+        name = args[0].upper().decode()
+        self.commands[name] += 1
+        if name == "PING":
+            return b"+PONG\r\n"
+        if name in ("AUTH", "SELECT"):
+            return b"+OK\r\n"
+        if name == "GET":
+            value = self._get(args[1])
+            if value is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == "SET":
+            expires = None
+            options = [a.upper() for a in args[3:]]
+            if b"PX" in options:
+                expires = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            elif b"EX" in options:
+                expires = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+            self._data[args[1]] = (args[2], expires)
+            return b"+OK\r\n"
+        if name == "DEL":
+            removed = sum(self._data.pop(key, None) is not None for key in args[1:])
+            return b":%d\r\n" % removed
+        if name == "DBSIZE":
+            return b":%d\r\n" % len(self._data)
+        if name == "FLUSHDB":
+            self._data.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                count = int(line[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self._command(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
@@ -0,0 +1,25 @@
+-- Base tables as the API expects them, for scratch benchmark databases.
+-- migrations/ is applied on top of this in order.
+CREATE TABLE IF NOT EXISTS "user" (
+    email text PRIMARY KEY,
+    username text UNIQUE NOT NULL,
+    money double precision NOT NULL DEFAULT 0,
+    plant_limit integer NOT NULL DEFAULT 25,
+    weather integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS plant (
+    plant_id serial PRIMARY KEY,
+    plant_type text NOT NULL,
+    plant_species text NOT NULL,
+    size double precision,
+    rarity integer NOT NULL,
+    x double precision,
+    y double precision,
+    stage integer NOT NULL DEFAULT 0,
+    growth_time_remaining integer,
+    fertilizer_remaining integer,
+    email text NOT NULL REFERENCES "user" (email)
+);
+
+CREATE INDEX IF NOT EXISTS plant_email_idx ON plant (email);
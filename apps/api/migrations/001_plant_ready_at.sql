@@ -0,0 +1,8 @@
+-- Server-side growth: a growing plant stores when its current stage completes.
+-- growth_time_remaining keeps the full duration so "is growing" checks still work;
+-- the remaining time is derived from ready_at on read.
+ALTER TABLE plant ADD COLUMN IF NOT EXISTS ready_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS plant_email_ready_at_idx
+    ON plant (email, ready_at)
+    WHERE ready_at IS NOT NULL;
@@ -0,0 +1,5 @@
+-- Leaderboard keyset pagination: ORDER BY money DESC, email DESC walks this
+-- index backwards, and (money, email) < (...) seeks straight to the cursor.
+-- CONCURRENTLY cannot run inside a transaction block; apply with plain psql -f.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_money_email_idx
+    ON "user" (money, email);
@@ -0,0 +1,13 @@
+-- Denormalized plant count so create_plant can enforce plant_limit with a
+-- single conditional UPDATE instead of COUNT(*) over the user's plants.
+-- Maintained by create_plant / sell_plant; check for drift with
+-- `python -m scripts.plant_count` (add --fix to repair).
+ALTER TABLE "user" ADD COLUMN IF NOT EXISTS plant_count integer NOT NULL DEFAULT 0;
+
+UPDATE "user" u
+SET plant_count = c.n
+FROM (SELECT email, COUNT(*) AS n FROM plant GROUP BY email) c
+WHERE u.email = c.email AND u.plant_count <> c.n;
+
+ALTER TABLE "user" DROP CONSTRAINT IF EXISTS user_plant_count_nonnegative;
+ALTER TABLE "user" ADD CONSTRAINT user_plant_count_nonnegative CHECK (plant_count >= 0);
@@ -0,0 +1,8 @@
+-- Garden version for ETags on GET /users/{email}/garden. Every statement
+-- that changes a user's row or plants sets it to the next value of one
+-- shared sequence, so a version is never reused, not even by a user that
+-- is deleted and created again under the same email.
+CREATE SEQUENCE IF NOT EXISTS garden_version_seq;
+
+ALTER TABLE "user"
+    ADD COLUMN IF NOT EXISTS garden_version bigint NOT NULL DEFAULT nextval('garden_version_seq');
@@ -0,0 +1,6 @@
+-- Username search before the in-process index has loaded:
+-- lower(username) COLLATE "C" LIKE 'prefix%' becomes a range scan on this
+-- index, and ORDER BY lower(username) COLLATE "C", email reads it in order.
+-- CONCURRENTLY cannot run inside a transaction block; apply with plain psql -f.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_username_lower_idx
+    ON "user" ((lower(username) COLLATE "C"), email);
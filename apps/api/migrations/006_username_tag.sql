@@ -0,0 +1,15 @@
+-- Next free #tag per base username, so create_user claims one with a single
+-- upsert instead of trying base#0000, base#0001, ... until an INSERT
+-- succeeds. The row lock on a base serializes concurrent signups for that
+-- name only. Backfilled from existing "name#NNNN" usernames.
+CREATE TABLE IF NOT EXISTS username_tag (
+    base text PRIMARY KEY,
+    next_tag integer NOT NULL
+);
+
+INSERT INTO username_tag (base, next_tag)
+SELECT substring(username FROM '^(.*)#[0-9]{4}$'), MAX(right(username, 4)::integer) + 1
+FROM "user"
+WHERE username ~ '#[0-9]{4}$'
+GROUP BY 1
+ON CONFLICT (base) DO UPDATE SET next_tag = GREATEST(username_tag.next_tag, EXCLUDED.next_tag);
@@ -0,0 +1,7 @@
+-- Spatial lookups within one garden: viewport reads (?bbox=), the overlap
+-- check on placement and the free-slot search all ask for a user's plants
+-- inside a box, which is a range scan over x on this index with y checked
+-- against the index entries, never the whole garden.
+-- CONCURRENTLY cannot run inside a transaction block; apply with plain psql -f.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS plant_email_x_y_idx
+    ON plant (email, x, y);
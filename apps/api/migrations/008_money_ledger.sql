@@ -0,0 +1,54 @@
+-- Append-only record of every balance change. "user".money stays the
+-- balance purchases are checked against; each statement that changes it
+-- appends its entry here in the same statement (app/db/queries.py).
+-- garden_version orders one user's entries as they were committed.
+-- recorded_at is when the balance changed, written_xid the transaction
+-- that changed it, which is what compaction goes by: unlike a timestamp,
+-- it tells whether every entry before it has committed.
+-- Entries outlive the user they belong to.
+CREATE TABLE IF NOT EXISTS money_ledger (
+    id bigserial PRIMARY KEY,
+    email text NOT NULL,
+    amount double precision NOT NULL,
+    balance double precision NOT NULL,
+    garden_version bigint NOT NULL,
+    reason text NOT NULL,
+    plant_ids integer[],
+    recorded_at timestamptz NOT NULL,
+    written_xid xid8 NOT NULL DEFAULT pg_current_xact_id()
+);
+
+CREATE INDEX IF NOT EXISTS money_ledger_email_version_idx
+    ON money_ledger (email, garden_version);
+CREATE INDEX IF NOT EXISTS money_ledger_written_xid_idx
+    ON money_ledger (written_xid);
+
+-- Running totals compacted from the ledger: the sum of a user's entries up
+-- to garden_version, and how far the balance recorded with the latest of
+-- them is from that sum. Amounts are double precision like "user".money,
+-- so a sum can be off by float rounding; drift of a hundredth of a coin or
+-- more means an entry is missing, or money changed without one.
+CREATE TABLE IF NOT EXISTS money_balance (
+    email text PRIMARY KEY,
+    balance double precision NOT NULL,
+    garden_version bigint NOT NULL,
+    entries bigint NOT NULL,
+    drift double precision NOT NULL,
+    compacted_at timestamptz NOT NULL
+);
+
+-- Entries written by transactions before compacted_to have been folded
+-- into money_balance.
+CREATE TABLE IF NOT EXISTS money_ledger_compaction (
+    singleton boolean PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    compacted_to xid8 NOT NULL
+);
+
+INSERT INTO money_ledger_compaction (compacted_to) VALUES ('0')
+ON CONFLICT DO NOTHING;
+
+-- Existing balances become each user's first entry.
+INSERT INTO money_ledger (email, amount, balance, garden_version, reason, recorded_at)
+SELECT email, money, money, garden_version, 'opening_balance', now()
+FROM "user"
+WHERE NOT EXISTS (SELECT 1 FROM money_ledger);
@@ -0,0 +1,6 @@
+-- Leaderboard reconciliation: each worker re-reads only the users whose
+-- garden_version moved since its last pass, a range scan on this index
+-- instead of reading the whole table every LEADERBOARD_RECONCILE_INTERVAL.
+-- CONCURRENTLY cannot run inside a transaction block; apply with plain psql -f.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_garden_version_idx
+    ON "user" (garden_version);
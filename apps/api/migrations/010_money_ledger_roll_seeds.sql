@@ -0,0 +1,5 @@
+-- The seed each plant of a purchase was rolled from, parallel to plant_ids,
+-- so any plant bought from now on can be replayed and its seed checked
+-- against the buyer's roll stream (app/core/rolls.py). NULL for other
+-- entries and for purchases made before this column existed.
+ALTER TABLE money_ledger ADD COLUMN IF NOT EXISTS roll_seeds bigint[];
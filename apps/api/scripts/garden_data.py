@@ -0,0 +1,192 @@
+"""Export users and gardens to gzip-compressed NDJSON or CSV files, and
+import them back.
+
+Run from apps/api:
+
+    DATABASE_URL=postgresql://... python -m scripts.garden_data export DIR \\
+        [--format ndjson|csv] [--email EMAIL ...] [--chunk-rows N] [--resume]
+    DATABASE_URL=postgresql://... python -m scripts.garden_data import DIR \\
+        [--email EMAIL ...]
+
+export writes "user" then plant rows in key order, --chunk-rows per file
+(user-000001.ndjson.gz, ...), optionally only the given users', and keeps
+DIR/manifest.json up to date after every file. Each run reads from one
+snapshot. If it stops part way, --resume carries on after the last file
+that was finished, from a new snapshot.
+
+import reads the files listed in DIR/manifest.json. Rows are checked as the
+API would check them (valid email, plant type, species for its rarity,
+position within the garden, no overlap with the owner's other plants, the
+owner's plant_limit); rejected rows are listed and make the exit status
+non-zero. Users and plants that already exist are left alone, so an
+interrupted import is finished by running it again. Imported users get a
+new garden_version and an opening_balance ledger entry; running API workers
+pick them up on their next leaderboard reconcile.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+
+import asyncpg
+
+from app.core.config import DATABASE_URL, EXPORT_CHUNK_ROWS, IMPORT_BATCH_ROWS
+from app.db import transfer
+
+MANIFEST = "manifest.json"
+# Rejected rows printed per file; the rest are only counted.
+MAX_REPORTED_ERRORS = 20
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".partial", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".partial", path)
+
+
+async def export_table(conn, directory, manifest, table):
+    state = manifest["tables"][table.name]
+    fmt, emails, chunk_rows = manifest["format"], manifest["emails"], manifest["chunk_rows"]
+    while not state["done"]:
+        until, rows = await transfer.chunk_end(conn, table, state["after"], chunk_rows, emails)
+        if until is not None:
+            name = f"{table.name}-{len(state['files']) + 1:06d}{transfer.FORMATS[fmt]}"
+            path = os.path.join(directory, name)
+            with gzip.open(path + ".partial", "wb") as f:
+                async def output(data):
+                    f.write(data)
+
+                await transfer.copy_out(conn, table, fmt, output, state["after"], until, emails)
+            os.replace(path + ".partial", path)
+            state["files"].append({"file": name, "rows": rows, "after": state["after"], "until": until})
+            state["rows"] += rows
+            state["after"] = until
+            print(f"{name}: {rows} row(s)")
+        state["done"] = rows < chunk_rows
+        save_manifest(directory, manifest)
+
+
+async def export(directory, fmt, emails, chunk_rows, resume):
+    if resume:
+        manifest = load_manifest(directory)
+    else:
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, MANIFEST)):
+            print(f"{directory} already holds an export; pass --resume to finish it")
+            return 1
+        manifest = {
+            "format": fmt,
+            "emails": emails,
+            "chunk_rows": chunk_rows,
+            "tables": {
+                name: {"after": table.start, "done": False, "rows": 0, "files": []}
+                for name, table in transfer.TABLES.items()
+            },
+        }
+        save_manifest(directory, manifest)
+
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            for table in transfer.TABLES.values():
+                await export_table(conn, directory, manifest, table)
+    finally:
+        await conn.close()
+
+    for name, state in manifest["tables"].items():
+        print(f"{name}: {state['rows']} row(s) in {len(state['files'])} file(s)")
+    return 0
+
+
+async def import_file(conn, directory, table, fmt, name, emails):
+    """(rows read, rejected, inserted) for one export file."""
+    read = rejected = inserted = 0
+    batch = []
+
+    def reject(where, reason):
+        nonlocal rejected
+        rejected += 1
+        if rejected <= MAX_REPORTED_ERRORS:
+            reason = " ".join(str(reason).split())
+            print(f"{name}:{where}: {reason}", file=sys.stderr)
+
+    async def flush():
+        nonlocal inserted
+        new, refused = await transfer.import_batch(conn, table, batch)
+        inserted += new
+        for plant_id, reason in refused:
+            reject(f"plant {plant_id}", reason)
+
+    for line, row in transfer.read_rows(os.path.join(directory, name), fmt):
+        if emails and row.get("email") not in emails:
+            continue
+        read += 1
+        try:
+            batch.append(transfer.parse_row(table, row))
+        except ValueError as e:
+            reject(line, e)
+            continue
+        if len(batch) >= IMPORT_BATCH_ROWS:
+            await flush()
+            batch = []
+    if batch:
+        await flush()
+    if rejected > MAX_REPORTED_ERRORS:
+        print(f"{name}: {rejected - MAX_REPORTED_ERRORS} more rejected row(s)", file=sys.stderr)
+    return read, rejected, inserted
+
+
+async def import_(directory, emails):
+    manifest = load_manifest(directory)
+    emails = set(emails) if emails else None
+    conn = await asyncpg.connect(DATABASE_URL)
+    total_rejected = 0
+    try:
+        # Users first: plants are only inserted for users that exist.
+        for name, table in transfer.TABLES.items():
+            for chunk in manifest["tables"][name]["files"]:
+                read, rejected, inserted = await import_file(
+                    conn, directory, table, manifest["format"], chunk["file"], emails
+                )
+                total_rejected += rejected
+                print(
+                    f"{chunk['file']}: {read} read, {rejected} rejected, {inserted} inserted, "
+                    f"{read - rejected - inserted} already present or without a user"
+                )
+    finally:
+        await conn.close()
+
+    print(f"{total_rejected} rejected row(s)")
+    return 1 if total_rejected else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export or import users and gardens.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--format", choices=sorted(transfer.FORMATS), default="ndjson")
+    export_parser.add_argument("--email", action="append", help="only this user (repeatable)")
+    export_parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    export_parser.add_argument("--resume", action="store_true")
+
+    import_parser = commands.add_parser("import")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--email", action="append", help="only this user (repeatable)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "export":
+        sys.exit(asyncio.run(export(args.directory, args.format, args.email, args.chunk_rows, args.resume)))
+    sys.exit(asyncio.run(import_(args.directory, args.email)))
@@ -0,0 +1,62 @@
+"""Check (and optionally repair) the denormalized `"user".plant_count`.
+
+Run from apps/api:
+
+    DATABASE_URL=postgresql://... python -m scripts.plant_count [--fix]
+
+Without --fix, lists users whose stored count differs from the number of
+plant rows and exits non-zero if there are any. --fix rewrites those counts
+under a row lock, so it is safe to run while the API is serving traffic.
+"""
+import asyncio
+import sys
+
+import asyncpg
+
+from app.core.config import DATABASE_URL
+
+MISMATCHES = """
+    SELECT u.email, u.plant_count, COALESCE(c.n, 0) AS actual
+    FROM "user" u
+    LEFT JOIN (SELECT email, COUNT(*) AS n FROM plant GROUP BY email) c
+        ON c.email = u.email
+    WHERE u.plant_count <> COALESCE(c.n, 0)
+    ORDER BY u.email
+"""
+
+LOCK_USER = 'SELECT 1 FROM "user" WHERE email = $1 FOR UPDATE'
+
+# Run after LOCK_USER in the same transaction: a new statement gets a fresh
+# snapshot, so the count includes anything committed while we waited.
+RECOUNT = """
+    UPDATE "user"
+    SET plant_count = (SELECT COUNT(*) FROM plant WHERE email = $1),
+        garden_version = nextval('garden_version_seq')
+    WHERE email = $1
+    RETURNING plant_count
+"""
+
+
+async def main(fix):
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        rows = await conn.fetch(MISMATCHES)
+        for row in rows:
+            print(f"{row['email']}: stored {row['plant_count']}, actual {row['actual']}")
+        print(f"{len(rows)} mismatched user(s)")
+
+        if not fix:
+            return 1 if rows else 0
+
+        for row in rows:
+            async with conn.transaction():
+                await conn.execute(LOCK_USER, row["email"])
+                count = await conn.fetchval(RECOUNT, row["email"])
+            print(f"{row['email']}: set to {count}")
+        return 0
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main("--fix" in sys.argv[1:])))
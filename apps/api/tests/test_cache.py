@@ -0,0 +1,192 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core import cache
+from app.core.cache import KEY_PREFIX, RedisBackend, RedisError, _RedisConnection
+
+
+class FakeRedis:
+    """Just enough of a Redis server for RedisBackend: GET, SET, DEL, AUTH
+    and SELECT over RESP2, with switches to drop or stall a connection."""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+        self.connections = 0
+        self.drop_next = False
+        self.stall_next = False
+        self._release = asyncio.Event()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    def close(self):
+        self._release.set()
+        self.server.close()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while line := await reader.readline():
+                args = []
+                for _ in range(int(line[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                self.commands.append(args)
+                if self.drop_next:
+                    self.drop_next = False
+                    return
+                if self.stall_next:
+                    self.stall_next = False
+                    await self._release.wait()
+                    return
+                writer.write(self._reply(args))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def _reply(self, args):
+        command = args[0].upper()
+        if command == b"GET":
+            value = self.data.get(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == b"SET":
+            self.data[args[1]] = args[2]
+            return b"+OK\r\n"
+        if command == b"DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args[1:])
+        if command in (b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        return b"-ERR unknown command\r\n"
+
+
+def read_reply(data):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await _RedisConnection(reader, None)._read_reply()
+
+    return asyncio.run(read())
+
+
+def test_reply_framing():
+    assert read_reply(b"+OK\r\n") == b"OK"
+    assert read_reply(b":42\r\n") == 42
+    assert read_reply(b"$-1\r\n") is None
+    assert read_reply(b"*-1\r\n") is None
+    # Bulk strings are read by length, so CRLF inside a value is data.
+    assert read_reply(b"$6\r\na\r\nb\r\n\r\n") == b"a\r\nb\r\n"
+    assert read_reply(b"*3\r\n$3\r\nfoo\r\n:1\r\n*1\r\n$0\r\n\r\n") == [b"foo", 1, [b""]]
+    with pytest.raises(RedisError, match="WRONGTYPE"):
+        read_reply(b"-WRONGTYPE not a string\r\n")
+    with pytest.raises(ConnectionError):
+        read_reply(b"")
+    with pytest.raises(RedisError):
+        read_reply(b"?what\r\n")
+
+
+def test_round_trip_and_delete():
+    async def run():
+        server = await FakeRedis().start()
+        backend = RedisBackend(f"redis://:s%40cret@127.0.0.1:{server.port}/3", 2, 1.0)
+        value = {"email": "a@x.com", "money": 12.5, "raw": b"\r\n$-1\r\n", "at": datetime(2025, 1, 2, tzinfo=timezone.utc)}
+        await backend.set("user:a@x.com", value, 1.5)
+        assert await backend.get("user:a@x.com") == value
+        assert await backend.get("user:b@x.com") is None
+        await backend.delete(["user:a@x.com", "user:b@x.com"])
+        assert await backend.get("user:a@x.com") is None
+        await backend.close()
+        server.close()
+        return server
+
+    server = asyncio.run(run())
+    assert server.commands[0] == [b"AUTH", b"s@cret"]
+    assert server.commands[1] == [b"SELECT", b"3"]
+    set_command = server.commands[2]
+    assert set_command[0] == b"SET" and set_command[1] == (KEY_PREFIX + "user:a@x.com").encode()
+    assert set_command[3:] == [b"PX", b"1500"]
+    # One connection, reused for every command.
+    assert server.connections == 1
+
+
+def test_error_reply_keeps_the_connection():
+    async def run():
+        server = await FakeRedis().start()
+        backend = RedisBackend(f"redis://127.0.0.1:{server.port}", 1, 1.0)
+        with pytest.raises(RedisError):
+            await backend.execute("NOPE")
+        assert await backend.get("missing") is None
+        assert not backend.stats()["down"]
+        await backend.close()
+        server.close()
+        return server.connections
+
+    assert asyncio.run(run()) == 1
+
+
+def test_dropped_connection_marks_down_then_reconnects():
+    async def run():
+        server = await FakeRedis().start()
+        backend = RedisBackend(f"redis://127.0.0.1:{server.port}", 1, 1.0)
+        await backend.set("k", 1, 10)
+        server.drop_next = True
+        with pytest.raises(ConnectionError):
+            await backend.get("k")
+        assert backend.stats()["down"]
+        # While marked down, calls fail without touching the server.
+        sent = len(server.commands)
+        with pytest.raises(ConnectionError, match="marked down"):
+            await backend.get("k")
+        assert len(server.commands) == sent
+
+        backend._down_until = 0.0
+        assert await backend.get("k") == 1
+        await backend.close()
+        server.close()
+        return server.connections
+
+    assert asyncio.run(run()) == 2
+
+
+def test_timed_out_connection_is_not_reused():
+    async def run():
+        server = await FakeRedis().start()
+        backend = RedisBackend(f"redis://127.0.0.1:{server.port}", 1, 0.2)
+        await backend.set("k", "first", 10)
+        server.stall_next = True
+        with pytest.raises(asyncio.TimeoutError):
+            await backend.get("k")
+        assert backend.stats()["idle_connections"] == 0
+
+        backend._down_until = 0.0
+        # A late reply to the stalled GET can't be read as this one's.
+        await backend.set("k", "second", 10)
+        assert await backend.get("k") == "second"
+        await backend.close()
+        server.close()
+        return server.connections
+
+    assert asyncio.run(run()) == 2
+
+
+def test_read_cache_falls_back_to_the_loader_when_redis_is_down():
+    async def run():
+        server = await FakeRedis().start()
+        read_cache = cache.ReadThroughCache(RedisBackend(f"redis://127.0.0.1:{server.port}", 1, 1.0), 60)
+        server.close()
+        await asyncio.sleep(0)
+
+        async def load():
+            return {"from": "postgres"}
+
+        assert await read_cache.get_or_load("user:a@x.com", load) == {"from": "postgres"}
+        return read_cache.stats()
+
+    stats = asyncio.run(run())
+    assert stats["loads"] == 1
+    assert stats["errors"] >= 1
@@ -0,0 +1,80 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from app.core.config import GROWTH_TIME_UNIT_SECONDS, STAGE_1_FERTILIZER_REQUIRED
+from app.core.growth import effective_plant, ready_at_after
+
+NOW = datetime(2025, 3, 4, 12, 0, tzinfo=UTC)
+UNIT = timedelta(seconds=GROWTH_TIME_UNIT_SECONDS)
+
+
+def plant(stage, ready_at, rarity=1):
+    return {
+        "plant_id": 1,
+        "stage": stage,
+        "rarity": rarity,
+        "growth_time_remaining": 30,
+        "fertilizer_remaining": None,
+        "ready_at": ready_at,
+    }
+
+
+def test_ready_at_after():
+    assert ready_at_after(30, NOW) == NOW + 30 * UNIT
+    assert ready_at_after(0, NOW) == NOW
+
+
+def test_without_ready_at_is_unchanged():
+    stored = plant(0, None)
+    assert effective_plant(stored, NOW) is stored
+
+
+@pytest.mark.parametrize("left, remaining", [
+    (30 * UNIT, 30),
+    # Partial units round up, so a plant never reads 0 before it's ready.
+    (29 * UNIT + timedelta(seconds=0.001), 30),
+    (timedelta(seconds=0.001), 1),
+    (UNIT, 1),
+    (UNIT + timedelta(seconds=0.001), 2),
+])
+def test_before_ready_at_counts_down(left, remaining):
+    stored = plant(0, NOW + left)
+    grown = effective_plant(stored, NOW)
+    assert grown["stage"] == 0
+    assert grown["growth_time_remaining"] == remaining
+    assert grown["ready_at"] == NOW + left
+    # The stored row is left alone.
+    assert stored["growth_time_remaining"] == 30
+
+
+@pytest.mark.parametrize("late", [timedelta(0), timedelta(seconds=0.001), 1000 * UNIT])
+@pytest.mark.parametrize("rarity", sorted(STAGE_1_FERTILIZER_REQUIRED))
+def test_stage_0_at_or_after_ready_at_sprouts(late, rarity):
+    grown = effective_plant(plant(0, NOW - late, rarity), NOW)
+    assert grown["stage"] == 1
+    assert grown["growth_time_remaining"] is None
+    assert grown["ready_at"] is None
+    assert grown["fertilizer_remaining"] == STAGE_1_FERTILIZER_REQUIRED[rarity]
+
+
+@pytest.mark.parametrize("late", [timedelta(0), 1000 * UNIT])
+def test_stage_1_at_or_after_ready_at_blooms(late):
+    grown = effective_plant(plant(1, NOW - late), NOW)
+    assert grown["stage"] == 2
+    assert grown["growth_time_remaining"] is None
+    assert grown["ready_at"] is None
+    assert grown["fertilizer_remaining"] is None
+
+
+def test_a_timer_advances_one_stage_only():
+    # Stage 1 starts its own timer once fertilized, so an overdue stage 0
+    # plant stops at stage 1 however late it is read.
+    assert effective_plant(plant(0, NOW - 10_000 * UNIT), NOW)["stage"] == 1
+
+
+def test_stage_2_stays_at_stage_2():
+    stored = plant(2, NOW - UNIT)
+    grown = effective_plant(stored, NOW)
+    assert grown == stored
+    assert grown is not stored
@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.core.cache import LocalBackend
+from app.core.idempotency import IdempotencyStore, is_final
+
+
+class Handler:
+    """An `execute` callable that records how often it ran."""
+
+    def __init__(self, status=200, body=b'{"ok":true}', raises=None, wait=None):
+        self.status = status
+        self.body = body
+        self.raises = raises
+        self.wait = wait
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.wait is not None:
+            await self.wait.wait()
+        if self.raises is not None:
+            raise self.raises
+        return Response(self.body, status_code=self.status, media_type="application/json")
+
+
+def store():
+    return IdempotencyStore(LocalBackend(100), 60)
+
+
+@pytest.mark.parametrize("status, final", [
+    (200, True), (201, True), (204, True),
+    (400, True), (402, True), (403, True), (404, True), (422, True),
+    (409, False), (429, False), (500, False), (503, False),
+])
+def test_is_final(status, final):
+    assert is_final(status) is final
+
+
+def test_replays_a_stored_response():
+    async def scenario():
+        idempotency = store()
+        handler = Handler(201, b'{"id":1}')
+        first, replayed = await idempotency.run("k", b"fp", handler)
+        assert not replayed
+        second, replayed = await idempotency.run("k", b"fp", handler)
+        assert replayed
+        assert handler.calls == 1
+        assert (second["status"], second["body"]) == (201, b'{"id":1}') == (first["status"], first["body"])
+        assert idempotency.replays == 1
+
+    asyncio.run(scenario())
+
+
+def test_replays_a_final_refusal():
+    async def scenario():
+        idempotency = store()
+        handler = Handler(raises=HTTPException(status_code=402, detail="Not enough money"))
+        outcome, _ = await idempotency.run("k", b"fp", handler)
+        assert outcome["status"] == 402
+        assert outcome["body"] == b'{"detail":"Not enough money"}'
+        _, replayed = await idempotency.run("k", b"fp", handler)
+        assert replayed and handler.calls == 1
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("status", [409, 429])
+def test_retryable_refusal_is_not_stored(status):
+    async def scenario():
+        idempotency = store()
+        handler = Handler(raises=HTTPException(status_code=status, detail="try again"))
+        outcome, replayed = await idempotency.run("k", b"fp", handler)
+        assert (outcome["status"], replayed) == (status, False)
+        handler.raises = None
+        outcome, replayed = await idempotency.run("k", b"fp", handler)
+        assert (outcome["status"], replayed) == (200, False)
+        assert handler.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_server_error_is_raised_and_not_stored():
+    async def scenario():
+        idempotency = store()
+        handler = Handler(raises=HTTPException(status_code=503, detail="down"))
+        with pytest.raises(HTTPException) as raised:
+            await idempotency.run("k", b"fp", handler)
+        assert raised.value.status_code == 503
+        assert idempotency.stats()["inflight"] == 0
+        handler.raises = None
+        _, replayed = await idempotency.run("k", b"fp", handler)
+        assert not replayed and handler.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_different_request_with_the_same_key():
+    async def scenario():
+        idempotency = store()
+        await idempotency.run("k", b"fp", Handler())
+        with pytest.raises(HTTPException) as raised:
+            await idempotency.run("k", b"other", Handler())
+        assert raised.value.status_code == 422
+        assert idempotency.mismatches == 1
+        # Keys are independent.
+        _, replayed = await idempotency.run("k2", b"other", Handler())
+        assert not replayed
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_requests_run_once():
+    async def scenario():
+        idempotency = store()
+        release = asyncio.Event()
+        handler = Handler(wait=release)
+        first = asyncio.create_task(idempotency.run("k", b"fp", handler))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(idempotency.run("k", b"fp", handler))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as raised:
+            await idempotency.run("k", b"other", handler)
+        assert raised.value.status_code == 422
+        release.set()
+        (_, first_replayed), (_, second_replayed) = await asyncio.gather(first, second)
+        assert (first_replayed, second_replayed) == (False, True)
+        assert handler.calls == 1
+        assert idempotency.coalesced == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_execution():
+    async def scenario():
+        idempotency = store()
+        release = asyncio.Event()
+        handler = Handler(wait=release)
+        first = asyncio.create_task(idempotency.run("k", b"fp", handler))
+        await asyncio.sleep(0)
+        first.cancel()
+        retry = asyncio.create_task(idempotency.run("k", b"fp", handler))
+        await asyncio.sleep(0)
+        release.set()
+        _, replayed = await retry
+        assert replayed and handler.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_backend_failures_fall_back_to_running():
+    class BrokenBackend(LocalBackend):
+        async def get(self, key):
+            raise ConnectionError("down")
+
+        async def set(self, key, value, ttl):
+            raise ConnectionError("down")
+
+    async def scenario():
+        idempotency = IdempotencyStore(BrokenBackend(10), 60)
+        handler = Handler()
+        for _ in range(2):
+            outcome, replayed = await idempotency.run("k", b"fp", handler)
+            assert (outcome["status"], replayed) == (200, False)
+        assert handler.calls == 2
+        assert idempotency.errors == 4
+
+    asyncio.run(scenario())
@@ -0,0 +1,124 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from app.core.leaderboard import CHANGED_SINCE, SNAPSHOT, Leaderboard, RankedSkipList
+
+
+def test_skip_list_matches_a_sorted_list():
+    rng = random.Random(13)
+    ranking = RankedSkipList()
+    keys = set()
+    for _ in range(3000):
+        if keys and rng.random() < 0.4:
+            key = rng.choice(sorted(keys))
+            ranking.remove(key)
+            keys.remove(key)
+        else:
+            key = (float(rng.randrange(50)), f"u{rng.randrange(10_000)}@x.com")
+            if key in keys:
+                continue
+            ranking.insert(key)
+            keys.add(key)
+        assert len(ranking) == len(keys)
+
+    descending = sorted(keys, reverse=True)
+    for start in (0, 1, len(descending) // 2, len(descending) - 1, len(descending)):
+        assert ranking.slice(start, 25) == descending[start:start + 25]
+    for _ in range(200):
+        probe = (float(rng.randrange(-1, 51)), f"u{rng.randrange(10_000)}@x.com")
+        assert ranking.count_before(probe) == sum(1 for key in descending if key > probe)
+
+
+def test_skip_list_orders_ties_by_email():
+    ranking = RankedSkipList()
+    for key in [(5.0, "b"), (5.0, "a"), (7.0, "c"), (5.0, "c")]:
+        ranking.insert(key)
+    assert ranking.slice(0, 10) == [(7.0, "c"), (5.0, "c"), (5.0, "b"), (5.0, "a")]
+    assert ranking.count_before((5.0, "b")) == 2
+    assert ranking.slice(4, 1) == []
+    assert ranking.slice(0, 0) == []
+
+
+def test_skip_list_remove_missing_key():
+    ranking = RankedSkipList()
+    ranking.insert((1.0, "a"))
+    with pytest.raises(KeyError):
+        ranking.remove((1.0, "b"))
+    assert len(ranking) == 1
+
+
+def row(email, money, username=None):
+    return {"email": email, "username": username or email.split("@")[0], "money": money}
+
+
+class FakeConnection:
+    """Answers the leaderboard's queries from a dict of rows and a version."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.version = 1
+        self.queries = []
+
+    async def fetchval(self, query):
+        return self.version
+
+    async def fetch(self, query, *args):
+        self.queries.append((query, args))
+        return list(self.rows.values())
+
+
+def test_incremental_reconcile_keeps_users_it_did_not_read():
+    board = Leaderboard(600)
+    board.load([row("a@x.com", 10.0), row("b@x.com", 20.0)])
+    board.reconcile([row("a@x.com", 30.0)], time.monotonic(), complete=False)
+    assert [r["email"] for r in board.top(10)] == ["a@x.com", "b@x.com"]
+    assert board.rank("a@x.com")["money"] == 30.0
+
+
+def test_complete_reconcile_drops_missing_users():
+    board = Leaderboard(600)
+    board.load([row("a@x.com", 10.0), row("b@x.com", 20.0)])
+    board.reconcile([row("a@x.com", 10.0)], time.monotonic())
+    assert board.rank("b@x.com") is None
+    assert len(board) == 1
+
+
+def test_reconcile_leaves_newer_local_writes_alone():
+    board = Leaderboard(600)
+    board.load([row("a@x.com", 10.0)])
+    started_at = time.monotonic()
+    board.record_balance("a@x.com", 50.0)
+    board.reconcile([row("a@x.com", 10.0)], started_at, complete=False)
+    assert board.rank("a@x.com")["money"] == 50.0
+
+
+def test_refresh_reads_changes_since_the_pass_before_last():
+    conn = FakeConnection({"a@x.com": row("a@x.com", 10.0)})
+    board = Leaderboard(600)
+    seen = []
+    board.on_snapshot(lambda rows, started_at, complete: seen.append(complete))
+
+    for version in (5, 8, 13, 21):
+        conn.version = version
+        asyncio.run(board.refresh(conn))
+
+    # Two full reads before there is a version to start from, then changes
+    # since the start of the pass before the previous one.
+    assert [query for query, _ in conn.queries] == [SNAPSHOT, SNAPSHOT, CHANGED_SINCE, CHANGED_SINCE]
+    assert [args for _, args in conn.queries[2:]] == [(5,), (8,)]
+    assert seen == [True, True, False, False]
+    assert board.full_reloads == 2
+
+
+def test_refresh_reloads_everything_on_schedule():
+    conn = FakeConnection({"a@x.com": row("a@x.com", 10.0), "b@x.com": row("b@x.com", 20.0)})
+    board = Leaderboard(0)
+    for _ in range(3):
+        asyncio.run(board.refresh(conn))
+    del conn.rows["b@x.com"]
+    asyncio.run(board.refresh(conn))
+    assert conn.queries[-1][0] == SNAPSHOT
+    assert board.rank("b@x.com") is None
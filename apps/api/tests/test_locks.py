@@ -0,0 +1,214 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
+
+from app.core import locks
+from app.core.locks import UserWriteLocks, UserWriteRoute
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_same_user_writes_run_one_at_a_time_in_arrival_order():
+    async def scenario():
+        write_locks = UserWriteLocks(10)
+        order = []
+        release = asyncio.Event()
+
+        async def write(n):
+            async with write_locks.hold("a@example.com"):
+                order.append(("start", n))
+                if n == 0:
+                    await release.wait()
+                order.append(("end", n))
+
+        tasks = [asyncio.create_task(write(n)) for n in range(4)]
+        await settle()
+        assert order == [("start", 0)]
+        assert write_locks.stats()["waiting"] == 3
+        release.set()
+        await asyncio.gather(*tasks)
+        assert order == [(step, n) for n in range(4) for step in ("start", "end")]
+
+        stats = write_locks.stats()
+        assert (stats["acquisitions"], stats["contended"], stats["max_queue_depth"]) == (4, 3, 3)
+        assert (stats["users_locked"], stats["waiting"]) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_different_users_do_not_wait_on_each_other():
+    async def scenario():
+        write_locks = UserWriteLocks(10)
+        release = asyncio.Event()
+
+        async def slow():
+            async with write_locks.hold("a@example.com"):
+                await release.wait()
+
+        task = asyncio.create_task(slow())
+        await settle()
+        async with write_locks.hold("b@example.com"):
+            assert write_locks.stats()["users_locked"] == 2
+        release.set()
+        await task
+        assert write_locks.contended == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_limit_refuses_with_429():
+    async def scenario():
+        write_locks = UserWriteLocks(2)
+        release = asyncio.Event()
+
+        async def write():
+            async with write_locks.hold("a@example.com"):
+                await release.wait()
+
+        tasks = [asyncio.create_task(write()) for _ in range(2)]
+        await settle()
+        with pytest.raises(HTTPException) as raised:
+            async with write_locks.hold("a@example.com"):
+                pass
+        assert raised.value.status_code == 429
+        assert write_locks.rejected == 1
+        release.set()
+        await asyncio.gather(*tasks)
+        # The queue drained, so the user can write again.
+        async with write_locks.hold("a@example.com"):
+            pass
+        assert write_locks.stats()["users_locked"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        write_locks = UserWriteLocks(10)
+        release = asyncio.Event()
+
+        async def write():
+            async with write_locks.hold("a@example.com"):
+                await release.wait()
+
+        holder = asyncio.create_task(write())
+        waiter = asyncio.create_task(write())
+        await settle()
+        waiter.cancel()
+        await settle()
+        assert write_locks.stats()["waiting"] == 0
+        release.set()
+        await holder
+        assert write_locks.stats()["users_locked"] == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """A write route on UserWriteRoute that records what happened when."""
+    events = []
+    release = asyncio.Event()
+    write_locks = UserWriteLocks(2)
+    monkeypatch.setattr(locks, "user_write_locks", write_locks)
+
+    async def authenticate(request):
+        token = request.headers.get("authorization")
+        if token is None:
+            raise HTTPException(status_code=401, detail="Missing authorization header")
+        events.append(("auth", token))
+        return token
+
+    monkeypatch.setattr(locks, "authenticate", authenticate)
+
+    async def get_db():
+        events.append(("db", write_locks.stats()["users_locked"]))
+        yield
+
+    router = APIRouter(route_class=UserWriteRoute)
+
+    @router.patch("/users/{email}/money")
+    async def change_money(email: str, conn=Depends(get_db)):
+        events.append(("write", email))
+        await release.wait()
+        return {"email": email}
+
+    @router.get("/users/{email}")
+    async def get_user(email: str):
+        return {"email": email}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.state.events = events
+    app.state.release = release
+    app.state.write_locks = write_locks
+    return app
+
+
+def client_for(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_route_locks_on_the_verified_email_before_dependencies(app):
+    async def scenario():
+        async with client_for(app) as client:
+            # Both path emails, one verified caller: the second request
+            # waits for the first.
+            first = asyncio.create_task(
+                client.patch("/users/a@example.com/money", headers={"authorization": "a@example.com"})
+            )
+            await settle()
+            second = asyncio.create_task(
+                client.patch("/users/b@example.com/money", headers={"authorization": "a@example.com"})
+            )
+            await settle()
+            # Queued behind the lock, before get_db ran for it.
+            assert app.state.write_locks.stats()["waiting"] == 1
+            assert [e for e in app.state.events if e[0] == "db"] == [("db", 1)]
+
+            app.state.release.set()
+            responses = await asyncio.gather(first, second)
+            assert [r.status_code for r in responses] == [200, 200]
+            assert app.state.events == [
+                ("auth", "a@example.com"), ("db", 1), ("write", "a@example.com"),
+                ("auth", "a@example.com"), ("db", 1), ("write", "b@example.com"),
+            ]
+
+    asyncio.run(scenario())
+
+
+def test_route_rejects_before_locking(app):
+    async def scenario():
+        async with client_for(app) as client:
+            response = await client.patch("/users/a@example.com/money")
+            assert response.status_code == 401
+            assert app.state.write_locks.acquisitions == 0
+
+            # Reads don't take the lock.
+            response = await client.get("/users/a@example.com")
+            assert response.status_code == 200
+            assert app.state.write_locks.acquisitions == 0
+
+    asyncio.run(scenario())
+
+
+def test_route_returns_429_past_the_queue_limit(app):
+    async def scenario():
+        async with client_for(app) as client:
+            headers = {"authorization": "a@example.com"}
+            pending = [
+                asyncio.create_task(client.patch("/users/a@example.com/money", headers=headers))
+                for _ in range(2)
+            ]
+            await settle()
+            response = await client.patch("/users/a@example.com/money", headers=headers)
+            assert response.status_code == 429
+            app.state.release.set()
+            assert [r.status_code for r in await asyncio.gather(*pending)] == [200, 200]
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+import statistics
+
+from app.core.config import PLANT_SPECIES, RARITY_PROBABILITIES
+from app.core.rolls import RARITIES, SEED_BITS, SIZE_MEAN, roll, roll_one, user_seed
+
+ROLLS = 200_000
+# Critical value of chi-square with 2 degrees of freedom at p = 0.001.
+CHI_SQUARE_CRITICAL = 13.816
+
+
+def chi_square(rarities):
+    total = len(rarities)
+    return sum(
+        (rarities.count(r) - total * RARITY_PROBABILITIES[r]) ** 2 / (total * RARITY_PROBABILITIES[r])
+        for r in RARITIES
+    )
+
+
+def stream(count, email="a@example.com"):
+    """Seeds for `count` plants, bought five at a time."""
+    return [user_seed(email, version, index) for version in range(count // 5) for index in range(5)]
+
+
+def test_chi_square_has_two_degrees_of_freedom():
+    assert len(RARITIES) == 3
+
+
+def test_rarity_split():
+    rarities, _, _ = roll(["rose"] * ROLLS, stream(ROLLS))
+    assert chi_square(rarities) < CHI_SQUARE_CRITICAL
+
+
+def test_species_match_rarity():
+    plant_types = list(PLANT_SPECIES) * 20_000
+    rarities, species, _ = roll(plant_types, stream(len(plant_types)))
+    seen = set()
+    for plant_type, rarity, name in zip(plant_types, rarities, species):
+        assert name in PLANT_SPECIES[plant_type][rarity]
+        seen.add((plant_type, rarity, name))
+    common = {(t, 0, name) for t, by_rarity in PLANT_SPECIES.items() for name in by_rarity[0]}
+    assert common <= seen
+
+
+def test_sizes():
+    _, _, sizes = roll(["rose"] * ROLLS, stream(ROLLS))
+    assert all(0.0 <= size <= 1.0 for size in sizes)
+    assert abs(statistics.fmean(sizes) - SIZE_MEAN) < 0.005
+    assert 0.19 < statistics.pstdev(sizes) < 0.2
+
+
+def test_roll_matches_roll_one():
+    plant_types = list(PLANT_SPECIES) * 100
+    seeds = stream(len(plant_types))
+    assert list(zip(*roll(plant_types, seeds))) == [
+        roll_one(plant_type, seed) for plant_type, seed in zip(plant_types, seeds)
+    ]
+
+
+def test_streams_are_per_user_and_purchase():
+    seeds = {
+        user_seed(email, version, index)
+        for email in ("a@example.com", "b@example.com")
+        for version in range(100)
+        for index in range(10)
+    }
+    assert len(seeds) == 2000
+    assert user_seed("a@example.com", 7, 3) == user_seed("a@example.com", 7, 3)
+
+
+def test_seeds_fit_a_javascript_number():
+    assert all(0 <= seed < 2**SEED_BITS for seed in stream(10_000))
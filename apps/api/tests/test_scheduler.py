@@ -0,0 +1,83 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.scheduler import CronSchedule
+
+
+def at(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def brute_force_next(schedule, moment):
+    moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    while True:
+        if (
+            moment.minute in schedule.minutes
+            and moment.hour in schedule.hours
+            and moment.month in schedule.months
+            and schedule._day_matches(moment)
+        ):
+            return moment
+        moment += timedelta(minutes=1)
+
+
+@pytest.mark.parametrize("expression, after, expected", [
+    ("*/15 * * * *", at(2025, 3, 4, 10, 7), at(2025, 3, 4, 10, 15)),
+    # Strictly after: a matching minute moves on to the next one.
+    ("*/15 * * * *", at(2025, 3, 4, 10, 15), at(2025, 3, 4, 10, 30)),
+    ("*/15 * * * *", at(2025, 3, 4, 10, 14, 59, 999), at(2025, 3, 4, 10, 15)),
+    ("5,10-12 * * * *", at(2025, 3, 4, 10, 10), at(2025, 3, 4, 10, 11)),
+    ("5,10-12 * * * *", at(2025, 3, 4, 10, 12), at(2025, 3, 4, 11, 5)),
+    ("30 2 * * *", at(2025, 12, 31, 3, 0), at(2026, 1, 1, 2, 30)),
+    ("0 0 1 1 *", at(2025, 6, 1), at(2026, 1, 1)),
+    ("0 0 29 2 *", at(2025, 3, 1), at(2028, 2, 29)),
+    # 2025-03-04 is a Tuesday; 0 and 7 are both Sunday.
+    ("0 9 * * 0", at(2025, 3, 4), at(2025, 3, 9, 9)),
+    ("0 9 * * 7", at(2025, 3, 4), at(2025, 3, 9, 9)),
+    ("0 9 * * 1-5/2", at(2025, 3, 4, 10), at(2025, 3, 5, 9)),
+    # Both day fields restricted: either one matching is enough.
+    ("0 12 15 * 5", at(2025, 3, 4), at(2025, 3, 7, 12)),
+    ("0 12 5 * 0", at(2025, 3, 4), at(2025, 3, 5, 12)),
+    # Only one restricted: it alone decides.
+    ("0 12 15 * *", at(2025, 3, 4), at(2025, 3, 15, 12)),
+    ("10/20 * * * *", at(2025, 3, 4, 10, 51), at(2025, 3, 4, 11, 10)),
+])
+def test_next_after(expression, after, expected):
+    assert CronSchedule(expression).next_after(after) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "* * * *",
+    "* * * * * *",
+    "60 * * * *",
+    "* 24 * * *",
+    "* * 0 * *",
+    "* * * 13 *",
+    "* * * * 8",
+    "*/0 * * * *",
+    "5-3 * * * *",
+    "x * * * *",
+    # Valid fields, but no such day.
+    "0 0 30 2 *",
+    "0 0 31 4,6,9,11 *",
+])
+def test_rejects(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+@pytest.mark.parametrize("expression", [
+    "*/7 */5 * * *",
+    "0 0 13 * 5",
+    "15 3 1,15 */2 *",
+    "0 22 * * 1-5",
+    "*/30 9-17 * 1,7 0,6",
+])
+def test_matches_brute_force(expression):
+    schedule = CronSchedule(expression)
+    rng = random.Random(expression)
+    for _ in range(50):
+        moment = at(2024, 1, 1) + timedelta(minutes=rng.randrange(3 * 366 * 24 * 60))
+        assert schedule.next_after(moment) == brute_force_next(schedule, moment)
@@ -0,0 +1,146 @@
+import itertools
+import random
+
+import pytest
+
+from app.core.search import (
+    SEPARATOR,
+    UsernameIndex,
+    base_username,
+    single_edit_variants,
+)
+
+
+def damerau(a, b):
+    """Optimal string alignment distance, the brute-force reference."""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(
+                d[i - 1][j] + 1,
+                d[i][j - 1] + 1,
+                d[i - 1][j - 1] + (a[i - 1] != b[j - 1]),
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[len(a)][len(b)]
+
+
+def is_fuzzy(query, base):
+    # Some prefix of `base` is one edit from `query`, other than an edit
+    # of its last character; swapping the last two counts as a typo.
+    swapped = query[:-2] + query[-1] + query[-2]
+    return not base.startswith(query) and any(
+        damerau(query, base[:n]) == 1 and (base[:n].endswith(query[-1]) or base[:n] == swapped)
+        for n in range(len(base) + 1)
+    )
+
+
+def expected(rows, query):
+    query = base_username(query)
+    keys = sorted((base_username(row["username"]) + SEPARATOR + row["email"], row) for row in rows)
+    prefix = [row["email"] for key, row in keys if key.startswith(query)]
+    fuzzy = [row["email"] for key, row in keys if is_fuzzy(query, key.split(SEPARATOR)[0])]
+    return prefix, fuzzy
+
+
+def random_rows(rng, count, letters="abcd"):
+    return [
+        {
+            "email": f"u{i}@example.com",
+            "username": "".join(rng.choice(letters) for _ in range(rng.randrange(1, 7))) + f"#{i:04d}",
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("query", ["abc", "aab", "abb", "abab", "ba", "abcde"])
+def test_variants_are_one_edit_away(query):
+    alphabet = "abcde"
+    variants = single_edit_variants(query, alphabet)
+    swapped = query[:-2] + query[-1] + query[-2]
+    candidates = (
+        "".join(chars)
+        for length in range(len(query) - 1, len(query) + 2)
+        for chars in itertools.product(alphabet, repeat=length)
+    )
+    brute_force = {
+        v for v in candidates
+        if damerau(query, v) == 1 and (v.endswith(query[-1]) or v == swapped)
+    }
+    assert variants == brute_force
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(14)
+    rows = random_rows(rng, 300)
+    index = UsernameIndex(10)
+    index.load(rows)
+    for _ in range(200):
+        query = "".join(rng.choice("abcde") for _ in range(rng.randrange(3, 6)))
+        prefix, fuzzy = expected(rows, query)
+        results, more = index.search(query, 1000)
+        assert not more
+        assert [r["email"] for r in results if r["match"] == "prefix"] == prefix
+        assert [r["email"] for r in results if r["match"] == "fuzzy"] == fuzzy
+        assert [r["match"] for r in results] == ["prefix"] * len(prefix) + ["fuzzy"] * len(fuzzy)
+
+
+def test_pages_add_up_to_the_full_result():
+    rng = random.Random(5)
+    rows = random_rows(rng, 400, "ab")
+    index = UsernameIndex(10)
+    index.load(rows)
+    for query in ("aba", "abb", "bab"):
+        everything, _ = index.search(query, 1000)
+        paged, offset = [], 0
+        while True:
+            page, more = index.search(query, 7, offset)
+            paged += page
+            offset += len(page)
+            if not more:
+                break
+        assert paged == everything
+
+
+def test_exact_base_comes_first_and_tags_are_ignored():
+    index = UsernameIndex(10)
+    index.load([
+        {"email": "b@example.com", "username": "Rosebud#0002"},
+        {"email": "a@example.com", "username": "rose#0001"},
+        {"email": "c@example.com", "username": "rise#0003"},
+    ])
+    results, _ = index.search("ROSE#9999", 10)
+    assert [(r["email"], r["match"]) for r in results] == [
+        ("a@example.com", "prefix"),
+        ("b@example.com", "prefix"),
+        ("c@example.com", "fuzzy"),
+    ]
+
+
+def test_fuzzy_query_length_bounds():
+    index = UsernameIndex(10)
+    index.load([{"email": "a@example.com", "username": "abcdefgh#0001"}])
+    assert index.search("abd", 10, fuzzy_min_length=3)[0]
+    assert not index.search("abd", 10, fuzzy_min_length=4)[0]
+    assert index.search("abcdefxh", 10, fuzzy_max_length=8)[0]
+    assert not index.search("abcdefxh", 10, fuzzy_max_length=7)[0]
+
+
+def test_alphabet_is_capped_to_the_most_common_characters():
+    index = UsernameIndex(3)
+    index.load([
+        {"email": "a@example.com", "username": "aaab#0001"},
+        {"email": "b@example.com", "username": "bbbc#0002"},
+        {"email": "z@example.com", "username": "zq#0003"},
+    ])
+    assert sorted(index.alphabet()) == ["a", "b", "c"]
+    # "zq" is a substitution away from "xq", but neither z nor q is in
+    # the alphabet.
+    assert index.search("xq", 10, fuzzy_min_length=2)[0] == []
+
+    index.remove("a@example.com")
+    index.remove("b@example.com")
+    assert sorted(index.alphabet()) == ["q", "z"]
+    index.add("y@example.com", "qqqq")
+    assert index.alphabet()[0] == "q"
@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import jwt
+import pytest
+
+from app.core import security
+from app.core.security import JWKSCache, TokenCache
+from bench.jwks_server import JWKSServer
+
+
+class Clock:
+    """Stands in for the `time` module inside app.core.security."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return time.perf_counter()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(security, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def jwks_server():
+    server = JWKSServer().start()
+    yield server
+    server.stop()
+
+
+def test_token_expires_at_exp(clock):
+    cache = TokenCache(10)
+    cache.put("token", "a@example.com", clock.now + 60)
+    assert cache.get("token") == "a@example.com"
+    clock.now += 59.9
+    assert cache.get("token") == "a@example.com"
+    clock.now += 0.1
+    assert cache.get("token") is None
+    assert cache.stats()["size"] == 0
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_token_without_exp_is_not_cached(clock):
+    cache = TokenCache(10)
+    cache.put("token", "a@example.com", None)
+    assert cache.get("token") is None
+    disabled = TokenCache(0)
+    disabled.put("token", "a@example.com", clock.now + 60)
+    assert disabled.get("token") is None
+
+
+def test_token_cache_evicts_least_recently_used(clock):
+    cache = TokenCache(2)
+    cache.put("a", "a@example.com", clock.now + 60)
+    cache.put("b", "b@example.com", clock.now + 60)
+    assert cache.get("a") == "a@example.com"
+    cache.put("c", "c@example.com", clock.now + 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == "a@example.com"
+    assert cache.get("c") == "c@example.com"
+    assert cache.evictions == 1
+
+
+def test_token_cache_purges_expired(clock):
+    cache = TokenCache(10)
+    cache.put("a", "a@example.com", clock.now + 10)
+    cache.put("b", "b@example.com", clock.now + 60)
+    clock.now += 30
+    assert cache.purge_expired() == 1
+    assert cache.stats()["size"] == 1
+
+
+def test_unknown_kid_refreshes_the_keys(jwks_server):
+    async def scenario():
+        cache = JWKSCache(jwks_server.url, 3600, 0)
+        await cache.refresh()
+        first_kid = jwks_server.kid
+        assert await cache.get_signing_key(first_kid)
+        jwks_server.rotate_key()
+        key = await cache.get_signing_key(jwks_server.kid)
+        token = jwks_server.mint_token("a@example.com")
+        assert jwt.decode(token, key.key, algorithms=["RS256"])["email"] == "a@example.com"
+        assert cache.fetches == 2
+        # A known kid never fetches.
+        await cache.get_signing_key(jwks_server.kid)
+        assert cache.fetches == 2
+
+    asyncio.run(scenario())
+
+
+def test_unknown_kid_refresh_is_throttled(jwks_server, clock):
+    async def scenario():
+        cache = JWKSCache(jwks_server.url, 3600, 30)
+        await cache.refresh()
+        with pytest.raises(jwt.InvalidTokenError):
+            await cache.get_signing_key("forged")
+        assert cache.fetches == 1
+
+        jwks_server.rotate_key()
+        clock.now += 29
+        with pytest.raises(jwt.InvalidTokenError):
+            await cache.get_signing_key(jwks_server.kid)
+        assert cache.fetches == 1
+
+        clock.now += 1
+        assert await cache.get_signing_key(jwks_server.kid)
+        assert cache.fetches == 2
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_unknown_kids_fetch_once(jwks_server):
+    async def scenario():
+        cache = JWKSCache(jwks_server.url, 3600, 0)
+        await asyncio.gather(*(cache.get_signing_key(jwks_server.kid) for _ in range(5)))
+        assert cache.fetches == 1
+
+    asyncio.run(scenario())
+
+
+def test_verified_token_is_served_from_the_cache(jwks_server, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(security, "jwks_cache", JWKSCache(jwks_server.url, 3600, 0))
+        monkeypatch.setattr(security, "token_cache", TokenCache(10))
+        token = jwks_server.mint_token("a@example.com")
+        assert await security._verify_clerk_token(f"Bearer {token}") == "a@example.com"
+        requests = jwks_server.requests
+        assert await security._verify_clerk_token(f"Bearer {token}") == "a@example.com"
+        assert jwks_server.requests == requests
+        assert security.token_cache.hits == 1
+
+        expired = jwks_server.mint_token("a@example.com", ttl=-10)
+        with pytest.raises(security.HTTPException) as raised:
+            await security._verify_clerk_token(f"Bearer {expired}")
+        assert raised.value.status_code == 401
+        assert security.token_cache.get(expired) is None
+
+    asyncio.run(scenario())
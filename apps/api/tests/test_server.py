@@ -0,0 +1,97 @@
+import pytest
+
+from app import server
+
+
+@pytest.fixture
+def shared_idempotency(monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY_TTL", 3600)
+    monkeypatch.setattr(server, "IDEMPOTENCY_BACKEND", "redis")
+
+
+@pytest.fixture
+def local_idempotency(monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY_TTL", 3600)
+    monkeypatch.setattr(server, "IDEMPOTENCY_BACKEND", "local")
+
+
+def cgroup_v2(tmp_path, cpu_max):
+    (tmp_path / "cpu.max").write_text(cpu_max + "\n")
+    return tmp_path
+
+
+def cgroup_v1(tmp_path, quota, period="100000"):
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text(quota + "\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text(period + "\n")
+    return tmp_path
+
+
+@pytest.mark.parametrize("cpu_max, quota", [
+    ("max 100000", None),
+    ("200000 100000", 2.0),
+    ("150000 100000", 1.5),
+    ("50000 100000", 0.5),
+])
+def test_cgroup_v2_quota(tmp_path, cpu_max, quota):
+    assert server.cgroup_cpu_quota(cgroup_v2(tmp_path, cpu_max)) == quota
+
+
+@pytest.mark.parametrize("quota_us, quota", [("-1", None), ("300000", 3.0)])
+def test_cgroup_v1_quota(tmp_path, quota_us, quota):
+    assert server.cgroup_cpu_quota(cgroup_v1(tmp_path, quota_us)) == quota
+
+
+def test_no_cgroup(tmp_path):
+    assert server.cgroup_cpu_quota(tmp_path) is None
+
+
+def test_cpu_limit_rounds_the_quota_up_and_caps_at_the_cpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(server.os, "process_cpu_count", lambda: 8)
+    assert server.cpu_limit(cgroup_v2(tmp_path, "150000 100000")) == 2
+    assert server.cpu_limit(cgroup_v2(tmp_path, "50000 100000")) == 1
+    assert server.cpu_limit(cgroup_v2(tmp_path, "max 100000")) == 8
+    assert server.cpu_limit(cgroup_v2(tmp_path, "1600000 100000")) == 8
+
+
+def test_worker_count(tmp_path, monkeypatch, shared_idempotency):
+    monkeypatch.setattr(server.os, "process_cpu_count", lambda: 8)
+    root = cgroup_v2(tmp_path, "400000 100000")
+    assert server.worker_count(0, root) == 4
+    assert server.worker_count(3, root) == 3
+
+
+def test_worker_count_stays_at_one_with_a_local_idempotency_store(tmp_path, monkeypatch, local_idempotency):
+    monkeypatch.setattr(server.os, "process_cpu_count", lambda: 8)
+    root = cgroup_v2(tmp_path, "400000 100000")
+    assert server.worker_count(0, root) == 1
+    # An explicit count is left for check_workers to refuse.
+    assert server.worker_count(3, root) == 3
+
+
+def test_check_workers(monkeypatch, local_idempotency):
+    assert server.check_workers(1) is None
+    assert "IDEMPOTENCY_BACKEND=redis" in server.check_workers(2)
+    assert "got -1" in server.check_workers(-1)
+
+    monkeypatch.setattr(server, "IDEMPOTENCY_BACKEND", "redis")
+    assert server.check_workers(4) is None
+    monkeypatch.setattr(server, "IDEMPOTENCY_BACKEND", "local")
+    monkeypatch.setattr(server, "IDEMPOTENCY_TTL", 0)
+    assert server.check_workers(4) is None
+
+
+def test_worker_warnings(monkeypatch):
+    monkeypatch.setattr(server, "GARDEN_EVENTS_NOTIFY", True)
+    monkeypatch.setattr(server, "READ_CACHE_BACKEND", "local")
+    monkeypatch.setattr(server, "READ_CACHE_TTL", 30)
+    assert server.worker_warnings(1) == []
+    warnings = server.worker_warnings(2)
+    assert len(warnings) == 2
+    assert "write queues" in warnings[0]
+    assert "leaderboard" in warnings[1]
+
+    monkeypatch.setattr(server, "GARDEN_EVENTS_NOTIFY", False)
+    assert len(server.worker_warnings(2)) == 4
+    monkeypatch.setattr(server, "READ_CACHE_BACKEND", "redis")
+    assert len(server.worker_warnings(2)) == 3
@@ -0,0 +1,103 @@
+import math
+import random
+
+import pytest
+
+from app.core.spatial import first_overlap, nearest_free, overlaps, parse_bbox
+
+SPACING = 10
+RADIUS = 40
+EXTENT = 100
+
+
+def brute_force_first_overlap(positions):
+    for j in range(len(positions)):
+        for i in range(j):
+            if overlaps(*positions[i], *positions[j], SPACING):
+                return i, j
+    return None
+
+
+def is_free(x, y, occupied):
+    return not any(overlaps(x, y, ox, oy, SPACING) for ox, oy in occupied)
+
+
+def test_first_overlap():
+    assert first_overlap([], SPACING) is None
+    assert first_overlap([(0, 0)], SPACING) is None
+    # Exactly SPACING apart on one axis is touching, not overlapping.
+    assert first_overlap([(0, 0), (10, 0), (0, 10), (-10, -10)], SPACING) is None
+    assert first_overlap([(0, 0), (50, 50), (9.9, 0)], SPACING) == (0, 2)
+    assert first_overlap([(0, 0), (50, 50), (45, 45), (1, 1)], SPACING) == (1, 2)
+    # Across a grid cell boundary.
+    assert first_overlap([(9.99, 9.99), (10.01, 10.01)], SPACING) == (0, 1)
+    assert first_overlap([(-0.5, 0), (0.5, 0)], SPACING) == (0, 1)
+
+
+def test_first_overlap_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(300):
+        positions = [(rng.uniform(-60, 60), rng.uniform(-60, 60)) for _ in range(rng.randrange(2, 12))]
+        assert first_overlap(positions, SPACING) == brute_force_first_overlap(positions)
+
+
+def test_nearest_free_keeps_a_free_position():
+    assert nearest_free(3, 4, [(30, 30)], SPACING, RADIUS, EXTENT) == (3, 4)
+
+
+def test_nearest_free_moves_off_a_plant():
+    x, y = nearest_free(2, 0, [(0, 0)], SPACING, RADIUS, EXTENT)
+    assert (x, y) == (10, 0)
+    assert is_free(x, y, [(0, 0)])
+
+
+def test_nearest_free_stays_inside_the_garden():
+    x, y = nearest_free(EXTENT, EXTENT, [(EXTENT - 2, EXTENT - 2)], SPACING, RADIUS, EXTENT)
+    assert -EXTENT <= x <= EXTENT and -EXTENT <= y <= EXTENT
+    assert is_free(x, y, [(EXTENT - 2, EXTENT - 2)])
+
+
+def test_nearest_free_none_within_radius():
+    occupied = [(x, y) for x in range(-60, 61, 10) for y in range(-60, 61, 10)]
+    assert nearest_free(0, 0, occupied, SPACING, RADIUS, EXTENT) is None
+
+
+def test_nearest_free_is_free_and_no_farther_than_a_grid_search():
+    rng = random.Random(11)
+    step = 0.5
+    for _ in range(60):
+        x, y = rng.uniform(-EXTENT, EXTENT), rng.uniform(-EXTENT, EXTENT)
+        occupied = [(x + rng.uniform(-35, 35), y + rng.uniform(-35, 35)) for _ in range(rng.randrange(1, 25))]
+        found = nearest_free(x, y, occupied, SPACING, RADIUS, EXTENT)
+
+        candidates = [
+            (x + i * step, y + j * step)
+            for i in range(-int(RADIUS / step), int(RADIUS / step) + 1)
+            for j in range(-int(RADIUS / step), int(RADIUS / step) + 1)
+        ]
+        distances = [
+            math.hypot(cx - x, cy - y)
+            for cx, cy in candidates
+            if abs(cx) <= EXTENT and abs(cy) <= EXTENT
+            and math.hypot(cx - x, cy - y) <= RADIUS
+            and is_free(cx, cy, occupied)
+        ]
+        if found is None:
+            assert not distances
+            continue
+        fx, fy = found
+        assert is_free(fx, fy, occupied)
+        assert abs(fx) <= EXTENT and abs(fy) <= EXTENT
+        assert math.hypot(fx - x, fy - y) <= RADIUS
+        if distances:
+            assert math.hypot(fx - x, fy - y) <= min(distances) + 1e-9
+
+
+@pytest.mark.parametrize("text", ["1,2,3", "a,b,c,d", "0,0,nan,1", "5,0,1,1", "0,0,inf,1"])
+def test_parse_bbox_rejects(text):
+    with pytest.raises(ValueError):
+        parse_bbox(text)
+
+
+def test_parse_bbox():
+    assert parse_bbox("-1,-2.5,3,4") == (-1.0, -2.5, 3.0, 4.0)
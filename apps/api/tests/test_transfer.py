@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from app.core.spatial import overlaps
+from app.db.transfer import TABLES, overlapping_in_batch, parse_row
+
+SPACING = 10
+
+
+def plant(plant_id, email, x, y):
+    return {"plant_id": plant_id, "email": email, "x": x, "y": y}
+
+
+def test_later_overlapping_plants_are_refused():
+    records = [
+        plant(1, "a@example.com", 0, 0),
+        plant(2, "a@example.com", 5, 5),
+        plant(3, "a@example.com", 10, 0),
+        # Another owner's garden is separate.
+        plant(4, "b@example.com", 0, 0),
+        # Overlaps 2, which was refused, but also 1.
+        plant(5, "a@example.com", 2, 9),
+    ]
+    kept, refused = overlapping_in_batch(records, SPACING)
+    assert [r["plant_id"] for r in kept] == [1, 3, 4]
+    assert [plant_id for plant_id, _ in refused] == [2, 5]
+    assert "plant 1" in refused[0][1]
+
+
+def test_kept_plants_never_overlap():
+    rng = random.Random(25)
+    records = [
+        plant(i, rng.choice(["a@example.com", "b@example.com"]), rng.uniform(0, 200), rng.uniform(0, 200))
+        for i in range(500)
+    ]
+    kept, refused = overlapping_in_batch(records, SPACING)
+    assert len(kept) + len(refused) == len(records)
+    for i, first in enumerate(kept):
+        for second in kept[i + 1:]:
+            assert first["email"] != second["email"] or not overlaps(
+                first["x"], first["y"], second["x"], second["y"], SPACING
+            )
+    # Each refused plant overlaps a kept plant of its owner's with a lower id.
+    for plant_id, _ in refused:
+        record = records[plant_id]
+        assert any(
+            other["email"] == record["email"] and other["plant_id"] < plant_id
+            and overlaps(record["x"], record["y"], other["x"], other["y"], SPACING)
+            for other in kept
+        )
+
+
+@pytest.mark.parametrize("change, message", [
+    ({"plant_type": "tulip"}, "plant_type"),
+    ({"plant_species": "ancient_fruit"}, "is not a rose of rarity 0"),
+    ({"x": 1e9}, "x"),
+    ({"stage": 3}, "stage"),
+])
+def test_parse_row_checks_plants_as_the_api_does(change, message):
+    row = {
+        "plant_id": "1", "plant_type": "rose", "plant_species": "red_rose", "size": "0.5",
+        "rarity": "0", "x": "0", "y": "0", "stage": "0", "email": "a@example.com",
+    }
+    assert parse_row(TABLES["plant"], row)["plant_id"] == 1
+    with pytest.raises(ValueError, match=message):
+        parse_row(TABLES["plant"], {**row, **change})
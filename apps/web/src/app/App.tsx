@@ -1,6 +1,13 @@
 import { useState, useEffect, memo, useRef } from "react";
 import "./globals.css";
-import { apiService, Plant, UserData } from "../services/api";
+import {
+  apiService,
+  GardenUserFields,
+  LeaderboardEntry,
+  Plant,
+  UserData,
+  UserSearchResult,
+} from "../services/api";
 
 type SeedType = "Berry" | "Fungi" | "Rose";
 type ToolType = "Spade" | "WateringCan" | "Fertilizer" | "Backpack";
@@ -181,7 +188,14 @@ function App({
   const [isHoveringPlantCount, setIsHoveringPlantCount] = useState(false);
   const [lightning, setLightning] = useState<Lightning | null>(null);
   const [showLeaderboard, setShowLeaderboard] = useState(false);
-  const [leaderboardUsers, setLeaderboardUsers] = useState<UserData[]>([]);
+  const [leaderboardUsers, setLeaderboardUsers] = useState<LeaderboardEntry[]>(
+    []
+  );
+  const [leaderboardCursor, setLeaderboardCursor] = useState<string | null>(
+    null
+  );
+  const [isLoadingMoreLeaderboard, setIsLoadingMoreLeaderboard] =
+    useState(false);
   const [isLoadingLeaderboard, setIsLoadingLeaderboard] = useState(false);
   const [displayedUsersCount, setDisplayedUsersCount] = useState(20);
   const leaderboardScrollRef = useRef<HTMLDivElement>(null);
@@ -194,6 +208,9 @@ function App({
   const [searchTag, setSearchTag] = useState("");
   const [isSearching, setIsSearching] = useState(false);
   const [searchNotFound, setSearchNotFound] = useState(false);
+  const [searchSuggestions, setSearchSuggestions] = useState<
+    UserSearchResult[]
+  >([]);
   const [isViewingOtherGarden, setIsViewingOtherGarden] = useState(false);
   const [viewedUser, setViewedUser] = useState<UserData | null>(null);
   const [viewedPlants, setViewedPlants] = useState<PlacedSprout[]>([]);
@@ -282,6 +299,32 @@ function App({
     }
   }, [attachedSproutId]);
 
+  // Suggest players while a username is typed without a tag
+  useEffect(() => {
+    const query = searchUsername.trim();
+    if (!showSearchModal || !query || searchTag.trim()) {
+      setSearchSuggestions([]);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const token = await getAuthToken();
+        if (!token) return;
+        const { users } = await apiService.searchUsers(query, token);
+        if (!cancelled) setSearchSuggestions(users.slice(0, 5));
+      } catch (error) {
+        console.error("❌ Player search failed:", error);
+      }
+    }, 150);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchUsername, searchTag, showSearchModal]);
+
   // Handle muting/unmuting of wobble audio
   useEffect(() => {
     if (wobbleAudio) {
@@ -677,48 +720,80 @@ function App({
     return () => clearInterval(interval);
   }, [money, displayedMoney]);
 
-  // Periodic backend sync - fetch all plant data from backend on mount
+  // Live garden state from the backend: a full snapshot when the stream
+  // connects (and reconnects), then per-plant deltas after every change.
   useEffect(() => {
-    const syncWithBackend = async () => {
-      try {
-        const token = await getAuthToken();
-        if (!token) return;
-
-        const plants = await apiService.getUserPlants(userEmail, token);
-        console.log("🔄 Syncing plants from backend:", plants);
-
-        // Update plants with backend data
-        const centerX = window.innerWidth / 2;
-        const centerY = window.innerHeight / 2;
+    const weatherTypes: WeatherType[] = ["cloudy", "rainy", "sunny"];
 
-        setPlacedSprouts((prevSprouts) => {
-          return plants.map((plant: Plant) => {
-            // Try to find existing sprout to preserve x/y position
-            const existing = prevSprouts.find(
-              (s) => s.id === `plant-${plant.plant_id}`
-            );
+    const toSprout = (plant: Plant, existing?: PlacedSprout): PlacedSprout => ({
+      id: `plant-${plant.plant_id}`,
+      // Keep the on-screen position of sprouts we already show
+      x: existing ? existing.x : window.innerWidth / 2 + plant.x,
+      y: existing ? existing.y : window.innerHeight / 2 - plant.y,
+      seedType: plant.plant_type as SeedType,
+      stage: plant.stage,
+      species: plant.plant_species,
+      rarity: plant.rarity,
+      growth_time_remaining: plant.growth_time_remaining,
+      fertilizer_remaining: plant.fertilizer_remaining,
+    });
 
-            return {
-              id: `plant-${plant.plant_id}`,
-              x: existing ? existing.x : centerX + plant.x,
-              y: existing ? existing.y : centerY - plant.y,
-              seedType: plant.plant_type as SeedType,
-              stage: plant.stage,
-              species: plant.plant_species,
-              rarity: plant.rarity,
-              growth_time_remaining: plant.growth_time_remaining,
-              fertilizer_remaining: plant.fertilizer_remaining,
-            };
-          });
-        });
-      } catch (error) {
-        console.error("Failed to sync with backend:", error);
-      }
+    const applyUser = (user: GardenUserFields | undefined) => {
+      if (!user) return;
+      if (user.money !== undefined) setMoney(user.money);
+      if (user.weather !== undefined) setWeather(weatherTypes[user.weather]);
     };
 
-    // Initial sync only - no periodic updates
-    syncWithBackend();
-  }, [userEmail, getAuthToken]);
+    return apiService.subscribeToGarden(userEmail, {
+      onSnapshot: ({ user, plants }) => {
+        setPlacedSprouts((prev) =>
+          plants.map((plant) =>
+            toSprout(plant, prev.find((s) => s.id === `plant-${plant.plant_id}`))
+          )
+        );
+        applyUser(user);
+      },
+      onDelta: (delta) => {
+        setPlacedSprouts((prev) => {
+          const removed = new Set((delta.removed ?? []).map((id) => `plant-${id}`));
+          let next = prev.filter((s) => !removed.has(s.id));
+
+          for (const change of delta.plants ?? []) {
+            const id = `plant-${change.plant_id}`;
+            const existing = next.find((s) => s.id === id);
+            if (existing) {
+              next = next.map((s) =>
+                s.id === id
+                  ? {
+                      ...s,
+                      stage: change.stage ?? s.stage,
+                      species: change.plant_species ?? s.species,
+                      rarity: change.rarity ?? s.rarity,
+                      growth_time_remaining:
+                        change.growth_time_remaining !== undefined
+                          ? change.growth_time_remaining
+                          : s.growth_time_remaining,
+                      fertilizer_remaining:
+                        change.fertilizer_remaining !== undefined
+                          ? change.fertilizer_remaining
+                          : s.fertilizer_remaining,
+                    }
+                  : s
+              );
+            } else if (
+              change.plant_type !== undefined &&
+              !next.some((s) => s.id.startsWith("temp-"))
+            ) {
+              // Planted elsewhere; our own plantings arrive via the API response
+              next = [...next, toSprout(change as Plant)];
+            }
+          }
+          return next;
+        });
+        applyUser(delta.user);
+      },
+    });
+  }, [userEmail]);
 
   // Pomodoro timer countdown
   useEffect(() => {
@@ -790,8 +865,9 @@ function App({
       try {
         const token = await getAuthToken();
         if (token) {
-          const users = await apiService.getUsers(token);
-          setLeaderboardUsers(users);
+          const page = await apiService.getUsers(token);
+          setLeaderboardUsers(page.users);
+          setLeaderboardCursor(page.next_cursor);
         }
       } catch (error) {
         console.error("Failed to fetch leaderboard:", error);
@@ -803,6 +879,24 @@ function App({
     fetchLeaderboard();
   }, [showLeaderboard, getAuthToken]);
 
+  // Fetch the next leaderboard page from the server
+  const loadMoreLeaderboard = async () => {
+    if (!leaderboardCursor || isLoadingMoreLeaderboard) return;
+    setIsLoadingMoreLeaderboard(true);
+    try {
+      const token = await getAuthToken();
+      if (token) {
+        const page = await apiService.getUsers(token, leaderboardCursor);
+        setLeaderboardUsers((prev) => [...prev, ...page.users]);
+        setLeaderboardCursor(page.next_cursor);
+      }
+    } catch (error) {
+      console.error("Failed to fetch more leaderboard entries:", error);
+    } finally {
+      setIsLoadingMoreLeaderboard(false);
+    }
+  };
+
   // Handle infinite scroll for leaderboard
   const handleLeaderboardScroll = () => {
     const scrollElement = leaderboardScrollRef.current;
@@ -812,13 +906,14 @@ function App({
     const scrollPercentage = (scrollTop + clientHeight) / scrollHeight;
 
     // Load more when scrolled 80% down
-    if (
-      scrollPercentage > 0.8 &&
-      displayedUsersCount < leaderboardUsers.length
-    ) {
+    if (scrollPercentage <= 0.8) return;
+
+    if (displayedUsersCount < leaderboardUsers.length) {
       setDisplayedUsersCount((prev) =>
         Math.min(prev + 20, leaderboardUsers.length)
       );
+    } else {
+      loadMoreLeaderboard();
     }
   };
 
@@ -828,7 +923,7 @@ function App({
       const token = await getAuthToken();
       if (!token) return;
 
-      const plants = await apiService.getUserPlants(user.email, token);
+      const { plants } = await apiService.getGarden(user.email, token);
 
       // Convert backend plants to PlacedSprouts (same as initialization)
       const centerX = window.innerWidth / 2;
@@ -2302,25 +2397,9 @@ function App({
       const token = await getAuthToken();
       if (!token) throw new Error("Failed to get auth token");
 
-      // Run all backend syncs independently so one failure doesn't block others
-      const growPromises = placedSprouts
-        .filter((sprout) => !sprout.id.startsWith("temp-"))
-        .map(async (sprout) => {
-          const plantId = parseInt(sprout.id.replace("plant-", ""));
-          if (!isNaN(plantId)) {
-            return apiService.growPlant(
-              userEmail,
-              plantId,
-              { time: timeToGrow },
-              token
-            );
-          }
-          return null;
-        });
-
-      // Execute all backend operations independently
+      // Execute all backend operations independently so one failure doesn't block others
       await Promise.allSettled([
-        Promise.all(growPromises),
+        apiService.growPlants(userEmail, { time: timeToGrow }, token),
         apiService.changeMoney(userEmail, coinsEarned, token),
         apiService.cycleWeather(userEmail, token),
       ]).then((results) => {
@@ -2448,23 +2527,8 @@ function App({
       const token = await getAuthToken();
       if (!token) throw new Error("Failed to get auth token");
 
-      // Grow all plants on backend
-      const growPromises = placedSprouts
-        .filter((sprout) => !sprout.id.startsWith("temp-"))
-        .map(async (sprout) => {
-          const plantId = parseInt(sprout.id.replace("plant-", ""));
-          if (!isNaN(plantId)) {
-            return apiService.growPlant(
-              userEmail,
-              plantId,
-              { time: timeToGrow },
-              token
-            );
-          }
-          return null;
-        });
-
-      await Promise.all(growPromises);
+      // Grow all plants on backend in one request
+      await apiService.growPlants(userEmail, { time: timeToGrow }, token);
 
       // Update money on backend
       await apiService.changeMoney(userEmail, coinsEarned, token);
@@ -4179,7 +4243,8 @@ function App({
                         </div>
                       ))}
                     {/* Loading indicator when there are more users */}
-                    {displayedUsersCount < leaderboardUsers.length && (
+                    {(displayedUsersCount < leaderboardUsers.length ||
+                      leaderboardCursor) && (
                       <div
                         className="text-white text-center text-lg py-4"
                         style={{
@@ -4308,6 +4373,34 @@ function App({
                   />
                 </div>
 
+                {/* Suggestions: click one to fill in its username and tag */}
+                {searchSuggestions.length > 0 && (
+                  <div className="flex flex-col gap-1">
+                    {searchSuggestions.map((suggestion) => {
+                      const [name, tag] = suggestion.username.split("#");
+                      return (
+                        <button
+                          key={suggestion.email}
+                          onClick={() => {
+                            setSearchUsername(name);
+                            setSearchTag(tag ?? "");
+                          }}
+                          onMouseEnter={() => playSound("/Audio/interact.mp3")}
+                          className="flex items-center px-4 py-2 text-lg font-bold text-white text-left hover:opacity-80 transition-opacity"
+                          style={{
+                            backgroundColor: "#e1a85f",
+                            borderRadius: "4px",
+                            filter: "drop-shadow(1px 1px 2px rgba(0, 0, 0, 0.5))",
+                          }}
+                        >
+                          {name}
+                          <span style={{ color: "#cd683d" }}>#{tag}</span>
+                        </button>
+                      );
+                    })}
+                  </div>
+                )}
+
                 {/* Tag input */}
                 <div
                   className="flex items-center px-4 py-3 gap-2"
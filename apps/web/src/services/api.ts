@@ -1,5 +1,6 @@
 // API Service for backend communication
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
+const RETRY_DELAYS_MS = [250, 1000];
 
 export interface UserData {
     email: string;
@@ -10,6 +11,28 @@ export interface UserData {
     weather: number;
 }
 
+export interface LeaderboardEntry {
+    username: string;
+    email: string;
+    money: number;
+}
+
+export interface LeaderboardPage {
+    users: LeaderboardEntry[];
+    next_cursor: string | null;
+}
+
+export interface UserSearchResult {
+    username: string;
+    email: string;
+    match: "prefix" | "fuzzy";
+}
+
+export interface UserSearchPage {
+    users: UserSearchResult[];
+    next_offset: number | null;
+}
+
 export interface Plant {
     plant_id: number;
     plant_type: string;
@@ -30,19 +53,88 @@ export interface CreatePlantRequest {
     y: number;
 }
 
+export interface CreatePlantsBatchRequest {
+    plants: CreatePlantRequest[];
+}
+
 export interface UpdatePositionRequest {
     x: number;
     y: number;
 }
 
+export interface PlantMove extends UpdatePositionRequest {
+    plant_id: number;
+}
+
+// [minX, minY, maxX, maxY] in garden coordinates.
+export type BoundingBox = [number, number, number, number];
+
+export interface FreeSlot {
+    x: number;
+    y: number;
+    distance: number;
+}
+
+export interface LedgerEntry {
+    amount: number;
+    balance: number;
+    garden_version: number;
+    reason: string;
+    plant_ids: number[] | null;
+    recorded_at: string;
+}
+
+export interface LedgerPage {
+    entries: LedgerEntry[];
+    next_before: number | null;
+    compacted: {
+        balance: number;
+        garden_version: number;
+        entries: number;
+        drift: number;
+        compacted_at: string;
+    } | null;
+}
+
 export interface GrowthTimeUpdate {
     time: number;
 }
 
+export interface BulkGrowthUpdate {
+    time: number;
+    plant_ids?: number[];
+}
+
 export interface MoneyChange {
     amount: number;
 }
 
+export interface GardenUserFields {
+    username?: string;
+    money?: number;
+    plant_limit?: number;
+    plant_count?: number;
+    weather?: number;
+}
+
+export interface GardenSnapshot {
+    version: number;
+    user: GardenUserFields;
+    plants: Plant[];
+}
+
+export interface GardenDelta {
+    plants?: (Partial<Plant> & { plant_id: number })[];
+    removed?: number[];
+    user?: GardenUserFields;
+    deleted?: boolean;
+}
+
+export interface GardenEventHandlers {
+    onSnapshot: (snapshot: GardenSnapshot) => void;
+    onDelta: (delta: GardenDelta) => void;
+}
+
 class APIService {
     private getAuthHeaders(token: string) {
         return {
@@ -51,6 +143,25 @@ class APIService {
         };
     }
 
+    // Economy mutations carry an Idempotency-Key and are retried with it
+    // after a network error or a 502-504; the server answers a retry of a
+    // request it already handled with the first response instead of
+    // charging twice.
+    private async sendIdempotent(url: string, init: RequestInit, token: string): Promise<Response> {
+        const headers = { ...this.getAuthHeaders(token), "Idempotency-Key": crypto.randomUUID() };
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const response = await fetch(url, { ...init, headers });
+                if (response.status < 502 || response.status > 504 || attempt >= RETRY_DELAYS_MS.length) {
+                    return response;
+                }
+            } catch (error) {
+                if (attempt >= RETRY_DELAYS_MS.length) throw error;
+            }
+            await new Promise((resolve) => setTimeout(resolve, RETRY_DELAYS_MS[attempt]));
+        }
+    }
+
     // User endpoints
     async createUser(email: string, token: string): Promise<UserData> {
         const response = await fetch(`${API_URL}/users/`, {
@@ -102,11 +213,10 @@ class APIService {
     }
 
     async changeMoney(email: string, amount: number, token: string) {
-        const response = await fetch(`${API_URL}/users/${email}/money`, {
+        const response = await this.sendIdempotent(`${API_URL}/users/${email}/money`, {
             method: "PATCH",
-            headers: this.getAuthHeaders(token),
             body: JSON.stringify({ amount }),
-        });
+        }, token);
 
         if (!response.ok) {
             throw new Error("Failed to update money");
@@ -116,10 +226,9 @@ class APIService {
     }
 
     async increasePlantLimit(email: string, token: string) {
-        const response = await fetch(`${API_URL}/users/${email}/increase-plant-limit`, {
+        const response = await this.sendIdempotent(`${API_URL}/users/${email}/increase-plant-limit`, {
             method: "POST",
-            headers: this.getAuthHeaders(token),
-        });
+        }, token);
 
         if (!response.ok) {
             const error = await response.json();
@@ -147,8 +256,9 @@ class APIService {
         return result;
     }
 
-    async getUsers(token: string): Promise<UserData[]> {
-        const response = await fetch(`${API_URL}/users`, {
+    async getUsers(token: string, cursor?: string | null): Promise<LeaderboardPage> {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+        const response = await fetch(`${API_URL}/users${query}`, {
             headers: this.getAuthHeaders(token),
         });
 
@@ -157,7 +267,7 @@ class APIService {
         }
 
         const data = await response.json();
-        return data.users || [];
+        return { users: data.users || [], next_cursor: data.next_cursor ?? null };
     }
 
     async getUserByUsernameTag(username: string, tag: string, token: string): Promise<UserData | null> {
@@ -176,6 +286,23 @@ class APIService {
         return response.json();
     }
 
+    // Usernames (without the #tag) starting with the query, then ones a
+    // typo away from it.
+    async searchUsers(query: string, token: string, offset = 0): Promise<UserSearchPage> {
+        const params = new URLSearchParams({ q: query });
+        if (offset) params.set("offset", String(offset));
+        const response = await fetch(`${API_URL}/users/search?${params}`, {
+            headers: this.getAuthHeaders(token),
+        });
+
+        if (!response.ok) {
+            throw new Error("Failed to search users");
+        }
+
+        const data = await response.json();
+        return { users: data.users || [], next_offset: data.next_offset ?? null };
+    }
+
     // Plant endpoints
     async getUserPlants(email: string, token: string): Promise<Plant[]> {
         const response = await fetch(`${API_URL}/users/${email}/plants`, {
@@ -190,12 +317,79 @@ class APIService {
         return data.plants || [];
     }
 
+    // Only the plants positioned inside `bbox`, for gardens too big to load whole.
+    async getPlantsInView(email: string, bbox: BoundingBox, token: string): Promise<Plant[]> {
+        const response = await fetch(`${API_URL}/users/${email}/plants?bbox=${bbox.join(",")}`, {
+            headers: this.getAuthHeaders(token),
+        });
+
+        if (!response.ok) {
+            throw new Error("Failed to fetch plants");
+        }
+
+        const data = await response.json();
+        return data.plants || [];
+    }
+
+    // Nearest spot to (x, y) where a plant overlaps nothing, or null if there
+    // is none nearby. Pass the plant being moved so its own spot counts as free.
+    async findFreeSlot(email: string, x: number, y: number, token: string, excludePlantId?: number): Promise<FreeSlot | null> {
+        const params = new URLSearchParams({ x: String(x), y: String(y) });
+        if (excludePlantId !== undefined) {
+            params.set("exclude", String(excludePlantId));
+        }
+        const response = await fetch(`${API_URL}/users/${email}/plants/free-slot?${params}`, {
+            headers: this.getAuthHeaders(token),
+        });
+
+        if (response.status === 404) {
+            return null;
+        }
+        if (!response.ok) {
+            throw new Error("Failed to find a free slot");
+        }
+
+        return response.json();
+    }
+
+    // Balance changes, newest first. Pass the previous page's next_before
+    // for older ones.
+    async getLedger(email: string, token: string, before?: number): Promise<LedgerPage> {
+        const params = new URLSearchParams();
+        if (before !== undefined) {
+            params.set("before", String(before));
+        }
+        const response = await fetch(`${API_URL}/users/${email}/ledger?${params}`, {
+            headers: this.getAuthHeaders(token),
+        });
+
+        if (!response.ok) {
+            throw new Error("Failed to fetch ledger");
+        }
+
+        return response.json();
+    }
+
+    // User and plants in one request. The response carries an ETag with
+    // Cache-Control: no-cache, so the browser revalidates a cached garden
+    // and gets an empty 304 when nothing changed.
+    async getGarden(email: string, token: string): Promise<GardenSnapshot> {
+        const response = await fetch(`${API_URL}/users/${email}/garden`, {
+            headers: this.getAuthHeaders(token),
+        });
+
+        if (!response.ok) {
+            throw new Error("Failed to fetch garden");
+        }
+
+        return response.json();
+    }
+
     async createPlant(email: string, plantData: CreatePlantRequest, token: string) {
-        const response = await fetch(`${API_URL}/users/${email}/plants/`, {
+        const response = await this.sendIdempotent(`${API_URL}/users/${email}/plants/`, {
             method: "POST",
-            headers: this.getAuthHeaders(token),
             body: JSON.stringify(plantData),
-        });
+        }, token);
 
         if (!response.ok) {
             const error = await response.json();
@@ -213,18 +407,35 @@ class APIService {
         });
 
         if (!response.ok) {
-            throw new Error("Failed to move plant");
+            const error = await response.json();
+            throw new Error(error.detail || "Failed to move plant");
         }
 
         return response.json();
     }
 
-    async applyWater(email: string, plantId: number, token: string) {
-        const response = await fetch(`${API_URL}/users/${email}/plants/${plantId}/apply-water`, {
+    // Several moves in one request; a plant listed twice ends up at its last
+    // position. Nothing moves if any plant would overlap another.
+    async movePlants(email: string, moves: PlantMove[], token: string) {
+        const response = await fetch(`${API_URL}/users/${email}/plants/positions`, {
             method: "PATCH",
             headers: this.getAuthHeaders(token),
+            body: JSON.stringify({ plants: moves }),
         });
 
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || "Failed to move plants");
+        }
+
+        return response.json();
+    }
+
+    async applyWater(email: string, plantId: number, token: string) {
+        const response = await this.sendIdempotent(`${API_URL}/users/${email}/plants/${plantId}/apply-water`, {
+            method: "PATCH",
+        }, token);
+
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error.detail || "Failed to apply water");
@@ -234,10 +445,9 @@ class APIService {
     }
 
     async applyFertilizer(email: string, plantId: number, token: string) {
-        const response = await fetch(`${API_URL}/users/${email}/plants/${plantId}/apply-fertilizer`, {
+        const response = await this.sendIdempotent(`${API_URL}/users/${email}/plants/${plantId}/apply-fertilizer`, {
             method: "PATCH",
-            headers: this.getAuthHeaders(token),
-        });
+        }, token);
 
         if (!response.ok) {
             const error = await response.json();
@@ -261,18 +471,75 @@ class APIService {
         return response.json();
     }
 
-    async sellPlant(email: string, plantId: number, token: string) {
-        const response = await fetch(`${API_URL}/users/${email}/plants/${plantId}/sell`, {
-            method: "DELETE",
+    async growPlants(email: string, update: BulkGrowthUpdate, token: string) {
+        const response = await fetch(`${API_URL}/users/${email}/plants/grow`, {
+            method: "POST",
             headers: this.getAuthHeaders(token),
+            body: JSON.stringify(update),
         });
 
+        if (!response.ok) {
+            throw new Error("Failed to grow plants");
+        }
+
+        return response.json();
+    }
+
+    async createPlantsBatch(email: string, batch: CreatePlantsBatchRequest, token: string) {
+        const response = await this.sendIdempotent(`${API_URL}/users/${email}/plants/batch`, {
+            method: "POST",
+            body: JSON.stringify(batch),
+        }, token);
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || "Failed to create plants");
+        }
+
+        return response.json();
+    }
+
+    async sellPlant(email: string, plantId: number, token: string) {
+        const response = await this.sendIdempotent(`${API_URL}/users/${email}/plants/${plantId}/sell`, {
+            method: "DELETE",
+        }, token);
+
         if (!response.ok) {
             throw new Error("Failed to sell plant");
         }
 
         return response.json();
     }
+
+    // Server-sent garden events: a snapshot, then deltas after each change.
+    // EventSource reconnects on its own and gets a fresh snapshot when it does.
+    subscribeToGarden(email: string, handlers: GardenEventHandlers) {
+        const source = new EventSource(`${API_URL}/users/${email}/garden/events`);
+
+        source.addEventListener("snapshot", (event) => {
+            handlers.onSnapshot(JSON.parse((event as MessageEvent).data));
+        });
+        source.addEventListener("delta", (event) => {
+            const delta: GardenDelta = JSON.parse((event as MessageEvent).data);
+            handlers.onDelta(delta);
+            if (delta.deleted) source.close();
+        });
+
+        return () => source.close();
+    }
+
+    async sellPlantsBatch(email: string, plantIds: number[], token: string) {
+        const response = await this.sendIdempotent(`${API_URL}/users/${email}/plants/sell-batch`, {
+            method: "POST",
+            body: JSON.stringify({ plant_ids: plantIds }),
+        }, token);
+
+        if (!response.ok) {
+            throw new Error("Failed to sell plants");
+        }
+
+        return response.json();
+    }
 }
 
 export const apiService = new APIService();